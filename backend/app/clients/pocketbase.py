@@ -1,12 +1,43 @@
+import asyncio
+import base64
+import binascii
+import hashlib
+import json
 import logging
+import random
+import time
+from collections import deque
+from collections.abc import AsyncIterator
+from dataclasses import dataclass
 from typing import Any
 
 import httpx
 
+from app import tracing
 from app.config import settings
+from app.metrics import (
+    POCKETBASE_REQUEST_SECONDS,
+    POCKETBASE_REQUESTS,
+    REGISTRY,
+    CountingTransport,
+    observe_pool,
+    pocketbase_collection,
+)
 
 logger = logging.getLogger('deepcuts')
 
+# Refresh the admin token in the background once it is this close to its
+# ``exp``, so requests never hit the 401-then-reauthenticate path.
+ADMIN_REFRESH_MARGIN_SECONDS = 60.0
+
+# PocketBase's cap on a list request's perPage; larger values are silently reduced.
+MAX_PER_PAGE = 1000
+
+_ID_ALPHABET = "abcdefghijklmnopqrstuvwxyz0123456789"
+
+# How many runs of consecutive ids sample_records reads, at most.
+_SAMPLE_RUNS = 4
+
 
 class PocketBaseError(Exception):
     """Base error for PocketBase client failures."""
@@ -20,6 +51,40 @@ class PocketBaseUnavailableError(PocketBaseError):
     """Raised when PocketBase cannot be reached or times out."""
 
 
+class PocketBaseBatchError(PocketBaseError):
+    """Raised when PocketBase rejects a batch, none of which was applied.
+
+    ``index`` is the position of the request that failed and ``errors``
+    its field validation errors, when PocketBase reports them.
+    """
+
+    def __init__(self, message: str, index: int | None = None, errors: dict[str, Any] | None = None):
+        super().__init__(message)
+        self.index = index
+        self.errors = errors or {}
+
+    def rejected_id(self, index: int) -> bool:
+        """True if request ``index`` failed on its ``id``: for a create with
+        a well-formed id, because a record with that id already exists."""
+        return self.index == index and "id" in self.errors
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor can't be decoded."""
+
+
+@dataclass
+class Page:
+    """One keyset-paginated page of records.
+
+    ``next_cursor`` is an opaque token for the following page, or None when
+    this is the last one.
+    """
+
+    items: list[dict[str, Any]]
+    next_cursor: str | None
+
+
 class PocketBaseClient:
     """Thin async HTTP adapter around PocketBase's REST API.
 
@@ -39,9 +104,21 @@ class PocketBaseClient:
         self._admin_email = admin_email
         self._admin_password = admin_password
         self._admin_token: str | None = None
-        self._client = httpx.AsyncClient(base_url=self.base_url, timeout=timeout, transport=transport)
+        self._admin_token_exp: float | None = None
+        self._admin_lock = asyncio.Lock()
+        self._admin_refresh_task: asyncio.Task[None] | None = None
+        self._transport = CountingTransport(transport)
+        self._client = httpx.AsyncClient(base_url=self.base_url, timeout=timeout, transport=self._transport)
+
+    @property
+    def transport(self) -> CountingTransport:
+        """The transport this client sends through, whose counts of
+        in-flight and queued requests feed the pool gauges."""
+        return self._transport
 
     async def aclose(self) -> None:
+        if self._admin_refresh_task:
+            self._admin_refresh_task.cancel()
         await self._client.aclose()
 
     async def _authenticate_admin(self) -> str:
@@ -65,12 +142,41 @@ class PocketBaseClient:
             raise PocketBaseAuthError("PocketBase admin auth response missing token")
 
         self._admin_token = token
+        self._admin_token_exp = token_expiry(token)
         return token
 
-    async def _admin_headers(self, force_refresh: bool = False) -> dict[str, str]:
-        if force_refresh or not self._admin_token:
-            await self._authenticate_admin()
-        return {"Authorization": self._admin_token}
+    async def _refresh_admin_token(self, stale_token: str | None) -> str:
+        """Reauthenticate, single-flight.
+
+        Every caller that saw ``stale_token`` fail or expire funnels through
+        one lock; whoever gets it first does the (bcrypt-bound) auth call
+        and the rest pick up the new token instead of repeating it.
+        """
+        async with self._admin_lock:
+            if self._admin_token and self._admin_token != stale_token:
+                return self._admin_token
+            return await self._authenticate_admin()
+
+    def _schedule_admin_refresh(self, token: str) -> None:
+        if self._admin_refresh_task and not self._admin_refresh_task.done():
+            return
+        self._admin_refresh_task = asyncio.create_task(self._background_admin_refresh(token))
+
+    async def _background_admin_refresh(self, token: str) -> None:
+        try:
+            await self._refresh_admin_token(stale_token=token)
+        except PocketBaseError as e:
+            # The current token is still valid; the next request retries.
+            logger.warning(f"Background admin token refresh failed: {e}")
+
+    async def _admin_headers(self) -> dict[str, str]:
+        token = self._admin_token
+        remaining = self._admin_token_exp - time.time() if self._admin_token_exp else None
+        if not token or (remaining is not None and remaining <= 0):
+            token = await self._refresh_admin_token(stale_token=token)
+        elif remaining is not None and remaining < ADMIN_REFRESH_MARGIN_SECONDS:
+            self._schedule_admin_refresh(token)
+        return {"Authorization": token}
 
     async def _admin_request(self, method: str, path: str, **kwargs: Any) -> httpx.Response:
         headers = kwargs.pop("headers", None) or {}
@@ -80,7 +186,7 @@ class PocketBaseClient:
 
         if response.status_code == 401:
             # Admin token expired or was revoked — reauthenticate once and retry.
-            headers.update(await self._admin_headers(force_refresh=True))
+            headers["Authorization"] = await self._refresh_admin_token(stale_token=headers["Authorization"])
             response = await self._send(method, path, headers=headers, **kwargs)
 
             if response.status_code == 401:
@@ -89,18 +195,37 @@ class PocketBaseClient:
         return response
 
     async def _send(self, method: str, path: str, **kwargs: Any) -> httpx.Response:
+        collection = pocketbase_collection(path)
+        status = "error"
         try:
-            return await self._client.request(method, path, **kwargs)
+            with (
+                tracing.span(
+                    f"PocketBase {method} {collection}",
+                    kind=tracing.SPAN_KIND_CLIENT,
+                    **{"db.system": "pocketbase", "db.collection.name": collection, "http.request.method": method},
+                ),
+                POCKETBASE_REQUEST_SECONDS.time(collection=collection, method=method),
+            ):
+                response = await self._client.request(method, path, **kwargs)
+                tracing.set_attribute("http.response.status_code", response.status_code)
+            status = str(response.status_code)
+            return response
         except httpx.TimeoutException as e:
             raise PocketBaseUnavailableError(f"Timed out calling PocketBase {method} {path}") from e
         except httpx.HTTPError as e:
             raise PocketBaseUnavailableError(f"Failed to reach PocketBase: {e}") from e
+        finally:
+            POCKETBASE_REQUESTS.inc(collection=collection, method=method, status=status)
 
     # --- Auth ---
 
     async def verify_user_token(self, token: str) -> dict[str, Any] | None:
         """Verify a user's auth token and return their record, or None if invalid/expired.
 
+        Only a 401 or 403 means the token was rejected. Any other failure
+        (429, 5xx) raises ``PocketBaseUnavailableError``, so callers don't
+        mistake a struggling PocketBase for a bad token.
+
         PocketBase's auth-refresh endpoint is POST-only; GET returns 404.
         """
         response = await self._send(
@@ -108,8 +233,12 @@ class PocketBaseClient:
             "/api/collections/users/auth-refresh",
             headers={"Authorization": token},
         )
-        if response.status_code != 200:
+        if response.status_code in (401, 403):
             return None
+        if response.status_code != 200:
+            raise PocketBaseUnavailableError(
+                f"Token verification failed: {response.status_code} {response.text}"
+            )
         return response.json().get("record")
 
     async def request_password_reset(self, collection: str, email: str) -> None:
@@ -126,7 +255,9 @@ class PocketBaseClient:
 
     # --- Generic collection helpers ---
 
-    async def list_records(self, collection: str, **params: Any) -> list[dict[str, Any]]:
+    async def get_list(self, collection: str, **params: Any) -> dict[str, Any]:
+        """One page of records along with PocketBase's list metadata
+        (``page``, ``totalItems``, ``totalPages``)."""
         response = await self._admin_request(
             "GET", f"/api/collections/{collection}/records", params=params
         )
@@ -134,7 +265,10 @@ class PocketBaseClient:
             raise PocketBaseError(
                 f"Failed to list {collection}: {response.status_code} {response.text}"
             )
-        return response.json().get("items", [])
+        return response.json()
+
+    async def list_records(self, collection: str, **params: Any) -> list[dict[str, Any]]:
+        return (await self.get_list(collection, **params)).get("items", [])
 
     async def list_all_records(
         self, collection: str, page_size: int = 200, **params: Any
@@ -142,29 +276,173 @@ class PocketBaseClient:
         """List every record in a collection, paging through results.
 
         `list_records` returns a single page (PocketBase defaults to 30 per
-        page); this loops until all pages are fetched. Use for collections
-        expected to be small enough to hold fully in memory.
+        page); this collects every page from `iter_records`. Use for
+        collections expected to be small enough to hold fully in memory.
+        """
+        return [record async for record in self.iter_records(collection, page_size, **params)]
+
+    async def iter_records(
+        self,
+        collection: str,
+        page_size: int = 200,
+        concurrency: int = 4,
+        **params: Any,
+    ) -> AsyncIterator[dict[str, Any]]:
+        """Yield every record in a collection, in page order, as pages arrive.
+
+        The first page reveals ``totalPages``; after that up to
+        ``concurrency`` pages are in flight at once. Pages are only
+        requested as the caller consumes earlier ones, so at most
+        ``concurrency`` pages are buffered. Whatever is still in flight is
+        cancelled when the generator is closed, which breaking out of the
+        loop doesn't do: callers that may stop early should iterate inside
+        ``contextlib.aclosing``. ``skipTotal`` is dropped, as without
+        ``totalPages`` only the first page would be read.
         """
         params.pop("page", None)
+        params.pop("skipTotal", None)
         params["perPage"] = page_size
 
-        all_items: list[dict[str, Any]] = []
-        page = 1
-        while True:
-            response = await self._admin_request(
-                "GET", f"/api/collections/{collection}/records", params={**params, "page": page}
+        first = await self.get_list(collection, **params, page=1)
+        for record in first.get("items", []):
+            yield record
+
+        remaining = iter(range(2, first.get("totalPages", 1) + 1))
+        in_flight: deque[asyncio.Task[dict[str, Any]]] = deque()
+
+        def schedule_next() -> None:
+            page = next(remaining, None)
+            if page is not None:
+                in_flight.append(asyncio.create_task(self.get_list(collection, **params, page=page)))
+
+        try:
+            for _ in range(concurrency):
+                schedule_next()
+            while in_flight:
+                data = await in_flight.popleft()
+                schedule_next()
+                for record in data.get("items", []):
+                    yield record
+        finally:
+            for task in in_flight:
+                task.cancel()
+            await asyncio.gather(*in_flight, return_exceptions=True)
+
+    async def prefetch_related(
+        self,
+        parents: list[dict[str, Any]],
+        child_collection: str,
+        fk_field: str,
+        chunk_size: int = 50,
+        **params: Any,
+    ) -> dict[str, list[dict[str, Any]]]:
+        """Fetch the children of many parent records at once, grouped by parent id.
+
+        Replaces a `list_records` call per parent with one OR-filtered query
+        per ``chunk_size`` parents (kept small enough for the filter to fit
+        in a URL), run concurrently. Every parent id is present in the
+        result, mapped to an empty list if it has no children. An extra
+        ``filter`` in ``params`` is ANDed onto each chunk's filter.
+        """
+        parent_ids = list(dict.fromkeys(parent["id"] for parent in parents))
+        grouped: dict[str, list[dict[str, Any]]] = {parent_id: [] for parent_id in parent_ids}
+        if not parent_ids:
+            return grouped
+
+        extra_filter = params.pop("filter", None)
+
+        async def fetch_chunk(chunk: list[str]) -> list[dict[str, Any]]:
+            clause = " || ".join(f"{fk_field} = {escape_filter_value(parent_id)}" for parent_id in chunk)
+            chunk_filter = f"({clause}) && ({extra_filter})" if extra_filter else clause
+            return await self.list_all_records(child_collection, filter=chunk_filter, **params)
+
+        chunks = [parent_ids[i:i + chunk_size] for i in range(0, len(parent_ids), chunk_size)]
+        for children in await asyncio.gather(*(fetch_chunk(chunk) for chunk in chunks)):
+            for child in children:
+                grouped.setdefault(child.get(fk_field), []).append(child)
+        return grouped
+
+    async def sample_records(self, collection: str, k: int, **params: Any) -> list[dict[str, Any]]:
+        """Return up to ``k`` distinct records chosen at random.
+
+        Record ids are random or derived from a hash, so id order has
+        nothing to do with content and a run of consecutive ids is itself a
+        random sample. The records come from at most ``_SAMPLE_RUNS`` runs,
+        each starting at a random id: an indexed seek on the primary key,
+        with no COUNT and no OFFSET, so the cost doesn't grow with the
+        collection. Runs that overlap yield fewer than ``k`` records.
+        """
+        if k <= 0:
+            return []
+        params.pop("sort", None)
+        runs = min(k, _SAMPLE_RUNS)
+        sizes = [min(k // runs + (i < k % runs), MAX_PER_PAGE) for i in range(runs)]
+        sampled: dict[str, dict[str, Any]] = {}
+        for run in await asyncio.gather(*(self._id_run(collection, size, **params) for size in sizes)):
+            for record in run:
+                sampled.setdefault(record["id"], record)
+        return list(sampled.values())[:k]
+
+    async def _id_run(
+        self, collection: str, size: int, filter: str | None = None, **params: Any
+    ) -> list[dict[str, Any]]:
+        """Up to ``size`` records in id order from a random id onwards,
+        wrapping around to the lowest ids when the run reaches the end."""
+        start = escape_filter_value("".join(random.choices(_ID_ALPHABET, k=15)))
+
+        async def read(condition: str, per_page: int) -> list[dict[str, Any]]:
+            page = await self.get_list(
+                collection,
+                filter=f"({filter}) && {condition}" if filter else condition,
+                sort="id",
+                perPage=per_page,
+                skipTotal=1,
+                **params,
             )
-            if response.status_code != 200:
-                raise PocketBaseError(
-                    f"Failed to list {collection}: {response.status_code} {response.text}"
-                )
-            data = response.json()
-            all_items.extend(data.get("items", []))
-            if page >= data.get("totalPages", 1):
-                break
-            page += 1
-
-        return all_items
+            return page.get("items", [])
+
+        run = await read(f"id >= {start}", size)
+        if len(run) < size:
+            run += await read(f"id < {start}", size - len(run))
+        return run
+
+    async def list_page(
+        self,
+        collection: str,
+        limit: int,
+        cursor: str | None = None,
+        filter: str | None = None,
+        **params: Any,
+    ) -> Page:
+        """Fetch one page ordered newest-first, using keyset pagination.
+
+        Instead of `page=N` (which makes PocketBase count and skip every
+        earlier row), the cursor pins the `(created, id)` of the last record
+        already seen and filters past it, so every page costs the same no
+        matter how deep it is. One extra record is requested to tell
+        whether another page exists, and `skipTotal` avoids the COUNT query.
+
+        ``limit`` is clamped so the extra record stays within PocketBase's
+        ``perPage`` cap; past it PocketBase would return a short page and
+        the next cursor would be lost.
+        """
+        if limit < 1:
+            raise ValueError(f"limit must be at least 1, got {limit}")
+        limit = min(limit, MAX_PER_PAGE - 1)
+
+        clauses = [f"({filter})"] if filter else []
+        if cursor:
+            clauses.append(f"({keyset_filter(*decode_cursor(cursor))})")
+        if clauses:
+            params["filter"] = " && ".join(clauses)
+
+        items = await self.list_records(
+            collection, sort="-created,-id", perPage=limit + 1, skipTotal=1, **params
+        )
+        if len(items) <= limit:
+            return Page(items=items, next_cursor=None)
+        items = items[:limit]
+        return Page(items=items, next_cursor=encode_cursor(items[-1]))
 
     async def get_record(self, collection: str, record_id: str, **params: Any) -> dict[str, Any] | None:
         response = await self._admin_request(
@@ -188,6 +466,33 @@ class PocketBaseClient:
             )
         return response.json()
 
+    async def batch(self, requests: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """Run several record writes in one transactional ``POST /api/batch``.
+
+        Each request is ``{"method", "url", "body"}`` as PocketBase's batch
+        API expects; see ``batch_create``/``batch_update``. Either every
+        write is applied or none is. Returns the response body of each
+        write, in order. Requires the batch API to be enabled on the
+        instance (done by the batch migration) and ``len(requests)`` to stay
+        within its ``batch.maxRequests`` setting. Raises
+        ``PocketBaseBatchError`` naming the failed request if it is rejected.
+        """
+        response = await self._admin_request("POST", "/api/batch", json={"requests": requests})
+        if response.status_code != 200:
+            raise _batch_error(response)
+        return [result.get("body", {}) for result in response.json()]
+
+    async def create_records(
+        self, collection: str, records: list[dict[str, Any]], chunk_size: int = 50
+    ) -> list[dict[str, Any]]:
+        """Create many records with one batch request per ``chunk_size`` records
+        instead of one request per record."""
+        created: list[dict[str, Any]] = []
+        for start in range(0, len(records), chunk_size):
+            chunk = records[start:start + chunk_size]
+            created.extend(await self.batch([batch_create(collection, record) for record in chunk]))
+        return created
+
     async def update_record(self, collection: str, record_id: str, data: dict[str, Any]) -> dict[str, Any]:
         response = await self._admin_request(
             "PATCH", f"/api/collections/{collection}/records/{record_id}", json=data
@@ -208,6 +513,21 @@ class PocketBaseClient:
             )
 
 
+def token_expiry(token: str) -> float | None:
+    """Return a JWT's ``exp`` claim as a unix timestamp, or None if absent.
+
+    The signature is not checked: this only schedules refreshes and caps
+    cache lifetimes, it never decides whether a token is trusted.
+    """
+    try:
+        payload = token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        exp = claims.get("exp")
+    except (IndexError, ValueError, AttributeError, binascii.Error):
+        return None
+    return float(exp) if isinstance(exp, int | float) else None
+
+
 def escape_filter_value(value: str) -> str:
     """Quote and escape a string for safe interpolation into a PocketBase
     filter expression. PocketBase's REST `filter` param has no placeholder
@@ -219,6 +539,75 @@ def escape_filter_value(value: str) -> str:
     return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
 
 
+def _batch_error(response: httpx.Response) -> PocketBaseBatchError:
+    # A rejected batch reports the request that failed as
+    # {"data": {"requests": {"<index>": {"response": <its error body>}}}}.
+    message = f"Batch request failed: {response.status_code} {response.text}"
+    try:
+        failed = response.json()["data"]["requests"]
+        key, result = next(iter(failed.items()))
+        return PocketBaseBatchError(message, int(key), result["response"].get("data"))
+    except (ValueError, KeyError, TypeError, AttributeError, StopIteration):
+        return PocketBaseBatchError(message)
+
+
+def batch_create(collection: str, data: dict[str, Any]) -> dict[str, Any]:
+    """Build a create-record request for ``PocketBaseClient.batch``."""
+    return {"method": "POST", "url": f"/api/collections/{collection}/records", "body": data}
+
+
+def batch_update(collection: str, record_id: str, data: dict[str, Any]) -> dict[str, Any]:
+    """Build an update-record request for ``PocketBaseClient.batch``.
+
+    ``data`` may use PocketBase's ``"field+": n`` modifiers to increment a
+    number server-side rather than read-modify-write from here.
+    """
+    return {"method": "PATCH", "url": f"/api/collections/{collection}/records/{record_id}", "body": data}
+
+
+def batch_upsert(collection: str, data: dict[str, Any]) -> dict[str, Any]:
+    """Build an upsert request for ``PocketBaseClient.batch``: creates the
+    record with ``data["id"]``, or updates the given fields if it exists."""
+    return {"method": "PUT", "url": f"/api/collections/{collection}/records", "body": data}
+
+
+def derive_record_id(*parts: str) -> str:
+    """Deterministic 15-character ``[a-z0-9]`` record id (PocketBase's default
+    id format) for a natural key, so an upsert can address a record without
+    looking it up first."""
+    digest = int.from_bytes(hashlib.sha256("\x1f".join(parts).encode()).digest(), "big")
+    chars = []
+    for _ in range(15):
+        digest, index = divmod(digest, 36)
+        chars.append(_ID_ALPHABET[index])
+    return "".join(chars)
+
+
+def encode_cursor(record: dict[str, Any]) -> str:
+    """Build the opaque cursor that resumes listing after ``record``."""
+    raw = json.dumps([record["created"], record["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[str, str]:
+    """Return the ``(created, id)`` pair a cursor from ``encode_cursor`` holds."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created, record_id = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError) as e:
+        raise InvalidCursorError(f"Invalid cursor: {cursor!r}") from e
+    if not isinstance(created, str) or not isinstance(record_id, str):
+        raise InvalidCursorError(f"Invalid cursor: {cursor!r}")
+    return created, record_id
+
+
+def keyset_filter(created: str, record_id: str) -> str:
+    """Filter matching records strictly after ``(created, id)`` in
+    ``-created,-id`` order."""
+    created_v, id_v = escape_filter_value(created), escape_filter_value(record_id)
+    return f"created < {created_v} || (created = {created_v} && id < {id_v})"
+
+
 def get_pocketbase_client() -> PocketBaseClient:
     if not settings.POCKETBASE_URL or not settings.POCKETBASE_ADMIN_EMAIL or not settings.POCKETBASE_ADMIN_PASSWORD:
         logger.error("Missing POCKETBASE_URL, POCKETBASE_ADMIN_EMAIL, or POCKETBASE_ADMIN_PASSWORD")
@@ -249,3 +638,6 @@ def get_shared_pocketbase_client() -> PocketBaseClient:
     if _shared_client is None:
         _shared_client = get_pocketbase_client()
     return _shared_client
+
+
+REGISTRY.on_collect(lambda: observe_pool("pocketbase", _shared_client and _shared_client.transport))
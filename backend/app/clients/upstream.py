@@ -0,0 +1,36 @@
+import httpx
+
+from app.metrics import REGISTRY, InstrumentedTransport, observe_pool
+
+# httpx's own default, which these calls relied on before the client was
+# shared; call sites that need a different bound pass their own.
+UPSTREAM_TIMEOUT_SECONDS = 5.0
+
+_shared_client: httpx.AsyncClient | None = None
+# The shared client's transport, whose request counts feed the pool gauges.
+_shared_transport: InstrumentedTransport | None = None
+
+
+def create_upstream_client(transport: httpx.AsyncBaseTransport | None = None) -> httpx.AsyncClient:
+    """Build a client for Spotify and Discogs calls whose requests are
+    recorded in the upstream metrics. ``transport`` replaces the network,
+    for tests and benchmarks."""
+    return httpx.AsyncClient(timeout=UPSTREAM_TIMEOUT_SECONDS, transport=InstrumentedTransport(transport))
+
+
+def get_upstream_client() -> httpx.AsyncClient:
+    """Return the process-wide client used for Spotify and Discogs calls.
+
+    One pooled client keeps connections (and their TLS sessions) alive
+    across requests instead of opening new ones for every lookup. Tests and
+    benchmarks can route it elsewhere by assigning ``_shared_client`` a
+    client from ``create_upstream_client`` with their own transport.
+    """
+    global _shared_client, _shared_transport
+    if _shared_client is None:
+        _shared_transport = InstrumentedTransport()
+        _shared_client = httpx.AsyncClient(timeout=UPSTREAM_TIMEOUT_SECONDS, transport=_shared_transport)
+    return _shared_client
+
+
+REGISTRY.on_collect(lambda: observe_pool("upstream", _shared_transport))
@@ -13,6 +13,38 @@ class Settings:
     POCKETBASE_ADMIN_EMAIL: str | None = os.getenv("POCKETBASE_ADMIN_EMAIL")
     POCKETBASE_ADMIN_PASSWORD: str | None = os.getenv("POCKETBASE_ADMIN_PASSWORD")
 
+    # Fraction of searches (0.0-1.0) whose AI raw response is kept for analytics.
+    RAW_RESPONSE_SAMPLE_RATE: float = float(os.getenv("RAW_RESPONSE_SAMPLE_RATE", "1.0"))
+
+    # Upstream API base URLs. Override to point the backend at a local
+    # stand-in such as benchmarks/upstream_simulator.py.
+    SPOTIFY_ACCOUNTS_URL: str = os.getenv("SPOTIFY_ACCOUNTS_URL", "https://accounts.spotify.com")
+    SPOTIFY_API_URL: str = os.getenv("SPOTIFY_API_URL", "https://api.spotify.com")
+    DISCOGS_API_URL: str = os.getenv("DISCOGS_API_URL", "https://api.discogs.com")
+    ANTHROPIC_BASE_URL: str | None = os.getenv("ANTHROPIC_BASE_URL")
+    GEMINI_API_URL: str | None = os.getenv("GEMINI_API_URL")
+
+    # Bearer token Prometheus must send to scrape /metrics; unset leaves it open.
+    METRICS_TOKEN: str | None = os.getenv("METRICS_TOKEN")
+
+    # Where request traces are written as OTLP/JSON lines: a file path or
+    # "stdout". Unset disables span recording; trace ids are still issued.
+    TRACE_EXPORT: str | None = os.getenv("TRACE_EXPORT")
+    # Fraction of traces exported; requests slower than TRACE_SLOW_MS always are.
+    TRACE_SAMPLE_RATE: float = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))
+    TRACE_SLOW_MS: float = float(os.getenv("TRACE_SLOW_MS", "30000"))
+
+    # Bearer token for the /api/v1/admin endpoints; unset, they are disabled.
+    ADMIN_TOKEN: str | None = os.getenv("ADMIN_TOKEN")
+
+    # Sample the event loop's stack during requests slower than this, and
+    # write each one's samples to PROFILE_DIR. Unset, nothing is sampled.
+    PROFILE_SLOW_MS: float | None = (
+        float(os.environ["PROFILE_SLOW_MS"]) if os.getenv("PROFILE_SLOW_MS") else None
+    )
+    PROFILE_INTERVAL_MS: float = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+    PROFILE_DIR: str = os.getenv("PROFILE_DIR", "profiles")
+
     # CORS settings
     def get_cors_origins(self) -> list[str]:
         if self.ENVIRONMENT == "production":
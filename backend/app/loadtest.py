@@ -0,0 +1,407 @@
+"""Load generator for the DeepCuts API.
+
+Simulates visitors: each one types a query (autocomplete requests a few
+characters apart), runs a search, then sends analytics events and checks
+favorites, pausing between steps for a think time. Visitors arrive as a
+Poisson process sized so the requests they make add up to the target RPS,
+so a slow server doesn't slow the offered load down (no coordinated
+omission). All requests share one pooled ``httpx.AsyncClient``.
+
+With ``--ramp`` the target RPS steps up level by level. Each level reports
+per-endpoint latency percentiles and the level where the server saturated:
+completed throughput fell below 90% of the offered load, errors passed
+``--max-error-rate``, or an endpoint's p95 grew past ``--knee`` times its
+p95 at the first level. Histograms are printed for the last level.
+
+Searches call the configured AI model for real unless the backend's
+upstream URLs point at benchmarks/upstream_simulator.py. Favorites need a
+user token; without ``--token`` they are left out of the mix.
+
+Usage:
+    python -m app.loadtest --base-url http://localhost:8000 --rps 5 --duration 60
+    python -m app.loadtest --ramp 2 20 2 --duration 30 --mix autocomplete=4,search=1,analytics=3
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+import time
+from collections import defaultdict
+from dataclasses import asdict, dataclass, field
+from typing import Any
+
+import httpx
+
+ENDPOINTS = ("autocomplete", "search", "analytics", "favorites")
+
+# Requests of each kind per visitor, on average. A fractional part is the
+# chance of one more.
+DEFAULT_MIX = {"autocomplete": 4.0, "search": 1.0, "analytics": 3.0, "favorites": 1.0}
+
+# Mean pause after each kind of request, in seconds: the gap between
+# keystrokes, reading a result list, and so on.
+THINK_TIMES = {"autocomplete": 0.25, "search": 4.0, "analytics": 1.5, "favorites": 2.0}
+
+# Latency histogram bucket upper bounds, in milliseconds.
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, math.inf)
+
+QUERIES = [
+    "Kind of Blue", "Pacific Breeze", "Loveless", "Promises", "Blue Lines",
+    "Moon Safari", "Donuts", "Selected Ambient Works", "Maggot Brain", "Ride the Lightning",
+    "For Sale", "Titanic Rising", "Mezzanine", "Sunset Swish", "Spirit of Eden",
+]
+
+
+@dataclass
+class EndpointStats:
+    latencies_ms: list[float] = field(default_factory=list)
+    errors: int = 0
+
+    @property
+    def count(self) -> int:
+        return len(self.latencies_ms)
+
+    def percentile(self, pct: float) -> float:
+        if not self.latencies_ms:
+            return 0.0
+        ordered = sorted(self.latencies_ms)
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))]
+
+    def histogram(self) -> list[int]:
+        counts = [0] * len(BUCKETS_MS)
+        for latency in self.latencies_ms:
+            counts[next(i for i, bound in enumerate(BUCKETS_MS) if latency <= bound)] += 1
+        return counts
+
+
+@dataclass
+class LevelReport:
+    target_rps: float
+    offered_rps: float
+    achieved_rps: float
+    requests: int
+    errors: int
+    endpoints: dict[str, dict[str, float]]
+    saturated: bool = False
+    reasons: list[str] = field(default_factory=list)
+
+    @property
+    def error_rate(self) -> float:
+        return self.errors / self.requests if self.requests else 0.0
+
+
+class Window:
+    """One measurement window. Latencies belong to the window a request
+    started in; ``completed`` counts every response that arrived while the
+    window was open, which is what falls behind when the server saturates."""
+
+    def __init__(self) -> None:
+        self.stats: dict[str, EndpointStats] = defaultdict(EndpointStats)
+        self.started_at = time.perf_counter()
+        self.closed_at: float | None = None
+        self.completed = 0
+        self.pending = 0
+        self.settled = asyncio.Event()
+
+    def close(self) -> None:
+        self.closed_at = time.perf_counter()
+        if not self.pending:
+            self.settled.set()
+
+
+class LoadTest:
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        mix: dict[str, float],
+        think_scale: float = 1.0,
+        token: str | None = None,
+        seed: int = 0,
+    ):
+        self.client = client
+        self.mix = mix
+        self.think_scale = think_scale
+        self.token = token
+        self.rng = random.Random(seed)
+        self.target_rps = 0.0
+        self._window: Window | None = None
+        self._visitors: set[asyncio.Task[None]] = set()
+
+    @property
+    def requests_per_visitor(self) -> float:
+        return sum(self.mix.values())
+
+    @property
+    def mean_journey_seconds(self) -> float:
+        """Think time in an average visit, ignoring response times. Offered
+        load only reaches the target once visitors this old are around."""
+        return sum(w * THINK_TIMES[kind] for kind, w in self.mix.items()) * self.think_scale
+
+    def journey(self) -> list[str]:
+        """The requests one visitor makes, in order: typing, searching,
+        then browsing the results."""
+        def count(kind: str) -> int:
+            weight = self.mix.get(kind, 0.0)
+            return int(weight) + (self.rng.random() < weight % 1)
+
+        browsing = ["analytics"] * count("analytics") + ["favorites"] * count("favorites")
+        self.rng.shuffle(browsing)
+        return ["autocomplete"] * count("autocomplete") + ["search"] * count("search") + browsing
+
+    async def arrivals(self) -> None:
+        """Start visitors at whatever ``target_rps`` currently is, until
+        cancelled."""
+        while True:
+            if self.target_rps <= 0:
+                await asyncio.sleep(0.1)
+                continue
+            task = asyncio.create_task(self.visitor())
+            self._visitors.add(task)
+            task.add_done_callback(self._visitors.discard)
+            await asyncio.sleep(self.rng.expovariate(self.target_rps / self.requests_per_visitor))
+
+    async def measure(self, duration: float, settle_timeout: float) -> Window:
+        """Record ``duration`` seconds of traffic, then wait for the requests
+        started in it to finish. Load keeps arriving throughout."""
+        window = self._window = Window()
+        await asyncio.sleep(duration)
+        window.close()
+        self._window = None
+        try:
+            await asyncio.wait_for(window.settled.wait(), settle_timeout)
+        except TimeoutError:
+            pass
+        return window
+
+    async def stop(self) -> None:
+        for task in list(self._visitors):
+            task.cancel()
+        await asyncio.gather(*self._visitors, return_exceptions=True)
+
+    async def visitor(self) -> None:
+        query = self.rng.choice(QUERIES)
+        typed = 1
+        results: dict[str, Any] = {}
+        for kind in self.journey():
+            if kind == "autocomplete":
+                typed = min(len(query), typed + self.rng.randint(1, 3))
+                await self.request(kind, "POST", "/api/v1/discogs/search",
+                                   json={"query": query[:typed], "type": "release", "per_page": 8})
+            elif kind == "search":
+                response = await self.request(kind, "POST", "/api/v1/search", json={"query": query})
+                if response is not None and response.status_code == 200:
+                    results = response.json()
+            elif kind == "analytics":
+                await self.request(kind, "POST", "/api/v1/analytics/events",
+                                   json={"events": self.events(results)})
+            elif kind == "favorites":
+                await self.favorites(results)
+            think = THINK_TIMES[kind] * self.think_scale
+            if think:
+                await asyncio.sleep(self.rng.expovariate(1 / think))
+
+    def events(self, results: dict[str, Any]) -> list[dict[str, Any]]:
+        albums = results.get("recommendations") or [{"title": "", "artist": ""}]
+        events = []
+        for _ in range(self.rng.randint(1, 4)):
+            album = self.rng.choice(albums)
+            event = {
+                "type": self.rng.choice(["click", "click", "dwell", "favorite"]),
+                "session_id": results.get("session_id"),
+                "title": album.get("title", ""),
+                "artist": album.get("artist", ""),
+            }
+            if event["type"] == "dwell":
+                event["dwell_ms"] = self.rng.randint(500, 30000)
+            events.append(event)
+        return events
+
+    async def favorites(self, results: dict[str, Any]) -> None:
+        albums = results.get("recommendations")
+        if albums and self.rng.random() < 0.5:
+            keys = [f"{a['title']}|{a['artist']}" for a in albums]
+            await self.request("favorites", "POST", "/api/v1/favorites/contains", json={"keys": keys})
+        else:
+            await self.request("favorites", "GET", "/api/v1/favorites", params={"limit": 20})
+
+    async def request(self, kind: str, method: str, url: str, **kwargs: Any) -> httpx.Response | None:
+        headers = {"Authorization": f"Bearer {self.token}"} if self.token else {}
+        window = self._window
+        if window:
+            window.pending += 1
+        started = time.perf_counter()
+        response = None
+        try:
+            response = await self.client.request(method, url, headers=headers, **kwargs)
+        except httpx.HTTPError:
+            pass
+        finally:
+            if self._window:
+                self._window.completed += 1
+            if window:
+                stats = window.stats[kind]
+                stats.latencies_ms.append((time.perf_counter() - started) * 1000)
+                if response is None or response.status_code >= 400:
+                    stats.errors += 1
+                window.pending -= 1
+                if not window.pending and window.closed_at is not None:
+                    window.settled.set()
+        return response
+
+
+def level_report(target_rps: float, window: Window) -> LevelReport:
+    duration = (window.closed_at or time.perf_counter()) - window.started_at
+    requests = sum(s.count for s in window.stats.values())
+    return LevelReport(
+        target_rps=target_rps,
+        offered_rps=round(requests / duration, 2) if duration > 0 else 0.0,
+        achieved_rps=round(window.completed / duration, 2) if duration > 0 else 0.0,
+        requests=requests,
+        errors=sum(s.errors for s in window.stats.values()),
+        endpoints={
+            kind: {
+                "count": s.count,
+                "errors": s.errors,
+                "p50_ms": round(s.percentile(50), 1),
+                "p95_ms": round(s.percentile(95), 1),
+                "p99_ms": round(s.percentile(99), 1),
+            }
+            for kind, s in sorted(window.stats.items())
+        },
+    )
+
+
+def check_saturation(
+    report: LevelReport, first: LevelReport | None, max_error_rate: float, knee: float
+) -> LevelReport:
+    # Compared with the load actually offered, not the target: with few
+    # visitors per window the Poisson arrivals alone can miss the target.
+    if report.achieved_rps < 0.9 * report.offered_rps:
+        report.reasons.append(f"completed {report.achieved_rps} of {report.offered_rps} rps offered")
+    if report.error_rate > max_error_rate:
+        report.reasons.append(f"error rate {report.error_rate:.1%}")
+    for kind, stats in report.endpoints.items():
+        base = first.endpoints.get(kind, {}).get("p95_ms") if first else None
+        if base and stats["p95_ms"] > knee * base:
+            report.reasons.append(f"{kind} p95 {stats['p95_ms']}ms > {knee:g}x {base}ms")
+    report.saturated = bool(report.reasons)
+    return report
+
+
+def parse_mix(value: str) -> dict[str, float]:
+    mix = dict.fromkeys(ENDPOINTS, 0.0)
+    for part in value.split(","):
+        kind, _, weight = part.partition("=")
+        if kind.strip() not in mix:
+            raise argparse.ArgumentTypeError(f"unknown endpoint {kind!r}; expected {', '.join(ENDPOINTS)}")
+        mix[kind.strip()] = float(weight)
+    return mix
+
+
+def print_level(report: LevelReport) -> None:
+    status = "SATURATED: " + "; ".join(report.reasons) if report.saturated else "ok"
+    print(f"\ntarget {report.target_rps:g} rps: offered {report.offered_rps}, "
+          f"completed {report.achieved_rps} rps, "
+          f"{report.requests} requests, {report.error_rate:.1%} errors — {status}")
+    print(f"  {'endpoint':<13}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for kind, s in report.endpoints.items():
+        print(f"  {kind:<13}{s['count']:>7}{s['errors']:>8}{s['p50_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}")
+
+
+def print_histograms(stats: dict[str, EndpointStats]) -> None:
+    for kind, s in sorted(stats.items()):
+        counts = s.histogram()
+        peak = max(counts) or 1
+        print(f"\n{kind} latency ({s.count} requests)")
+        for bound, n in zip(BUCKETS_MS, counts, strict=True):
+            label = f"<= {bound:g} ms" if bound != math.inf else "> 30000 ms"
+            print(f"  {label:>12} {n:>6} {'#' * round(40 * n / peak)}")
+
+
+async def run(args: argparse.Namespace) -> list[LevelReport]:
+    if args.ramp:
+        start, stop, step = args.ramp
+        levels = [start + i * step for i in range(int(round((stop - start) / step)) + 1)]
+    else:
+        levels = [args.rps]
+
+    limits = httpx.Limits(max_connections=args.max_connections,
+                          max_keepalive_connections=args.max_connections)
+    reports: list[LevelReport] = []
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+        test = LoadTest(client, args.mix, args.think_scale, args.token, args.seed)
+        test.target_rps = levels[0]
+        arrivals = asyncio.create_task(test.arrivals())
+        try:
+            # Unmeasured, so the first level starts with visitors already
+            # spread across their journeys rather than all typing at once.
+            await asyncio.sleep(test.mean_journey_seconds if args.warmup is None else args.warmup)
+            for target in levels:
+                test.target_rps = target
+                window = await test.measure(args.duration, settle_timeout=args.timeout)
+                report = check_saturation(
+                    level_report(target, window), reports[0] if reports else None,
+                    args.max_error_rate, args.knee,
+                )
+                reports.append(report)
+                print_level(report)
+                if report.saturated and not args.keep_going:
+                    break
+        finally:
+            arrivals.cancel()
+            await test.stop()
+    print_histograms(window.stats)
+    return reports
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--rps", type=float, default=5.0, help="target requests per second")
+    parser.add_argument("--ramp", type=float, nargs=3, metavar=("START", "STOP", "STEP"),
+                        help="step the target RPS from START to STOP")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds per level")
+    parser.add_argument("--warmup", type=float,
+                        help="unmeasured seconds before the first level (default: one mean journey)")
+    parser.add_argument("--mix", type=parse_mix, default=dict(DEFAULT_MIX),
+                        help="requests per visitor by endpoint, e.g. autocomplete=4,search=1")
+    parser.add_argument("--think-scale", type=float, default=1.0,
+                        help="multiplier on think times (0 disables them)")
+    parser.add_argument("--token", help="user bearer token, needed for favorites")
+    parser.add_argument("--max-connections", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=60.0, help="per-request timeout in seconds")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--knee", type=float, default=3.0,
+                        help="p95 growth over the first level that counts as saturation")
+    parser.add_argument("--keep-going", action="store_true", help="keep ramping past saturation")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path", help="write level reports to this file")
+    args = parser.parse_args()
+
+    if not args.token and args.mix.get("favorites"):
+        print("No --token given; leaving favorites out of the mix.", file=sys.stderr)
+        args.mix["favorites"] = 0.0
+    if not sum(args.mix.values()):
+        parser.error("--mix must include at least one request")
+
+    reports = asyncio.run(run(args))
+
+    saturated = next((r for r in reports if r.saturated), None)
+    healthy = [r for r in reports if not r.saturated]
+    print()
+    if saturated:
+        print(f"Saturation point: {saturated.target_rps:g} rps")
+    else:
+        print("No saturation within the tested range.")
+    if healthy:
+        print(f"Highest healthy level: {healthy[-1].target_rps:g} rps "
+              f"(completed {healthy[-1].achieved_rps} rps)")
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump([asdict(r) for r in reports], f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
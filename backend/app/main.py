@@ -1,23 +1,45 @@
 import asyncio
+import csv
+import hashlib
+import hmac
+import io
+import json
 import logging
 import os
 import re
 import time
-from typing import Any
+from collections.abc import AsyncIterator
+from contextlib import aclosing
+from typing import Any, Literal
 
-import httpx
 from dotenv import load_dotenv
-from fastapi import Depends, FastAPI, Header, HTTPException, Request
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 
+from app import profiling, timing, tracing
 from app.clients.pocketbase import (
+    InvalidCursorError,
+    Page,
     PocketBaseError,
+    decode_cursor,
+    encode_cursor,
     escape_filter_value,
     get_shared_pocketbase_client,
 )
+from app.clients.upstream import get_upstream_client
 from app.config import settings
+from app.metrics import ALBUM_VERIFICATIONS, REGISTRY
+from app.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE
 from app.models.albums import AlbumData, SearchRequest, SearchResponse
-from app.models.favorites import AddToFavoritesRequest, FavoriteActionResponse, UserFavoritesList
+from app.models.analytics import TrackEventsRequest, TrackEventsResponse
+from app.models.favorites import (
+    AddToFavoritesRequest,
+    FavoriteActionResponse,
+    FavoritesContainsRequest,
+    FavoritesContainsResponse,
+    UserFavoritesList,
+)
 from app.models.searchSuggestions import SuggestionRequest, SuggestionResponse, SuggestionResult
 from app.services.ai import (
     VALID_CLAUDE_MODELS,
@@ -27,13 +49,15 @@ from app.services.ai import (
     set_active_model,
 )
 from app.services.auth import get_current_user as authenticate_token
-from app.services.favorites import favorites_service
+from app.services.auth import request_auth_scope
+from app.services.favorites import FAVORITE_ALBUM_FIELDS, favorites_service
 from app.services.search_sessions import search_session_service
 
 load_dotenv()
 
 # FastAPI's logging
 logger = logging.getLogger("uvicorn")
+tracing.install_log_correlation("uvicorn", "uvicorn.access")
 
 
 def safe_error_message(technical_detail: str | None) -> str:
@@ -42,7 +66,14 @@ def safe_error_message(technical_detail: str | None) -> str:
     return technical_detail or "AI service error"
 
 
-app = FastAPI(title=settings.PROJECT_NAME, version=settings.PROJECT_VERSION)
+# ORJSONResponse by default. Endpoints with large, already-trusted payloads
+# (search, analytics) also return it directly, which skips FastAPI's
+# response-model re-validation and jsonable_encoder pass.
+app = FastAPI(
+    title=settings.PROJECT_NAME,
+    version=settings.PROJECT_VERSION,
+    default_response_class=ORJSONResponse,
+)
 # Configure CORS
 allowed_origins = [
     "http://localhost:3000",
@@ -68,8 +99,21 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Trace-Id"],
 )
 
+
+@app.middleware("http")
+async def scope_request_auth(request: Request, call_next):
+    with request_auth_scope():
+        return await call_next(request)
+
+
+app.add_middleware(profiling.ProfileMiddleware)
+# Added last, so it is outermost and the trace covers every other middleware.
+app.add_middleware(tracing.TraceMiddleware)
+
+
 pocketbase_client = get_shared_pocketbase_client()
 
 logger.info(f"AI service ready with model: {ai_service.ACTIVE_MODEL}")
@@ -98,6 +142,52 @@ async def root():
     }
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics(authorization: str = Header(None)) -> Response:
+    """Prometheus scrape endpoint, in the text exposition format.
+
+    Needs ``METRICS_TOKEN`` outside development; without one it is open in
+    development and disabled everywhere else.
+    """
+    if not settings.METRICS_TOKEN:
+        if settings.ENVIRONMENT != "development":
+            raise HTTPException(status_code=403, detail="Metrics endpoint is disabled")
+    elif not hmac.compare_digest(authorization or "", f"Bearer {settings.METRICS_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return Response(REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
+
+
+def require_admin(authorization: str = Header(None)) -> None:
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled")
+    if not hmac.compare_digest(authorization or "", f"Bearer {settings.ADMIN_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+@app.post("/api/v1/admin/profiling/start", dependencies=[Depends(require_admin)])
+async def start_profiling():
+    """Start sampling every thread of the live process until
+    /api/v1/admin/profiling/stop is called."""
+    if not profiling.start_on_demand():
+        raise HTTPException(status_code=409, detail="Profiling is already running")
+    return {"status": "profiling", "interval_ms": profiling.sampler.interval * 1000}
+
+
+@app.post("/api/v1/admin/profiling/stop", dependencies=[Depends(require_admin)])
+async def stop_profiling() -> Response:
+    """Stop on-demand profiling. Returns the samples as collapsed stacks,
+    also written to PROFILE_DIR, whose path is in ``X-Profile-Path``."""
+    profile = profiling.stop_on_demand()
+    if profile is None:
+        raise HTTPException(status_code=409, detail="Profiling is not running")
+    path = await asyncio.to_thread(profiling.save, profile, "on-demand")
+    return Response(
+        profile.collapsed(),
+        media_type="text/plain",
+        headers={"X-Profile-Path": path} if path else None,
+    )
+
+
 @app.get("/api/v1/health/ai")
 async def ai_health_check():
     """
@@ -171,7 +261,7 @@ async def auto_fix_ai_model():
 # =============================================
 
 @app.get("/api/v1/settings/models")
-async def get_available_models():
+async def get_available_models(request: Request, response: Response):
     """
     Get all available AI models.
     Returns models organized by provider with metadata.
@@ -179,7 +269,7 @@ async def get_available_models():
     current_model = ai_service.ACTIVE_MODEL
     current_info = get_model_info(current_model)
 
-    return {
+    payload = {
         "current_model": {
             "id": current_model,
             "name": current_info["name"] if current_info else current_model,
@@ -192,6 +282,11 @@ async def get_available_models():
         },
         "note": "Gemini models are free. Change the model via PUT /api/v1/settings/model"
     }
+    etag = _etag(json.dumps(payload, sort_keys=True))
+    if not_modified := _not_modified(request, etag):
+        return not_modified
+    _set_etag(response, etag)
+    return payload
 
 
 @app.put("/api/v1/settings/model")
@@ -230,18 +325,14 @@ async def refresh_model_config():
 
 
 @app.get("/api/v1/albums/random")
-async def get_random_albums(limit: int = 10):
+async def get_random_albums(limit: int = Query(10, ge=1, le=50)):
     """Get random albums from the Sessions database."""
     try:
-        all_albums = await pocketbase_client.list_all_records('albums')
+        random_albums = await pocketbase_client.sample_records('albums', limit)
 
-        if not all_albums:
+        if not random_albums:
             return {"albums": [], "total": 0}
 
-        # Randomly sample albums
-        import random
-        random_albums = random.sample(all_albums, min(limit, len(all_albums)))
-
         # Convert to AlbumData format
         albums = []
         for album in random_albums:
@@ -277,78 +368,78 @@ async def get_spotify_album_data(title: str, artist: str) -> dict[str, str | Non
         return {"preview_url": None, "external_url": None}
 
     try:
-        async with httpx.AsyncClient() as client:
-            # Get Spotify access token
-            auth_url = "https://accounts.spotify.com/api/token"
-            auth_data = {
-                "grant_type": "client_credentials",
-                "client_id": spotify_client_id,
-                "client_secret": spotify_client_secret
-            }
-            auth_response = await client.post(auth_url, data=auth_data)
-
-            if auth_response.status_code != 200:
-                return {"preview_url": None, "external_url": None}
-
-            access_token = auth_response.json().get("access_token")
-
-            # Search for album
-            search_query = f"album:{title} artist:{artist}"
-            search_url = "https://api.spotify.com/v1/search"
-            headers = {"Authorization": f"Bearer {access_token}"}
-            params = {
-                "q": search_query,
-                "type": "album",
-                "limit": 5
-            }
-
-            search_response = await client.get(search_url, headers=headers, params=params)
+        client = get_upstream_client()
+        # Get Spotify access token
+        auth_url = f"{settings.SPOTIFY_ACCOUNTS_URL}/api/token"
+        auth_data = {
+            "grant_type": "client_credentials",
+            "client_id": spotify_client_id,
+            "client_secret": spotify_client_secret
+        }
+        auth_response = await client.post(auth_url, data=auth_data)
 
-            if search_response.status_code == 200:
-                data = search_response.json()
-                albums = data.get("albums", {}).get("items", [])
+        if auth_response.status_code != 200:
+            return {"preview_url": None, "external_url": None}
 
-                # Find best match
-                for album in albums:
-                    album_name = album.get("name", "").lower()
-                    album_artists = [artist.get("name", "").lower() for artist in album.get("artists", [])]
+        access_token = auth_response.json().get("access_token")
 
-                    if (title.lower() in album_name or album_name in title.lower()) and \
-                        any(artist.lower() in album_artist for album_artist in album_artists):
+        # Search for album
+        search_query = f"album:{title} artist:{artist}"
+        search_url = f"{settings.SPOTIFY_API_URL}/v1/search"
+        headers = {"Authorization": f"Bearer {access_token}"}
+        params = {
+            "q": search_query,
+            "type": "album",
+            "limit": 5
+        }
 
-                        spotify_cover_url = None
-                        images = album.get("images", [])
-                        if images:
-                            spotify_cover_url = images[0].get("url")
-
-                        # Get album tracks for preview URL
-                        album_id = album.get("id")
-                        if album_id:
-                            tracks_url = f"https://api.spotify.com/v1/albums/{album_id}/tracks"
-                            tracks_response = await client.get(tracks_url, headers=headers)
-
-                            if tracks_response.status_code == 200:
-                                tracks_data = tracks_response.json()
-                                tracks = tracks_data.get("items", [])
-
-                                # Find a track with preview URL
-                                preview_url = None
-                                for track in tracks:
-                                    if track.get("preview_url"):
-                                        preview_url = track.get("preview_url")
-                                        break
-
-                                return {
-                                    "preview_url": preview_url,
-                                    "external_url": album.get("external_urls", {}).get("spotify"),
-                                    "cover_url": spotify_cover_url,
-                                }
-
-                        return {
-                            "preview_url": None,
-                            "external_url": album.get("external_urls", {}).get("spotify"),
-                            "cover_url": spotify_cover_url,
-                        }
+        search_response = await client.get(search_url, headers=headers, params=params)
+
+        if search_response.status_code == 200:
+            data = search_response.json()
+            albums = data.get("albums", {}).get("items", [])
+
+            # Find best match
+            for album in albums:
+                album_name = album.get("name", "").lower()
+                album_artists = [artist.get("name", "").lower() for artist in album.get("artists", [])]
+
+                if (title.lower() in album_name or album_name in title.lower()) and \
+                    any(artist.lower() in album_artist for album_artist in album_artists):
+
+                    spotify_cover_url = None
+                    images = album.get("images", [])
+                    if images:
+                        spotify_cover_url = images[0].get("url")
+
+                    # Get album tracks for preview URL
+                    album_id = album.get("id")
+                    if album_id:
+                        tracks_url = f"{settings.SPOTIFY_API_URL}/v1/albums/{album_id}/tracks"
+                        tracks_response = await client.get(tracks_url, headers=headers)
+
+                        if tracks_response.status_code == 200:
+                            tracks_data = tracks_response.json()
+                            tracks = tracks_data.get("items", [])
+
+                            # Find a track with preview URL
+                            preview_url = None
+                            for track in tracks:
+                                if track.get("preview_url"):
+                                    preview_url = track.get("preview_url")
+                                    break
+
+                            return {
+                                "preview_url": preview_url,
+                                "external_url": album.get("external_urls", {}).get("spotify"),
+                                "cover_url": spotify_cover_url,
+                            }
+
+                    return {
+                        "preview_url": None,
+                        "external_url": album.get("external_urls", {}).get("spotify"),
+                        "cover_url": spotify_cover_url,
+                    }
 
     except Exception as e:
         logger.error(f"Spotify API error for {title} by {artist}: {e}")
@@ -409,54 +500,54 @@ async def get_album_cover_from_discogs(title: str, artist: str) -> str | None:
         return None
 
     try:
-        async with httpx.AsyncClient() as client:
-            search_query = f"{artist} {title}"
-            url = "https://api.discogs.com/database/search"
-            params = {
-                "q": search_query,
-                "type": "release",
-                "per_page": 10,
-                "key": discogs_key,
-                "secret": discogs_secret
-            }
-            headers = {
-                "User-Agent": "DeepCuts/1.0 (contact@deepcuts.com)"
-            }
+        client = get_upstream_client()
+        search_query = f"{artist} {title}"
+        url = f"{settings.DISCOGS_API_URL}/database/search"
+        params = {
+            "q": search_query,
+            "type": "release",
+            "per_page": 10,
+            "key": discogs_key,
+            "secret": discogs_secret
+        }
+        headers = {
+            "User-Agent": "DeepCuts/1.0 (contact@deepcuts.com)"
+        }
 
-            response = await client.get(url, params=params, headers=headers)
+        response = await client.get(url, params=params, headers=headers)
 
-            if response.status_code == 200:
-                data = response.json()
-                results = data.get("results", [])
+        if response.status_code == 200:
+            data = response.json()
+            results = data.get("results", [])
 
-                best_match = None
-                for result in results:
-                    result_title = result.get("title", "").lower()
-                    if artist.lower() in result_title and title.lower() in result_title:
-                        best_match = result
-                        break
+            best_match = None
+            for result in results:
+                result_title = result.get("title", "").lower()
+                if artist.lower() in result_title and title.lower() in result_title:
+                    best_match = result
+                    break
 
-                if not best_match and results:
-                    best_match = results[0]
+            if not best_match and results:
+                best_match = results[0]
 
-                if best_match:
-                    release_id = best_match.get("id")
-                    if release_id:
-                        release_url = f"https://api.discogs.com/releases/{release_id}"
-                        release_response = await client.get(release_url, params={"key": discogs_key, "secret": discogs_secret}, headers=headers)
+            if best_match:
+                release_id = best_match.get("id")
+                if release_id:
+                    release_url = f"{settings.DISCOGS_API_URL}/releases/{release_id}"
+                    release_response = await client.get(release_url, params={"key": discogs_key, "secret": discogs_secret}, headers=headers)
 
-                        if release_response.status_code == 200:
-                            release_data = release_response.json()
-                            images = release_data.get("images", [])
+                    if release_response.status_code == 200:
+                        release_data = release_response.json()
+                        images = release_data.get("images", [])
 
-                            for image in images:
-                                if image.get("type") == "primary":
-                                    return image.get("uri")
+                        for image in images:
+                            if image.get("type") == "primary":
+                                return image.get("uri")
 
-                            if images:
-                                return images[0].get("uri")
+                        if images:
+                            return images[0].get("uri")
 
-                    return best_match.get("cover_image") or best_match.get("thumb")
+                return best_match.get("cover_image") or best_match.get("thumb")
 
     except Exception as e:
         logger.error(f"Discogs API error for {title} by {artist}: {e}")
@@ -464,7 +555,7 @@ async def get_album_cover_from_discogs(title: str, artist: str) -> str | None:
     return None
 
 
-def get_spotify_token() -> str | None:
+async def get_spotify_token() -> str | None:
     """Get Spotify access token using client credentials flow."""
     import base64
 
@@ -475,13 +566,12 @@ def get_spotify_token() -> str | None:
         return None
 
     try:
-        auth_url = "https://accounts.spotify.com/api/token"
+        auth_url = f"{settings.SPOTIFY_ACCOUNTS_URL}/api/token"
         auth_header = base64.b64encode(f"{client_id}:{client_secret}".encode()).decode()
         headers = {"Authorization": f"Basic {auth_header}"}
         data = {"grant_type": "client_credentials"}
 
-        import httpx
-        response = httpx.post(auth_url, data=data, headers=headers, timeout=10.0)
+        response = await get_upstream_client().post(auth_url, data=data, headers=headers, timeout=10.0)
 
         if response.status_code == 200:
             return response.json().get("access_token")
@@ -545,6 +635,12 @@ def fuzzy_match(query: str, target: str, threshold: float = 0.65) -> bool:
     return score >= threshold
 
 
+def _verification_result(exists: bool, result: str) -> bool:
+    ALBUM_VERIFICATIONS.inc(result=result)
+    tracing.set_attribute("verification.result", result)
+    return exists
+
+
 async def verify_album_exists(title: str, artist: str) -> bool:
     """Verify album exists on Spotify or Discogs.
 
@@ -552,16 +648,22 @@ async def verify_album_exists(title: str, artist: str) -> bool:
     Returns True when APIs fail (network, rate limit, timeout) to avoid
     false negatives blocking real recommendations.
     """
+    with tracing.span("verify_album", **{"album.title": title, "album.artist": artist}):
+        return await _verify_album_exists(title, artist)
+
+
+async def _verify_album_exists(title: str, artist: str) -> bool:
     # Track whether we actually performed a successful search
     searched = False
 
-    spotify_access_token = get_spotify_token()
+    with timing.stage("verify_spotify"):
+        spotify_access_token = await get_spotify_token()
 
-    if spotify_access_token:
-        try:
-            async with httpx.AsyncClient() as client:
+        if spotify_access_token:
+            try:
+                client = get_upstream_client()
                 search_query = f"album:{title} artist:{artist}"
-                search_url = "https://api.spotify.com/v1/search"
+                search_url = f"{settings.SPOTIFY_API_URL}/v1/search"
                 headers = {"Authorization": f"Bearer {spotify_access_token}"}
                 params = {"q": search_query, "type": "album", "limit": 5}
 
@@ -584,19 +686,20 @@ async def verify_album_exists(title: str, artist: str) -> bool:
                         artist_match = any(fuzzy_match(artist, a, threshold=0.6) for a in album_artists)
 
                         if title_match and artist_match:
-                            return True
-        except Exception as e:
-            logger.warning(f"Spotify verification failed (network/error), assuming album is real: {e}")
-            return True
-
-    discogs_key = os.getenv("DISCOGS_KEY")
-    discogs_secret = os.getenv("DISCOGS_SECRET")
-
-    if discogs_key and discogs_secret:
-        try:
-            async with httpx.AsyncClient() as client:
+                            return _verification_result(True, "verified")
+            except Exception as e:
+                logger.warning(f"Spotify verification failed (network/error), assuming album is real: {e}")
+                return _verification_result(True, "assumed_real")
+
+    with timing.stage("verify_discogs"):
+        discogs_key = os.getenv("DISCOGS_KEY")
+        discogs_secret = os.getenv("DISCOGS_SECRET")
+
+        if discogs_key and discogs_secret:
+            try:
+                client = get_upstream_client()
                 search_query = f"{artist} {title}"
-                url = "https://api.discogs.com/database/search"
+                url = f"{settings.DISCOGS_API_URL}/database/search"
                 params = {
                     "q": search_query,
                     "type": "release",
@@ -610,7 +713,7 @@ async def verify_album_exists(title: str, artist: str) -> bool:
 
                 if response.status_code == 429:
                     logger.warning("Discogs rate limit hit during verification, assuming album is real")
-                    return True
+                    return _verification_result(True, "assumed_real")
 
                 if response.status_code == 200:
                     searched = True
@@ -634,26 +737,47 @@ async def verify_album_exists(title: str, artist: str) -> bool:
                             artist_match = fuzzy_match(artist, result_artist, threshold=0.6)
 
                             if title_match and artist_match:
-                                return True
-        except Exception as e:
-            logger.warning(f"Discogs verification failed (network/error), assuming album is real: {e}")
-            return True
+                                return _verification_result(True, "verified")
+            except Exception as e:
+                logger.warning(f"Discogs verification failed (network/error), assuming album is real: {e}")
+                return _verification_result(True, "assumed_real")
 
     if searched:
         logger.info(f"Album not found after searching: {title} by {artist}")
-        return False
+        return _verification_result(False, "not_found")
 
     logger.warning(f"No verification APIs available, assuming album is real: {title} by {artist}")
-    return True
+    return _verification_result(True, "assumed_real")
 
 
-@app.post("/api/v1/search")
+@app.post("/api/v1/search", response_model=SearchResponse)
 async def search_albums(
     request: SearchRequest,
     http_request: Request,
-    authorization: str = Header(None)
-) -> SearchResponse:
-    """Get album recommendations based on user query."""
+    authorization: str = Header(None),
+    debug: bool = Query(False, description="Include per-stage timings in the response body"),
+) -> ORJSONResponse:
+    """Get album recommendations based on user query.
+
+    Every response, errors included, carries a Server-Timing header with
+    the time spent in each stage of the search.
+    """
+    with timing.stage_timing() as timer:
+        try:
+            return await _search_albums(request, http_request, authorization, timer, debug)
+        except HTTPException as e:
+            timer.since_start("total")
+            e.headers = {**(e.headers or {}), "Server-Timing": timer.header()}
+            raise
+
+
+async def _search_albums(
+    request: SearchRequest,
+    http_request: Request,
+    authorization: str | None,
+    timer: timing.StageTimer,
+    debug: bool,
+) -> ORJSONResponse:
     start_time = time.time()
 
     # Get user email if authenticated
@@ -661,7 +785,8 @@ async def search_albums(
     if authorization and authorization.startswith("Bearer "):
         try:
             token = authorization.replace("Bearer ", "")
-            user = await authenticate_token(token)
+            with timer.stage("auth"):
+                user = await authenticate_token(token)
             user_email = user.email
         except HTTPException as e:
             logger.info(f"Search: Could not authenticate user: {e.detail}")
@@ -710,7 +835,8 @@ async def search_albums(
             verify_album_exists(album.title, album.artist)
             for album in recommendations
         ]
-        verification_results = await asyncio.gather(*verification_tasks, return_exceptions=True)
+        with timer.stage("verify"):
+            verification_results = await asyncio.gather(*verification_tasks, return_exceptions=True)
 
         filtered_albums: list[dict[str, str]] = []
         verified_recommendations: list[AlbumData] = []
@@ -735,38 +861,23 @@ async def search_albums(
             detail = ai_error or "AI service returned no verifiable recommendations."
             raise HTTPException(status_code=503, detail=safe_error_message(detail))
 
-        # Convert to AlbumData format
-        quick_recommendations = []
-        for album in recommendations:
-            quick_album = AlbumData(
-                id=album.id,
-                title=album.title,
-                artist=album.artist,
-                year=album.year,
-                genre=album.genre,
-                spotify_preview_url=None,
-                spotify_url=None,
-                discogs_url=album.discogs_url,
-                cover_url=None,
-                reasoning=album.reasoning
+        with timer.stage("persist"):
+            session_id = await search_session_service.create_session(
+                query=request.query,
+                albums=recommendations,
+                user_email=user_email,
+                ai_model=ai_service.ACTIVE_MODEL,
+                raw_results_count=raw_count,
+                filtered_count=len(filtered_albums),
+                ip_address=ip_address,
+                user_agent=user_agent,
+                raw_response=raw_response,
+                timings=timer.as_dict(),
             )
-            quick_recommendations.append(quick_album)
-        recommendations = quick_recommendations
-
-        session_id = await search_session_service.create_session(
-            query=request.query,
-            albums=recommendations,
-            user_email=user_email,
-            ai_model=ai_service.ACTIVE_MODEL,
-            raw_results_count=raw_count,
-            filtered_count=len(filtered_albums),
-            ip_address=ip_address,
-            user_agent=user_agent,
-            raw_response=raw_response,
-        )
 
-        if session_id and filtered_albums:
-            await search_session_service.track_filtered_albums(session_id, filtered_albums)
+            http_request.state.session_id = session_id
+            if session_id and filtered_albums:
+                await search_session_service.track_filtered_albums(session_id, filtered_albums)
 
         # Limit results for response
         limited_recommendations = recommendations[:request.max_results]
@@ -778,8 +889,12 @@ async def search_albums(
         raise HTTPException(status_code=500, detail=safe_error_message(str(e))) from None
 
     processing_time = int((time.time() - start_time) * 1000)
+    timer.since_start("total")
 
-    return SearchResponse(
+    # Every field is built from already-validated objects, so skip
+    # validation here and FastAPI's response_model pass by returning the
+    # serialized body directly.
+    response = SearchResponse.model_construct(
         query=request.query,
         recommendations=limited_recommendations,
         total_found=len(limited_recommendations),
@@ -788,6 +903,11 @@ async def search_albums(
         attempted_count=raw_count_after_filter,
         verified_count=len(limited_recommendations),
         filtered=filtered_albums,
+        timings=timer.as_dict() if debug else None,
+    )
+    return ORJSONResponse(
+        response.model_dump(mode="json", exclude=None if debug else {"timings"}),
+        headers={"Server-Timing": timer.header()},
     )
 
 
@@ -833,87 +953,87 @@ async def search_discogs(request: SuggestionRequest) -> SuggestionResponse:
         )
 
     try:
-        async with httpx.AsyncClient() as client:
-            url = "https://api.discogs.com/database/search"
-            params = {
-                "q": request.query,
-                "type": request.type,
-                "per_page": request.per_page,
-                "key": discogs_key,
-                "secret": discogs_secret
-            }
-            headers = {
-                "User-Agent": "DeepCuts/1.0 (contact@deepcuts.com)"
-            }
+        client = get_upstream_client()
+        url = f"{settings.DISCOGS_API_URL}/database/search"
+        params = {
+            "q": request.query,
+            "type": request.type,
+            "per_page": request.per_page,
+            "key": discogs_key,
+            "secret": discogs_secret
+        }
+        headers = {
+            "User-Agent": "DeepCuts/1.0 (contact@deepcuts.com)"
+        }
 
-            logger.info(f"Calling Discogs API: {url} with query='{request.query}'")
-            response = await client.get(url, params=params, headers=headers, timeout=5.0)
-            logger.info(f"Discogs API response status: {response.status_code}")
-
-            if response.status_code == 200:
-                data = response.json()
-                raw_results = data.get("results", [])
-                logger.info(f"Discogs returned {len(raw_results)} raw results")
-
-                cleaned_results = []
-                seen_titles = set()
-                skipped_count = 0
-
-                for result in raw_results:
-                    if "title" not in result:
-                        skipped_count += 1
-                        continue
-
-                    raw_title = result["title"]
-
-                    if " - " not in raw_title:
-                        skipped_count += 1
-                        continue
-
-                    full_title = clean_discogs_title(raw_title)
-
-                    if " - " in full_title:
-                        artist_part = full_title.split(" - ", 1)[0].strip()
-                        album_only = full_title.split(" - ", 1)[1].strip()
-                        display_title = album_only
-                    else:
-                        artist_part = ""
-                        display_title = full_title
-
-                    if full_title.lower() in seen_titles:
-                        skipped_count += 1
-                        continue
-                    seen_titles.add(full_title.lower())
-
-                    try:
-                        cleaned_results.append(SuggestionResult(
-                            id=result.get("id", 0),
-                            type=result.get("type", "release"),
-                            title=display_title,
-                            artist=artist_part,
-                            search_query=full_title,
-                            year=str(result.get("year", "")),
-                            thumb=result.get("thumb")
-                        ))
-                    except Exception as model_error:
-                        logger.warning(f"Skipping invalid Discogs result: {model_error}")
-                        skipped_count += 1
-                        continue
-
-                logger.info(f"Discogs search complete: {len(cleaned_results)} results after filtering ({skipped_count} skipped)")
-                return SuggestionResponse(
-                    results=cleaned_results,
-                    pagination=data.get("pagination", {})
-                )
-            elif response.status_code == 429:
-                logger.warning(f"Discogs rate limit hit for query='{request.query}'")
-                raise HTTPException(
-                    status_code=429,
-                    detail="Search rate limit reached. Please wait a moment and try again."
-                )
-            else:
-                logger.error(f"Discogs API returned {response.status_code}: {response.text[:500]}")
-                raise HTTPException(status_code=response.status_code, detail="Discogs API error")
+        logger.info(f"Calling Discogs API: {url} with query='{request.query}'")
+        response = await client.get(url, params=params, headers=headers, timeout=5.0)
+        logger.info(f"Discogs API response status: {response.status_code}")
+
+        if response.status_code == 200:
+            data = response.json()
+            raw_results = data.get("results", [])
+            logger.info(f"Discogs returned {len(raw_results)} raw results")
+
+            cleaned_results = []
+            seen_titles = set()
+            skipped_count = 0
+
+            for result in raw_results:
+                if "title" not in result:
+                    skipped_count += 1
+                    continue
+
+                raw_title = result["title"]
+
+                if " - " not in raw_title:
+                    skipped_count += 1
+                    continue
+
+                full_title = clean_discogs_title(raw_title)
+
+                if " - " in full_title:
+                    artist_part = full_title.split(" - ", 1)[0].strip()
+                    album_only = full_title.split(" - ", 1)[1].strip()
+                    display_title = album_only
+                else:
+                    artist_part = ""
+                    display_title = full_title
+
+                if full_title.lower() in seen_titles:
+                    skipped_count += 1
+                    continue
+                seen_titles.add(full_title.lower())
+
+                try:
+                    cleaned_results.append(SuggestionResult(
+                        id=result.get("id", 0),
+                        type=result.get("type", "release"),
+                        title=display_title,
+                        artist=artist_part,
+                        search_query=full_title,
+                        year=str(result.get("year", "")),
+                        thumb=result.get("thumb")
+                    ))
+                except Exception as model_error:
+                    logger.warning(f"Skipping invalid Discogs result: {model_error}")
+                    skipped_count += 1
+                    continue
+
+            logger.info(f"Discogs search complete: {len(cleaned_results)} results after filtering ({skipped_count} skipped)")
+            return SuggestionResponse(
+                results=cleaned_results,
+                pagination=data.get("pagination", {})
+            )
+        elif response.status_code == 429:
+            logger.warning(f"Discogs rate limit hit for query='{request.query}'")
+            raise HTTPException(
+                status_code=429,
+                detail="Search rate limit reached. Please wait a moment and try again."
+            )
+        else:
+            logger.error(f"Discogs API returned {response.status_code}: {response.text[:500]}")
+            raise HTTPException(status_code=response.status_code, detail="Discogs API error")
 
     except HTTPException:
         raise
@@ -922,6 +1042,37 @@ async def search_discogs(request: SuggestionRequest) -> SuggestionResponse:
         raise HTTPException(status_code=500, detail="Search service temporarily unavailable") from e
 
 
+def _etag(*parts: str) -> str:
+    digest = hashlib.sha256("\x1f".join(parts).encode()).hexdigest()[:32]
+    return f'W/"{digest}"'
+
+
+def _not_modified(request: Request, etag: str) -> Response | None:
+    """A 304 for ``etag`` if the request's If-None-Match already has it."""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return None
+    candidates = {tag.strip() for tag in if_none_match.split(",")}
+    if "*" in candidates or etag in candidates:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+    return None
+
+
+def _set_etag(response: Response, etag: str) -> None:
+    # no-cache: browsers may keep the body but must revalidate every time.
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+
+
+async def _favorites_etag(user_id: str, request: Request) -> str | None:
+    """ETag for a favorites response: the user's favorites version, plus the
+    query string since limit/cursor select different representations."""
+    version = await favorites_service.get_favorites_version(user_id)
+    if version is None:
+        return None
+    return _etag(user_id, version, request.url.path, str(request.query_params))
+
+
 async def get_current_user(authorization: str = Header(None)) -> str:
     """FastAPI dependency: verify the bearer token, return the PocketBase user id."""
     if not authorization:
@@ -978,24 +1129,82 @@ async def update_favorite(
     return await favorites_service.update_favorite(user_id, album_id, request.album_data)
 
 
+@app.post("/api/v1/favorites/contains")
+async def favorites_contains(
+    request: FavoritesContainsRequest,
+    user_id: str = Depends(get_current_user),
+) -> FavoritesContainsResponse:
+    """Check which "title|artist" keys the user has already favorited.
+
+    Answered from an in-memory set of the user's album keys, loaded once
+    and dropped whenever they add, remove or update a favorite.
+    """
+    try:
+        favorited = await favorites_service.contains(user_id, request.keys)
+    except PocketBaseError as e:
+        logger.error(f"Error checking favorites: {e}")
+        return FavoritesContainsResponse(success=False, favorited={})
+    return FavoritesContainsResponse(success=True, favorited=favorited)
+
+
+def _parse_album_fields(fields: str | None) -> list[str] | None:
+    if not fields:
+        return None
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = sorted(set(names) - FAVORITE_ALBUM_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown album fields: {', '.join(unknown)}")
+    return names
+
+
 @app.get("/api/v1/favorites")
 async def get_user_favorites(
+    request: Request,
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str | None = None,
+    fields: str | None = Query(None, description="Comma-separated album fields to return"),
+    ids_only: bool = False,
     user_id: str = Depends(get_current_user),
     authorization: str = Header(None)
 ) -> UserFavoritesList:
-    """Get all of a user's favorite albums"""
+    """Get a page of a user's favorite albums, newest first.
+
+    Pass the returned ``next_cursor`` back as ``cursor`` for the next page.
+    ``fields`` trims each album to the named fields; ``ids_only`` returns
+    just favorite and album ids. Supports ``If-None-Match``: an unchanged
+    list answers 304 after only the cheap favorites-version lookup.
+    """
+    _validate_cursor(cursor)
+    album_fields = _parse_album_fields(fields)
+    etag = await _favorites_etag(user_id, request)
+    if etag and (not_modified := _not_modified(request, etag)):
+        return not_modified
     token = authorization.replace("Bearer ", "") if authorization else None
-    return await favorites_service.get_user_favorites(user_id, token)
+    result = await favorites_service.get_user_favorites(
+        user_id, token, limit=limit, cursor=cursor, album_fields=album_fields, ids_only=ids_only
+    )
+    if etag and result.success:
+        _set_etag(response, etag)
+    return result
 
 
 @app.get("/api/v1/favorites/with-details")
 async def get_favorites_with_details(
+    request: Request,
+    response: Response,
     user_id: str = Depends(get_current_user),
     authorization: str = Header(None)
 ) -> dict[str, Any]:
     """Get user's favorites"""
+    etag = await _favorites_etag(user_id, request)
+    if etag and (not_modified := _not_modified(request, etag)):
+        return not_modified
     token = authorization.replace("Bearer ", "") if authorization else None
-    return await favorites_service.get_favorites_with_album_details(user_id, token)
+    result = await favorites_service.get_favorites_with_album_details(user_id, token)
+    if etag and result.get("success"):
+        _set_etag(response, etag)
+    return result
 
 
 @app.post("/api/v1/analytics/track-click")
@@ -1024,104 +1233,290 @@ async def track_album_click(
     return {"success": True}
 
 
+@app.post("/api/v1/analytics/events")
+async def track_events(
+    request: TrackEventsRequest,
+    authorization: str = Header(None)
+) -> TrackEventsResponse:
+    """Track a batch of album clicks, favorites and dwell times.
+
+    The token (if any) is verified once for the whole batch, and the events
+    are written to search_clicks in as few PocketBase batch requests as
+    fit. If any of those fail, ``success`` is False and ``recorded`` counts
+    only the events that were stored.
+    """
+    user_email = None
+    if authorization and authorization.startswith("Bearer "):
+        try:
+            token = authorization.replace("Bearer ", "")
+            user = await authenticate_token(token)
+            user_email = user.email
+        except HTTPException:
+            pass
+
+    return await search_session_service.track_events(request.events, user_email=user_email)
+
+
 @app.get("/api/v1/analytics/sessions")
 async def get_search_sessions(
-    limit: int = 50,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str | None = None,
     authorization: str = Header(None)
 ):
-    """Get search sessions for analytics. Requires auth."""
+    """Get search sessions for analytics. Requires auth.
+
+    Pass the returned ``next_cursor`` back as ``cursor`` for the next page.
+    """
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Authorization required")
 
     user = await authenticate_token(authorization.replace("Bearer ", ""))
 
-    sessions = await search_session_service.get_sessions(user_email=user.email, limit=limit)
-    return {"sessions": sessions}
+    _validate_cursor(cursor)
+    page = await search_session_service.get_sessions(
+        user_email=user.email, limit=limit, cursor=cursor
+    )
+    return ORJSONResponse({"sessions": page.items, "next_cursor": page.next_cursor})
 
 
 @app.get("/api/v1/analytics/sessions/{session_id}")
 async def get_session_analytics(
     session_id: str,
+    include_events: bool = False,
     authorization: str = Header(None),
 ):
-    """Get detailed analytics for a single search session. Requires auth and ownership."""
+    """Get analytics for a single search session. Requires auth and ownership.
+
+    Returns the session's rollup counters and rates; pass
+    ``include_events=true`` to also load its outputs, clicks and filtered
+    albums.
+    """
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Authorization required")
 
     user = await authenticate_token(authorization.replace("Bearer ", ""))
 
-    analytics = await search_session_service.get_session_analytics(session_id)
+    analytics = await search_session_service.get_session_analytics(
+        session_id, include_events=include_events
+    )
     if not analytics:
         raise HTTPException(status_code=404, detail="Session not found")
     if analytics.get("user_email") != user.email:
         raise HTTPException(status_code=403, detail="Not authorized to view this session")
 
-    return analytics
+    return ORJSONResponse(analytics)
+
+
+@app.get("/api/v1/analytics/sessions/{session_id}/raw-response")
+async def get_session_raw_response(
+    session_id: str,
+    authorization: str = Header(None),
+):
+    """Get the AI's raw response for one search session. Requires auth and ownership.
+
+    Transcripts are stored compressed outside the session record and only
+    loaded here; ``raw_response`` is null if the search wasn't sampled.
+    """
+    if not authorization or not authorization.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Authorization required")
+
+    user = await authenticate_token(authorization.replace("Bearer ", ""))
+
+    result = await search_session_service.get_raw_response(session_id)
+    if not result:
+        raise HTTPException(status_code=404, detail="Session not found")
+    if result["user_email"] != user.email:
+        raise HTTPException(status_code=403, detail="Not authorized to view this session")
+
+    return ORJSONResponse({"session_id": result["session_id"], "raw_response": result["raw_response"]})
 
 
-async def _fetch_sessions_with_outputs(user_email: str, limit: int) -> list[dict[str, Any]]:
-    """Fetch a user's search_inputs (sessions) with their search_outputs.
+def _validate_cursor(cursor: str | None) -> None:
+    """Reject a malformed pagination cursor with a 400 before doing any work."""
+    if cursor:
+        try:
+            decode_cursor(cursor)
+        except InvalidCursorError as e:
+            raise HTTPException(status_code=400, detail="Invalid cursor") from e
+
+
+# Everything on search_inputs except the legacy inline raw_response, which
+# can be tens of KB per row and none of the analytics read models use.
+_SESSION_LIST_FIELDS = (
+    "id,created,query,user_email,ip_address,user_agent,ai_model,"
+    "results_count,raw_results_count,filtered_count"
+)
+
+
+async def _fetch_sessions_with_outputs(
+    user_email: str, limit: int, cursor: str | None = None
+) -> Page:
+    """Fetch a page of a user's search_inputs (sessions) with their search_outputs.
 
     Replicates the LEFT JOIN + user_email filter the old search_results/
     search_summary Postgres views did — session-level rows up to `limit`,
     each carrying its outputs list for the caller to flatten or aggregate.
     """
-    sessions = await pocketbase_client.list_records(
+    page = await pocketbase_client.list_page(
         "search_inputs",
+        limit=limit,
+        cursor=cursor,
         filter=f"user_email = {escape_filter_value(user_email)}",
-        sort="-created",
-        perPage=limit,
+        fields=_SESSION_LIST_FIELDS,
     )
-    for session in sessions:
-        session["outputs"] = await pocketbase_client.list_records(
-            "search_outputs",
-            filter=f"session = {escape_filter_value(session['id'])}",
-            sort="rank",
-        )
-    return sessions
+    outputs = await pocketbase_client.prefetch_related(page.items, "search_outputs", "session", sort="rank")
+    for session in page.items:
+        session["outputs"] = outputs[session["id"]]
+    return page
 
 
 @app.get("/api/v1/analytics/search-results")
 async def get_search_results(
-    limit: int = 50,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str | None = None,
     authorization: str = Header(None)
 ):
-    """Row-per-output analytics, replacing the old search_results SQL view."""
+    """Row-per-output analytics, replacing the old search_results SQL view.
+
+    ``limit`` counts sessions, not rows: each page holds every row of
+    ``limit`` sessions, so a page boundary never splits a session and
+    ``next_cursor`` can resume exactly after it.
+    """
+    if not authorization or not authorization.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Authorization required")
+
+    user = await authenticate_token(authorization.replace("Bearer ", ""))
+    _validate_cursor(cursor)
+    page = await _fetch_sessions_with_outputs(user.email, limit, cursor)
+
+    rows = [
+        _search_result_row(session, output)
+        for session in page.items
+        for output in session["outputs"] or [{}]
+    ]
+    return ORJSONResponse({"results": rows, "next_cursor": page.next_cursor})
+
+
+SEARCH_RESULT_COLUMNS = [
+    "input_id", "query", "user_email", "ip_address", "user_agent", "ai_model",
+    "results_count", "raw_results_count", "filtered_count", "created_at",
+    "output_id", "album_title", "album_artist", "album_year", "album_genre",
+    "rank", "is_verified", "verification_source",
+]
+
+_EXPORT_PAGE_SIZE = 100
+
+
+def _search_result_row(session: dict[str, Any], output: dict[str, Any]) -> dict[str, Any]:
+    """One row of the old search_results view: a session joined to one output."""
+    return {
+        "input_id": session["id"],
+        "query": session["query"],
+        "user_email": session.get("user_email"),
+        "ip_address": session.get("ip_address"),
+        "user_agent": session.get("user_agent"),
+        "ai_model": session.get("ai_model"),
+        "results_count": session.get("results_count"),
+        "raw_results_count": session.get("raw_results_count"),
+        "filtered_count": session.get("filtered_count"),
+        "created_at": session["created"],
+        "output_id": output.get("id"),
+        "album_title": output.get("album_title"),
+        "album_artist": output.get("album_artist"),
+        "album_year": output.get("album_year"),
+        "album_genre": output.get("album_genre"),
+        "rank": output.get("rank"),
+        "is_verified": output.get("is_verified"),
+        "verification_source": output.get("verification_source"),
+    }
+
+
+async def _iter_search_result_rows(
+    user_email: str, cursor: str | None
+) -> AsyncIterator[dict[str, Any]]:
+    """Yield search_results rows newest-first, one page of sessions at a time.
+
+    Only one page of sessions and their outputs is held in memory. Each row
+    carries a ``resume_cursor`` that restarts the export at the start of
+    that row's session, so a client whose stream was cut can resume from
+    its last row and at most re-receive that session's rows.
+
+    The 200 status is already sent once streaming starts, so if PocketBase
+    fails mid-export the stream ends with an ``error`` row instead, whose
+    ``resume_cursor`` is the page that couldn't be fetched. A client can
+    tell the export was cut and resume without re-receiving anything.
+    """
+    while True:
+        try:
+            page = await _fetch_sessions_with_outputs(user_email, _EXPORT_PAGE_SIZE, cursor)
+        except PocketBaseError as e:
+            logger.error(f"Search results export aborted: {e}")
+            yield {"error": "Export interrupted; resume it with resume_cursor", "resume_cursor": cursor}
+            return
+        resume_cursor = cursor
+        for session in page.items:
+            for output in session["outputs"] or [{}]:
+                yield {**_search_result_row(session, output), "resume_cursor": resume_cursor}
+            resume_cursor = encode_cursor(session)
+        if not page.next_cursor:
+            return
+        cursor = page.next_cursor
+
+
+# Both close ``rows`` along with themselves, so an export whose client
+# disconnected stops paging PocketBase right away, not at garbage collection.
+async def _ndjson_lines(rows: AsyncIterator[dict[str, Any]]) -> AsyncIterator[str]:
+    async with aclosing(rows):
+        async for row in rows:
+            yield json.dumps(row, default=str) + "\n"
+
+
+async def _csv_lines(rows: AsyncIterator[dict[str, Any]]) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=[*SEARCH_RESULT_COLUMNS, "resume_cursor", "error"])
+    writer.writeheader()
+    async with aclosing(rows):
+        async for row in rows:
+            writer.writerow(row)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+@app.get("/api/v1/analytics/search-results/export")
+async def export_search_results(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    cursor: str | None = None,
+    authorization: str = Header(None)
+) -> StreamingResponse:
+    """Stream every search_results row for the caller as NDJSON or CSV.
+
+    Rows are produced page by page from PocketBase, so memory use stays
+    flat however long the history is. Pass a row's ``resume_cursor`` as
+    ``cursor`` to pick an interrupted export back up. If PocketBase fails
+    mid-export, the last row has an ``error`` and the cursor to resume from.
+    """
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Authorization required")
 
     user = await authenticate_token(authorization.replace("Bearer ", ""))
-    sessions = await _fetch_sessions_with_outputs(user.email, limit)
-
-    rows = []
-    for session in sessions:
-        for output in session["outputs"] or [{}]:
-            rows.append({
-                "input_id": session["id"],
-                "query": session["query"],
-                "user_email": session.get("user_email"),
-                "ip_address": session.get("ip_address"),
-                "user_agent": session.get("user_agent"),
-                "ai_model": session.get("ai_model"),
-                "results_count": session.get("results_count"),
-                "raw_results_count": session.get("raw_results_count"),
-                "filtered_count": session.get("filtered_count"),
-                "created_at": session["created"],
-                "output_id": output.get("id"),
-                "album_title": output.get("album_title"),
-                "album_artist": output.get("album_artist"),
-                "album_year": output.get("album_year"),
-                "album_genre": output.get("album_genre"),
-                "rank": output.get("rank"),
-                "is_verified": output.get("is_verified"),
-                "verification_source": output.get("verification_source"),
-            })
-    return {"results": rows[:limit]}
+    _validate_cursor(cursor)
+
+    rows = _iter_search_result_rows(user.email, cursor)
+    if format == "csv":
+        return StreamingResponse(
+            _csv_lines(rows),
+            media_type="text/csv",
+            headers={"Content-Disposition": 'attachment; filename="search-results.csv"'},
+        )
+    return StreamingResponse(_ndjson_lines(rows), media_type="application/x-ndjson")
 
 
 @app.get("/api/v1/analytics/search-summary")
 async def get_search_summary(
-    limit: int = 50,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str | None = None,
     authorization: str = Header(None)
 ):
     """Per-session summary analytics, replacing the old search_summary SQL view."""
@@ -1129,10 +1524,11 @@ async def get_search_summary(
         raise HTTPException(status_code=401, detail="Authorization required")
 
     user = await authenticate_token(authorization.replace("Bearer ", ""))
-    sessions = await _fetch_sessions_with_outputs(user.email, limit)
+    _validate_cursor(cursor)
+    page = await _fetch_sessions_with_outputs(user.email, limit, cursor)
 
     summaries = []
-    for session in sessions:
+    for session in page.items:
         outputs = session["outputs"]
         summaries.append({
             "id": session["id"],
@@ -1145,6 +1541,6 @@ async def get_search_summary(
             "output_count": len(outputs),
             "albums": [f"{o['album_title']} by {o['album_artist']}" for o in outputs] if outputs else None,
         })
-    return {"summaries": summaries}
+    return ORJSONResponse({"summaries": summaries, "next_cursor": page.next_cursor})
 
 
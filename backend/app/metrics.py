@@ -0,0 +1,430 @@
+import math
+import re
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from typing import Any, TypeVar
+
+import httpx
+
+from app import tracing
+
+# Prometheus' default buckets, stretched to cover AI calls that take a minute.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = tuple[str, ...]
+M = TypeVar("M", bound="Metric")
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values, strict=True)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, Any]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Gauge(Metric):
+    """A value read at scrape time. ``set`` is normally called from a
+    collector registered with ``Registry.on_collect``."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = (*sorted(buckets), math.inf)
+        # label values -> (per-bucket counts, sum)
+        self._values: dict[LabelValues, tuple[list[int], float]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        index = next(i for i, bound in enumerate(self.buckets) if value <= bound)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * len(self.buckets), 0.0)
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: Any) -> int:
+        counts, _ = self._values.get(self._key(labels)) or ([], 0.0)
+        return sum(counts)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts, strict=True):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Registry:
+    """Every metric the process exports, rendered in the Prometheus text
+    exposition format."""
+
+    def __init__(self) -> None:
+        self._metrics: list[Metric] = []
+        self._collectors: list[Callable[[], None]] = []
+
+    def register(self, metric: M) -> M:
+        self._metrics.append(metric)
+        return metric
+
+    def on_collect(self, collector: Callable[[], None]) -> None:
+        """Run ``collector`` before each render, to refresh gauges whose
+        value is read from elsewhere (pool sizes, cache sizes)."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            collector()
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames))
+
+
+UPSTREAM_REQUEST_SECONDS = histogram(
+    "deepcuts_upstream_request_duration_seconds",
+    "Time to response headers for Spotify and Discogs calls.",
+    ("upstream", "endpoint"),
+)
+UPSTREAM_RESPONSES = counter(
+    "deepcuts_upstream_responses_total",
+    "Spotify and Discogs responses by status code; 'error' when no response arrived.",
+    ("upstream", "endpoint", "status"),
+)
+AI_REQUEST_SECONDS = histogram(
+    "deepcuts_ai_request_duration_seconds",
+    "Duration of recommendation calls to the AI provider, to the last token.",
+    ("provider", "model"),
+)
+AI_RESPONSES = counter(
+    "deepcuts_ai_responses_total",
+    "Recommendation calls to the AI provider by status code; 'error' when no status was returned.",
+    ("provider", "model", "status"),
+)
+AI_TOKENS = counter(
+    "deepcuts_ai_tokens_total",
+    "Tokens used by recommendation calls.",
+    ("provider", "model", "direction"),
+)
+ALBUM_VERIFICATIONS = counter(
+    "deepcuts_album_verifications_total",
+    "verify_album_exists outcomes: verified, not_found, or assumed_real when the "
+    "lookups failed or weren't configured.",
+    ("result",),
+)
+POCKETBASE_REQUEST_SECONDS = histogram(
+    "deepcuts_pocketbase_request_duration_seconds",
+    "Time to response headers for PocketBase calls.",
+    ("collection", "method"),
+)
+POCKETBASE_REQUESTS = counter(
+    "deepcuts_pocketbase_requests_total",
+    "PocketBase calls by collection and status code; 'error' when PocketBase was unreachable.",
+    ("collection", "method", "status"),
+)
+CACHE_REQUESTS = counter(
+    "deepcuts_cache_requests_total",
+    "In-process cache lookups by result (hit or miss).",
+    ("cache", "result"),
+)
+TRACES_DROPPED = counter(
+    "deepcuts_traces_dropped_total",
+    "Traces not exported because the trace exporter's queue was full.",
+)
+CACHE_ENTRIES = gauge(
+    "deepcuts_cache_entries",
+    "Entries currently held by each in-process cache.",
+    ("cache",),
+)
+POOL_IN_FLIGHT_REQUESTS = gauge(
+    "deepcuts_http_pool_in_flight_requests",
+    "Requests each HTTP client has sent whose response isn't closed yet, queued ones included.",
+    ("client",),
+)
+POOL_MAX_CONNECTIONS = gauge(
+    "deepcuts_http_pool_max_connections",
+    "Connection limit of each HTTP client's pool.",
+    ("client",),
+)
+POOL_QUEUED_REQUESTS = gauge(
+    "deepcuts_http_pool_queued_requests",
+    "Requests waiting for a free connection in each HTTP client's pool.",
+    ("client",),
+)
+
+
+# Discogs ids are numeric, Spotify's are 22-character base62.
+_ID_SEGMENT = re.compile(r"\d+|[0-9A-Za-z]{16,}")
+
+
+def endpoint_label(path: str) -> str:
+    """``path`` with its id segments templated, so ``/releases/1234`` and
+    ``/releases/5678`` share one series."""
+    return "/".join(
+        "{id}" if _ID_SEGMENT.fullmatch(segment) else segment for segment in path.split("/")
+    )
+
+
+def pocketbase_collection(path: str) -> str:
+    """The collection a PocketBase API path addresses, or the path's first
+    segment after ``/api/`` (``batch``, ``health``) for everything else."""
+    parts = path.split("/")
+    if len(parts) > 3 and parts[1] == "api" and parts[2] == "collections":
+        return parts[3]
+    return parts[2] if len(parts) > 2 else path
+
+
+# httpx's own pool limits, for transports built without explicit ones.
+DEFAULT_POOL_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20)
+
+
+class _ReleasingStream(httpx.SyncByteStream, httpx.AsyncByteStream):
+    """A response body stream that calls ``release`` once, when closed."""
+
+    def __init__(self, stream: Any, release: Callable[[], None]):
+        self.stream = stream
+        self._release = release
+        self._released = False
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield from self.stream
+
+    async def __aiter__(self):
+        async for chunk in self.stream:
+            yield chunk
+
+    def _release_once(self) -> None:
+        if not self._released:
+            self._released = True
+            self._release()
+
+    def close(self) -> None:
+        try:
+            self.stream.close()
+        finally:
+            self._release_once()
+
+    async def aclose(self) -> None:
+        try:
+            await self.stream.aclose()
+        finally:
+            self._release_once()
+
+
+class _PoolCounting:
+    """Counts the requests in flight through a transport, each from when it
+    is sent until its response is closed, for the pool gauges. A request
+    holds a connection for all of that time, so those beyond
+    ``max_connections`` can only be waiting for one."""
+
+    def __init__(self, limits: httpx.Limits):
+        self.max_connections = limits.max_connections
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def queued(self) -> int:
+        if self.max_connections is None:
+            return 0
+        return max(0, self.in_flight - self.max_connections)
+
+    def _count(self, delta: int) -> None:
+        with self._lock:
+            self.in_flight += delta
+
+    def _counted(self, response: httpx.Response) -> httpx.Response:
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=_ReleasingStream(response.stream, lambda: self._count(-1)),
+            extensions=response.extensions,
+        )
+
+
+class CountingTransport(_PoolCounting, httpx.AsyncBaseTransport):
+    """Sends requests through ``inner``, by default a pooled transport with
+    ``limits``, counting them for the pool gauges. ``limits`` must be the
+    ones ``inner``'s pool was built with."""
+
+    def __init__(self, inner: httpx.AsyncBaseTransport | None = None, limits: httpx.Limits = DEFAULT_POOL_LIMITS):
+        super().__init__(limits)
+        self.inner = inner or httpx.AsyncHTTPTransport(limits=limits)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self._count(1)
+        try:
+            response = await self.inner.handle_async_request(request)
+        except BaseException:
+            self._count(-1)
+            raise
+        return self._counted(response)
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+
+class SyncCountingTransport(_PoolCounting, httpx.BaseTransport):
+    """``CountingTransport`` for a synchronous client."""
+
+    def __init__(self, inner: httpx.BaseTransport | None = None, limits: httpx.Limits = DEFAULT_POOL_LIMITS):
+        super().__init__(limits)
+        self.inner = inner or httpx.HTTPTransport(limits=limits)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self._count(1)
+        try:
+            response = self.inner.handle_request(request)
+        except BaseException:
+            self._count(-1)
+            raise
+        return self._counted(response)
+
+    def close(self) -> None:
+        self.inner.close()
+
+
+class InstrumentedTransport(CountingTransport):
+    """Records the latency and status of every request sent through
+    ``inner`` into the upstream metrics, labelled by host and endpoint,
+    and as a client span of the current trace."""
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        upstream, endpoint = request.url.host, endpoint_label(request.url.path)
+        status = "error"
+        try:
+            with (
+                tracing.span(
+                    f"{request.method} {upstream}{endpoint}",
+                    kind=tracing.SPAN_KIND_CLIENT,
+                    **{"http.request.method": request.method, "server.address": upstream, "url.path": endpoint},
+                ),
+                UPSTREAM_REQUEST_SECONDS.time(upstream=upstream, endpoint=endpoint),
+            ):
+                response = await super().handle_async_request(request)
+                tracing.set_attribute("http.response.status_code", response.status_code)
+            status = str(response.status_code)
+            return response
+        finally:
+            UPSTREAM_RESPONSES.inc(upstream=upstream, endpoint=endpoint, status=status)
+
+
+def observe_pool(name: str, transport: CountingTransport | SyncCountingTransport | None) -> None:
+    """Set the pool gauges for the client that sends through ``transport``."""
+    if transport is None:
+        return
+    POOL_IN_FLIGHT_REQUESTS.set(transport.in_flight, client=name)
+    POOL_QUEUED_REQUESTS.set(transport.queued, client=name)
+    if transport.max_connections is not None:
+        POOL_MAX_CONNECTIONS.set(transport.max_connections, client=name)
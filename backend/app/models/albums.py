@@ -96,3 +96,10 @@ class SearchResponse(BaseModel):
             "results' in the UI."
         ),
     )
+    timings: dict[str, float] | None = Field(
+        default=None,
+        description=(
+            "Milliseconds spent in each stage of the search, as in the "
+            "Server-Timing header. Only returned with ?debug=true."
+        ),
+    )
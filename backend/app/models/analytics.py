@@ -0,0 +1,25 @@
+from typing import Literal
+
+from pydantic import BaseModel, Field
+
+EventType = Literal["click", "favorite", "unfavorite", "dwell"]
+
+
+class AnalyticsEvent(BaseModel):
+    """A single client-side interaction with a search result"""
+    type: EventType = Field(..., description="What the user did")
+    session_id: str | None = Field(None, description="Search session the album came from")
+    title: str = Field("", description="Album title")
+    artist: str = Field("", description="Album artist")
+    dwell_ms: int | None = Field(None, ge=0, description="Time spent on album details, for 'dwell' events")
+
+
+class TrackEventsRequest(BaseModel):
+    """A batch of client-side events, flushed together by the frontend"""
+    events: list[AnalyticsEvent] = Field(..., max_length=200, description="Events to record")
+
+
+class TrackEventsResponse(BaseModel):
+    """Response for a batched event write"""
+    success: bool = Field(..., description="True if every event in the batch was stored")
+    recorded: int = Field(..., description="Number of events written; fewer than sent when success is False")
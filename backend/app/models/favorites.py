@@ -21,4 +21,16 @@ class UserFavoritesList(BaseModel):
     """Response for getting user's favorites list"""
     success: bool = Field(..., description="True if the request worked")
     favorites: list = Field(..., description="List of favorited albums")
-    total: int = Field(..., description="Total number of favorites")
+    total: int = Field(..., description="Number of favorites returned")
+    next_cursor: str | None = Field(None, description="Cursor for the next page, if there is one")
+
+
+class FavoritesContainsRequest(BaseModel):
+    """Albums to check against the user's favorites"""
+    keys: list[str] = Field(..., max_length=100, description='Album keys as "title|artist"')
+
+
+class FavoritesContainsResponse(BaseModel):
+    """Which of the requested albums the user has favorited"""
+    success: bool = Field(..., description="True if the lookup worked")
+    favorited: dict[str, bool] = Field(..., description="Each requested key mapped to whether it is favorited")
@@ -0,0 +1,226 @@
+import asyncio
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from types import FrameType
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.config import settings
+
+
+@dataclass(eq=False)
+class Profile:
+    """Stacks sampled from one thread, or from every thread when
+    ``thread_id`` is None, counted by collapsed stack."""
+
+    thread_id: int | None
+    # perf_counter time from which samples are taken.
+    sample_from: float
+    started: float = field(default_factory=time.perf_counter)
+    stacks: Counter[str] = field(default_factory=Counter)
+
+    @property
+    def samples(self) -> int:
+        return sum(self.stacks.values())
+
+    def collapsed(self) -> str:
+        """The samples in Brendan Gregg's collapsed-stack format, one
+        ``root;...;leaf count`` line per stack, as read by flamegraph.pl,
+        speedscope and inferno."""
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.stacks.items()))
+
+
+def _frame_name(frame: FrameType) -> str:
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_qualname}"
+
+
+def fold(frame: FrameType | None) -> str:
+    """``frame``'s stack as one collapsed-stack line, root first."""
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class StackSampler:
+    """Samples thread stacks through ``sys._current_frames`` from a daemon
+    helper thread, every ``interval`` seconds, into each watched profile
+    that has reached its ``sample_from`` time.
+
+    On the event-loop thread this is the stack of whatever is running
+    right now: the coroutine being stepped, or a blocking call that holds
+    the loop up. Coroutines parked at an ``await`` aren't on any stack, so
+    a request that is slow only because it awaits shows up as the loop
+    idling in ``select``.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._profiles: list[Profile] = []
+        self._wakeup = threading.Condition()
+        self._thread: threading.Thread | None = None
+
+    def watch(self, profile: Profile) -> None:
+        with self._wakeup:
+            self._profiles.append(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+            self._wakeup.notify()
+
+    def unwatch(self, profile: Profile) -> None:
+        with self._wakeup:
+            self._profiles.remove(profile)
+
+    def _run(self) -> None:
+        while True:
+            with self._wakeup:
+                due = self._wait_for_due()
+                self._sample(due)
+            time.sleep(self.interval)
+
+    def _wait_for_due(self) -> list[Profile]:
+        # Sleeps until the earliest profile starts sampling, rather than
+        # polling for requests that haven't become slow yet.
+        while True:
+            now = time.perf_counter()
+            due = [p for p in self._profiles if p.sample_from <= now]
+            if due:
+                return due
+            earliest = min((p.sample_from for p in self._profiles), default=None)
+            self._wakeup.wait(None if earliest is None else earliest - now)
+
+    def _sample(self, profiles: list[Profile]) -> None:
+        frames = sys._current_frames()
+        own = threading.get_ident()
+        folded: dict[int, str] = {}
+
+        def stack(thread_id: int) -> str:
+            if thread_id not in folded:
+                folded[thread_id] = fold(frames.get(thread_id))
+            return folded[thread_id]
+
+        names = None
+        for profile in profiles:
+            if profile.thread_id is not None:
+                if profile.thread_id in frames:
+                    profile.stacks[stack(profile.thread_id)] += 1
+                continue
+            if names is None:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id in frames:
+                if thread_id != own:
+                    thread = names.get(thread_id, f"thread-{thread_id}")
+                    profile.stacks[f"{thread};{stack(thread_id)}"] += 1
+
+
+sampler = StackSampler(settings.PROFILE_INTERVAL_MS / 1000)
+
+_on_demand: Profile | None = None
+_on_demand_lock = threading.Lock()
+
+
+@contextmanager
+def profile_if_slow(threshold_ms: float) -> Iterator[Profile]:
+    """Sample the calling thread's stack, normally the event loop's, once
+    the block has been running for ``threshold_ms``. The profile stays
+    empty for blocks that finish sooner."""
+    profile = Profile(threading.get_ident(), time.perf_counter() + threshold_ms / 1000)
+    sampler.watch(profile)
+    try:
+        yield profile
+    finally:
+        sampler.unwatch(profile)
+
+
+def start_on_demand() -> bool:
+    """Start sampling every thread of the process until ``stop_on_demand``.
+    Returns False if that profile is already running."""
+    global _on_demand
+    with _on_demand_lock:
+        if _on_demand is not None:
+            return False
+        _on_demand = Profile(thread_id=None, sample_from=time.perf_counter())
+        sampler.watch(_on_demand)
+        return True
+
+
+def stop_on_demand() -> Profile | None:
+    """Stop the on-demand profile and return it, or None if none was running."""
+    global _on_demand
+    with _on_demand_lock:
+        profile, _on_demand = _on_demand, None
+    if profile is not None:
+        sampler.unwatch(profile)
+    return profile
+
+
+def _slug(value: str) -> str:
+    return re.sub(r"[^0-9A-Za-z]+", "-", value).strip("-")
+
+
+def save(profile: Profile, route: str, session_id: str | None = None) -> str | None:
+    """Write ``profile`` to ``PROFILE_DIR`` as a ``.folded`` collapsed-stack
+    file named after the time, route, session and duration, and return its
+    path; None if it couldn't be written."""
+    duration_ms = round((time.perf_counter() - profile.started) * 1000)
+    name = "_".join(filter(None, [
+        datetime.now(UTC).strftime("%Y%m%dT%H%M%S%fZ"),
+        _slug(route) or "root",
+        _slug(session_id or ""),
+        f"{duration_ms}ms",
+    ]))
+    path = os.path.join(settings.PROFILE_DIR, f"{name}.folded")
+    try:
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(profile.collapsed())
+    except OSError as e:
+        logging.getLogger("deepcuts").warning(f"Could not write profile {path}: {e}")
+        return None
+    return path
+
+
+class ProfileMiddleware:
+    """With ``PROFILE_SLOW_MS`` set, samples the event loop's stack during
+    any HTTP request that runs longer, and writes the samples to a
+    collapsed-stack file tagged with the route and search session.
+
+    A pure ASGI middleware, so the profile stays open until the last of the
+    body is sent and streamed responses are sampled in full. Endpoints tag
+    the file with a session by setting ``request.state.session_id``; routes
+    with a ``{session_id}`` path parameter are tagged with it.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or settings.PROFILE_SLOW_MS is None:
+            await self.app(scope, receive, send)
+            return
+
+        state = scope.setdefault("state", {})
+        with profile_if_slow(settings.PROFILE_SLOW_MS) as profile:
+            await self.app(scope, receive, send)
+        if not profile.samples:
+            return
+
+        route = scope.get("route")
+        session_id = state.get("session_id") or scope.get("path_params", {}).get("session_id")
+        label = f"{scope['method']} {route.path if route else scope['path']}"
+        path = await asyncio.to_thread(save, profile, label, session_id)
+        if path:
+            logging.getLogger("deepcuts").warning(
+                f"Slow request {scope['method']} {scope['path']}: profile written to {path}"
+            )
@@ -1,12 +1,23 @@
 import logging
 import os
 import re
+import time
 import uuid
 from dataclasses import dataclass
 from typing import Any
 
 import anthropic
 
+from app import timing, tracing
+from app.config import settings
+from app.metrics import (
+    AI_REQUEST_SECONDS,
+    AI_RESPONSES,
+    AI_TOKENS,
+    REGISTRY,
+    SyncCountingTransport,
+    observe_pool,
+)
 from app.models.albums import AlbumData
 from app.services.render_api import update_render_env_var
 
@@ -97,14 +108,28 @@ class AIService:
 
         gemini_key = os.getenv("GEMINI_API_KEY")
         if gemini_key:
-            genai.configure(api_key=gemini_key)
+            if settings.GEMINI_API_URL:
+                # A custom endpoint is only reachable over REST; the default
+                # gRPC transport can't be pointed at a plain HTTP server.
+                genai.configure(
+                    api_key=gemini_key,
+                    transport="rest",
+                    client_options={"api_endpoint": settings.GEMINI_API_URL},
+                )
+            else:
+                genai.configure(api_key=gemini_key)
             self.gemini_configured = True
         else:
             self.gemini_configured = False
 
         claude_key = os.getenv("CLAUDE_API_KEY")
         if claude_key:
-            self.claude_client = anthropic.Anthropic(api_key=claude_key)
+            self.claude_transport = SyncCountingTransport(limits=anthropic.DEFAULT_CONNECTION_LIMITS)
+            self.claude_client = anthropic.Anthropic(
+                api_key=claude_key,
+                base_url=settings.ANTHROPIC_BASE_URL,
+                http_client=anthropic.DefaultHttpxClient(transport=self.claude_transport),
+            )
             self.claude_configured = True
         else:
             self.claude_configured = False
@@ -445,6 +470,80 @@ class AIService:
 
         return recommendations
 
+    def _generate(self, prompt: str) -> str:
+        """Send the prompt and return the full response text.
+
+        The response is streamed only so the first chunk's arrival can be
+        recorded as the ``ai_ttft`` stage; the text is used once complete.
+        """
+        provider = "gemini" if self.is_gemini else "anthropic"
+        model = self.ACTIVE_MODEL
+        status = "error"
+        try:
+            with (
+                tracing.span(
+                    "ai.generate",
+                    kind=tracing.SPAN_KIND_CLIENT,
+                    **{"gen_ai.system": provider, "gen_ai.request.model": model},
+                ),
+                AI_REQUEST_SECONDS.time(provider=provider, model=model),
+            ):
+                if self.is_gemini:
+                    text, usage = self._generate_gemini(prompt)
+                else:
+                    text, usage = self._generate_claude(prompt)
+                tracing.set_attribute("gen_ai.usage.input_tokens", usage["input"])
+                tracing.set_attribute("gen_ai.usage.output_tokens", usage["output"])
+            status = "200"
+        except Exception as e:
+            code = getattr(e, "status_code", None) or getattr(e, "code", None)
+            if isinstance(code, int):
+                status = str(int(code))
+            raise
+        finally:
+            AI_RESPONSES.inc(provider=provider, model=model, status=status)
+
+        for direction, count in usage.items():
+            AI_TOKENS.inc(count, provider=provider, model=model, direction=direction)
+        return text
+
+    def _generate_gemini(self, prompt: str) -> tuple[str, dict[str, int]]:
+        started = time.perf_counter()
+        response = self.client.generate_content(prompt, stream=True)
+        for i, _ in enumerate(response):
+            if i == 0:
+                timing.mark("ai_ttft", started)
+                tracing.add_event("first_token")
+
+        usage = getattr(response, "usage_metadata", None)
+        tokens = {
+            "input": getattr(usage, "prompt_token_count", 0),
+            "output": getattr(usage, "candidates_token_count", 0),
+        }
+        return response.text, tokens
+
+    def _generate_claude(self, prompt: str) -> tuple[str, dict[str, int]]:
+        started = time.perf_counter()
+        with self.client.messages.stream(
+            model=self.ACTIVE_MODEL,
+            max_tokens=16384,
+            messages=[
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ]
+        ) as stream:
+            for i, _ in enumerate(stream.text_stream):
+                if i == 0:
+                    timing.mark("ai_ttft", started)
+                    tracing.add_event("first_token")
+            message = stream.get_final_message()
+
+        text = "".join(block.text for block in message.content if block.type == "text")
+        tokens = {"input": message.usage.input_tokens, "output": message.usage.output_tokens}
+        return text, tokens
+
     async def get_album_recommendations(
         self,
         album_name: str,
@@ -452,44 +551,33 @@ class AIService:
         exclude: list[str] | None = None,
     ) -> RecommendationResult:
         try:
-            prompt = self.get_recommendation_prompt(album_name)
-
-            if feedback:
-                prompt += f"\n\n{feedback}"
-
-            if exclude:
-                formatted = []
-                for key in exclude:
-                    if "|" in key:
-                        t, a = key.split("|", 1)
-                        formatted.append(f"- {t.strip()} by {a.strip()}")
-                    else:
-                        formatted.append(f"- {key.strip()}")
-                prompt += (
-                    "\n\nDo NOT recommend any of these albums (the user has already seen them):\n"
-                    + "\n".join(formatted)
-                    + "\n\nReturn entirely new recommendations."
-                )
-
-            if self.is_gemini:
-                response = self.client.generate_content(prompt)
-                response_text = response.text
-            else:
-                message = self.client.messages.create(
-                    model=self.ACTIVE_MODEL,
-                    max_tokens=16384,
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ]
-                )
-                response_text = message.content[0].text
+            with timing.stage("prompt"):
+                prompt = self.get_recommendation_prompt(album_name)
+
+                if feedback:
+                    prompt += f"\n\n{feedback}"
+
+                if exclude:
+                    formatted = []
+                    for key in exclude:
+                        if "|" in key:
+                            t, a = key.split("|", 1)
+                            formatted.append(f"- {t.strip()} by {a.strip()}")
+                        else:
+                            formatted.append(f"- {key.strip()}")
+                    prompt += (
+                        "\n\nDo NOT recommend any of these albums (the user has already seen them):\n"
+                        + "\n".join(formatted)
+                        + "\n\nReturn entirely new recommendations."
+                    )
+
+            with timing.stage("ai"):
+                response_text = self._generate(prompt)
 
             logger.debug(f"AI Response (first 500 chars): {response_text[:500]}")
 
-            recommendations = self.parse_recommendations(response_text)
+            with timing.stage("parse"):
+                recommendations = self.parse_recommendations(response_text)
             logger.info(f"Parsed {len(recommendations)} recommendations from AI response")
 
             return RecommendationResult(albums=recommendations, raw_response=response_text)
@@ -527,3 +615,4 @@ async def set_active_model(model_id: str) -> dict[str, Any]:
 
 # Initialize AI service (Supabase client will be set later via main.py)
 ai_service = AIService()
+REGISTRY.on_collect(lambda: observe_pool("anthropic", getattr(ai_service, "claude_transport", None)))
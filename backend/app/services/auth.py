@@ -1,12 +1,32 @@
+import asyncio
+import hashlib
 import logging
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
 from dataclasses import dataclass
 
 from fastapi import HTTPException
 
-from app.clients.pocketbase import PocketBaseUnavailableError, get_shared_pocketbase_client
+from app.clients.pocketbase import (
+    PocketBaseUnavailableError,
+    get_shared_pocketbase_client,
+    token_expiry,
+)
+from app.metrics import CACHE_ENTRIES, CACHE_REQUESTS, REGISTRY
 
 logger = logging.getLogger('deepcuts')
 
+# How long a verified token is trusted before PocketBase is asked again. A
+# password change or deleted account therefore takes up to this long to lock
+# out an already-issued token.
+TOKEN_CACHE_TTL_SECONDS = 300.0
+# Invalid tokens are remembered briefly so a client retrying a dead token
+# doesn't cost an auth-refresh call each time.
+NEGATIVE_CACHE_TTL_SECONDS = 30.0
+TOKEN_CACHE_MAX_ENTRIES = 10_000
+
 
 @dataclass
 class AuthenticatedUser:
@@ -21,21 +41,110 @@ class AuthenticatedUser:
     email: str
 
 
+class UserTokenCache:
+    """Verified-token cache in front of PocketBase's auth-refresh.
+
+    Entries are keyed by a SHA-256 of the token, so raw bearer tokens are
+    never held in memory longer than the request. A hit is an
+    ``AuthenticatedUser``; a cached ``None`` means PocketBase rejected the
+    token with a 401 or 403. Other failures raise and are never cached, so
+    a rate-limited or failing auth-refresh can't lock a valid user out.
+    Concurrent misses for the same token share one verification.
+    """
+
+    def __init__(self, max_entries: int = TOKEN_CACHE_MAX_ENTRIES):
+        self._max_entries = max_entries
+        self._entries: dict[str, tuple[float, AuthenticatedUser | None]] = {}
+        self._pending: dict[str, asyncio.Task[AuthenticatedUser | None]] = {}
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._pending.clear()
+
+    async def get(self, token: str) -> AuthenticatedUser | None:
+        key = hashlib.sha256(token.encode()).hexdigest()
+        entry = self._entries.get(key)
+        if entry and entry[0] > time.time():
+            CACHE_REQUESTS.inc(cache="user_token", result="hit")
+            return entry[1]
+
+        CACHE_REQUESTS.inc(cache="user_token", result="miss")
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.create_task(self._verify(key, token))
+            self._pending[key] = task
+        # Shielded so one caller disconnecting doesn't cancel the
+        # verification the others are waiting on.
+        return await asyncio.shield(task)
+
+    async def _verify(self, key: str, token: str) -> AuthenticatedUser | None:
+        try:
+            record = await get_shared_pocketbase_client().verify_user_token(token)
+        finally:
+            self._pending.pop(key, None)
+
+        now = time.time()
+        if not record or not record.get("email"):
+            self._store(key, now + NEGATIVE_CACHE_TTL_SECONDS, None)
+            return None
+
+        user = AuthenticatedUser(id=record["id"], email=record["email"])
+        expires_at = now + TOKEN_CACHE_TTL_SECONDS
+        token_exp = token_expiry(token)
+        if token_exp is not None:
+            expires_at = min(expires_at, token_exp)
+        self._store(key, expires_at, user)
+        return user
+
+    def _store(self, key: str, expires_at: float, user: AuthenticatedUser | None) -> None:
+        if len(self._entries) >= self._max_entries:
+            now = time.time()
+            self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+            while len(self._entries) >= self._max_entries:
+                del self._entries[next(iter(self._entries))]
+        self._entries[key] = (expires_at, user)
+
+
+user_token_cache = UserTokenCache()
+REGISTRY.on_collect(lambda: CACHE_ENTRIES.set(len(user_token_cache._entries), cache="user_token"))
+
+_request_users: ContextVar[dict[str, AuthenticatedUser] | None] = ContextVar(
+    "request_users", default=None
+)
+
+
+@contextmanager
+def request_auth_scope() -> Iterator[None]:
+    """Memoize ``get_current_user`` for the duration of one request, so
+    repeated checks of the same token within it never leave the process."""
+    reset = _request_users.set({})
+    try:
+        yield
+    finally:
+        _request_users.reset(reset)
+
+
 async def get_current_user(token: str) -> AuthenticatedUser:
     """Verify a bearer token against PocketBase and return the user's identity.
 
-    Raises ``HTTPException(401)`` for a missing, invalid, or expired user
-    token, and ``HTTPException(503)`` if PocketBase itself is unreachable.
+    Results come from the per-request memo, then ``user_token_cache``, and
+    only then from PocketBase. Raises ``HTTPException(401)`` for a missing,
+    invalid, or expired user token, and ``HTTPException(503)`` if PocketBase
+    itself is unreachable.
     """
-    client = get_shared_pocketbase_client()
+    memo = _request_users.get()
+    if memo is not None and token in memo:
+        return memo[token]
 
     try:
-        record = await client.verify_user_token(token)
+        user = await user_token_cache.get(token)
     except PocketBaseUnavailableError as e:
         logger.error(f"PocketBase unavailable during auth: {e}")
         raise HTTPException(status_code=503, detail="Authentication service unavailable") from e
 
-    if not record or not record.get("email"):
+    if user is None:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
 
-    return AuthenticatedUser(id=record["id"], email=record["email"])
+    if memo is not None:
+        memo[token] = user
+    return user
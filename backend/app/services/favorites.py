@@ -1,10 +1,18 @@
+import asyncio
 import logging
+import time
+from collections import OrderedDict
+from contextlib import aclosing
 
 from app.clients.pocketbase import (
+    PocketBaseBatchError,
     PocketBaseError,
+    batch_create,
+    derive_record_id,
     escape_filter_value,
     get_shared_pocketbase_client,
 )
+from app.metrics import CACHE_ENTRIES, CACHE_REQUESTS, REGISTRY
 from app.models.favorites import AddToFavoritesRequest, FavoriteActionResponse, UserFavoritesList
 
 logger = logging.getLogger('deepcuts')
@@ -19,59 +27,148 @@ _ALBUM_METADATA_FIELDS = [
 ]
 
 
-class FavoritesService:
-    def __init__(self):
-        self.client = get_shared_pocketbase_client()
+# Album fields a favorites listing may project to with ``album_fields``;
+# mirrors the albums collection schema.
+FAVORITE_ALBUM_FIELDS = frozenset({
+    'id', 'title', 'artist', 'spotify_id', 'discogs_id', 'genre', 'mood', 'release_year',
+    'cover_url', 'spotify_preview_url', 'spotify_url', 'created', 'updated',
+})
 
-    async def _find_album_by_title_artist(self, title: str, artist: str) -> dict | None:
-        """Case-insensitive exact match on (title, artist), mirroring the
-        original Supabase .ilike().ilike() lookup. PocketBase's `~` filter
-        operator is a substring/LIKE match rather than exact equality, so
-        candidates are narrowed via `~` then confirmed with an exact
-        case-insensitive comparison in Python.
-        """
-        candidates = await self.client.list_records(
-            "albums",
-            filter=f"title ~ {escape_filter_value(title)} && artist ~ {escape_filter_value(artist)}",
-        )
-        title_l, artist_l = title.strip().lower(), artist.strip().lower()
-        for candidate in candidates:
-            if candidate['title'].strip().lower() == title_l and candidate['artist'].strip().lower() == artist_l:
-                return candidate
+# Per-user favorite key sets for /favorites/contains. Writes through this
+# process invalidate them; the TTL bounds staleness from writes handled by
+# other workers.
+FAVORITE_KEYS_TTL_SECONDS = 300.0
+FAVORITE_KEYS_MAX_USERS = 1000
+
+
+def album_norm_key(title: str, artist: str) -> str:
+    """Normalized lookup key stored in ``albums.norm_key``.
+
+    Uses the same trim-and-lowercase equality the title/artist lookup has
+    always had, so existing rows that were distinct stay distinct.
+    """
+    return f"{title.strip().lower()}|{artist.strip().lower()}"
+
+
+def _favorite_with_album(fav: dict) -> dict | None:
+    """Shape a favorites record with its expanded album for the API, or
+    None if the album has since been deleted."""
+    album = (fav.get('expand') or {}).get('album')
+    if not album:
         return None
+    return {
+        'id': fav['id'],
+        'saved_at': fav['created'],
+        'reasoning': fav.get('reasoning', ''),
+        'albums': album,
+    }
 
-    async def _find_or_create_album(self, title: str, artist: str, album_data: dict) -> str | None:
-        existing = await self._find_album_by_title_artist(title, artist)
 
-        if existing:
-            update_fields = {
-                dst: album_data[src]
-                for src, dst in _ALBUM_METADATA_FIELDS
-                if album_data.get(src)
-            }
-            if update_fields:
-                try:
-                    await self.client.update_record("albums", existing['id'], update_fields)
-                except PocketBaseError as e:
-                    logger.error(f"Error updating album metadata: {e}")
-            return existing['id']
-
-        insert_data = {'title': title, 'artist': artist}
-        insert_data.update({
+def _favorite_id_only(fav: dict) -> dict:
+    return {'id': fav['id'], 'saved_at': fav['created'], 'album_id': fav['album']}
+
+
+class FavoritesService:
+    def __init__(self):
+        self.client = get_shared_pocketbase_client()
+        # user id -> (expires_at, normalized album keys), least recently used first
+        self._favorite_keys: OrderedDict[str, tuple[float, set[str]]] = OrderedDict()
+        # Bumped by every invalidation, so a load that raced a write isn't cached.
+        self._favorite_keys_generation = 0
+
+    async def favorited_keys(self, user_id: str) -> set[str]:
+        """The ``album_norm_key`` of every album the user has favorited,
+        loaded on first use and then served from memory until a write
+        invalidates it or it expires."""
+        cached = self._favorite_keys.get(user_id)
+        if cached and cached[0] > time.time():
+            self._favorite_keys.move_to_end(user_id)
+            CACHE_REQUESTS.inc(cache="favorite_keys", result="hit")
+            return cached[1]
+        CACHE_REQUESTS.inc(cache="favorite_keys", result="miss")
+
+        generation = self._favorite_keys_generation
+        keys = set()
+        favorites = self.client.iter_records(
+            "favorites",
+            filter=f"user = {escape_filter_value(user_id)}",
+            expand="album",
+            fields="expand.album.title,expand.album.artist",
+        )
+        async with aclosing(favorites):
+            async for fav in favorites:
+                album = (fav.get('expand') or {}).get('album')
+                if album:
+                    keys.add(album_norm_key(album['title'], album['artist']))
+
+        if generation != self._favorite_keys_generation:
+            return keys
+        self._favorite_keys[user_id] = (time.time() + FAVORITE_KEYS_TTL_SECONDS, keys)
+        self._favorite_keys.move_to_end(user_id)
+        while len(self._favorite_keys) > FAVORITE_KEYS_MAX_USERS:
+            self._favorite_keys.popitem(last=False)
+        return keys
+
+    async def contains(self, user_id: str, keys: list[str]) -> dict[str, bool]:
+        """Map each ``"title|artist"`` key to whether the user has favorited
+        that album. Matching is case- and surrounding-whitespace-insensitive."""
+        favorited = await self.favorited_keys(user_id)
+        result = {}
+        for key in keys:
+            title, _, artist = key.partition("|")
+            result[key] = album_norm_key(title, artist) in favorited
+        return result
+
+    def invalidate_favorite_keys(self, user_id: str) -> None:
+        self._favorite_keys_generation += 1
+        self._favorite_keys.pop(user_id, None)
+
+    async def _create_favorite(self, user_id: str, title: str, artist: str, album_data: dict) -> bool:
+        """Create the album and the favorite, with ids derived from their
+        natural keys, in one transactional batch. Returns False if the
+        favorite already existed.
+
+        Both writes are create-only, so an existing album's title, artist
+        and metadata are never rewritten. If the album exists, PocketBase
+        rejects the batch on its id and a second batch creates just the
+        favorite; an existing favorite is recognized the same way.
+        """
+        norm_key = album_norm_key(title, artist)
+        album_id = derive_record_id("albums", norm_key)
+        album = {'id': album_id, 'title': title, 'artist': artist, 'norm_key': norm_key}
+        album.update({
             dst: album_data[src]
             for src, dst in _ALBUM_METADATA_FIELDS
             if album_data.get(src)
         })
+        favorite = {'id': derive_record_id("favorites", user_id, album_id), 'user': user_id, 'album': album_id}
+        if album_data.get('reasoning'):
+            favorite['reasoning'] = album_data['reasoning']
+
         try:
-            created = await self.client.create_record("albums", insert_data)
-            return created['id']
-        except PocketBaseError as e:
-            logger.error(f"Error inserting album: {e}")
-            return None
+            await self.client.batch([batch_create("albums", album), batch_create("favorites", favorite)])
+            return True
+        except PocketBaseBatchError as e:
+            if e.rejected_id(1):
+                return False
+            if not e.rejected_id(0):
+                raise
+        try:
+            await self.client.batch([batch_create("favorites", favorite)])
+        except PocketBaseBatchError as e:
+            if e.rejected_id(0):
+                return False
+            raise
+        return True
 
     async def add_to_favorites(self, user_id: str, user_email: str, request: AddToFavoritesRequest) -> FavoriteActionResponse:
         """Add an album to the user's favorites.
 
+        One batch round trip for a new album, two for an album someone has
+        saved before. Relies on every album and favorite having its derived
+        id, which the rekey_albums_and_favorites migration gives records
+        created before then.
+
         ``user_id`` is the caller's PocketBase user record id. ``user_email``
         is accepted for call-site parity with the pre-migration signature but
         isn't needed here — PocketBase's `users` collection is the single
@@ -82,27 +179,15 @@ class FavoritesService:
             title = album_data['title'].strip()
             artist = album_data['artist'].strip()
 
-            album_id = await self._find_or_create_album(title, artist, album_data)
-            if not album_id:
-                return FavoriteActionResponse(success=False, message="Failed to save album")
-
-            existing = await self.client.list_records(
-                "favorites",
-                filter=f"user = {escape_filter_value(user_id)} && album = {escape_filter_value(album_id)}",
-            )
-            if existing:
-                return FavoriteActionResponse(success=True, message="Album already in favorites")
-
-            favorite_data = {'user': user_id, 'album': album_id}
-            if album_data.get('reasoning'):
-                favorite_data['reasoning'] = album_data['reasoning']
-
-            await self.client.create_record("favorites", favorite_data)
-            return FavoriteActionResponse(success=True, message="Album added to favorites")
+            if await self._create_favorite(user_id, title, artist, album_data):
+                return FavoriteActionResponse(success=True, message="Album added to favorites")
+            return FavoriteActionResponse(success=True, message="Album already in favorites")
 
         except PocketBaseError as e:
             logger.error(f"Error adding to favorites: {e}")
             return FavoriteActionResponse(success=False, message=f"Failed to add to favorites: {e}")
+        finally:
+            self.invalidate_favorite_keys(user_id)
 
     async def remove_from_favorites(self, user_id: str, album_id: str) -> FavoriteActionResponse:
         """Remove an album from the user's favorites.
@@ -123,9 +208,28 @@ class FavoritesService:
         except PocketBaseError as e:
             logger.error(f"Error removing from favorites: {e}")
             return FavoriteActionResponse(success=False, message=f"Failed to remove from favorites: {e}")
-
-    async def get_user_favorites(self, user_id: str, user_token: str | None = None) -> UserFavoritesList:
-        """Get all favorited albums for a user, with full album details.
+        finally:
+            self.invalidate_favorite_keys(user_id)
+
+    async def get_user_favorites(
+        self,
+        user_id: str,
+        user_token: str | None = None,
+        limit: int | None = None,
+        cursor: str | None = None,
+        album_fields: list[str] | None = None,
+        ids_only: bool = False,
+    ) -> UserFavoritesList:
+        """Get favorited albums for a user, newest first, with full album details.
+
+        Returns every favorite when ``limit`` is None; otherwise one
+        keyset-paginated page, with ``next_cursor`` set if there are more.
+        Raises ``InvalidCursorError`` for a bad cursor.
+
+        ``album_fields`` (names from ``FAVORITE_ALBUM_FIELDS``) has
+        PocketBase return only those album fields; the album ``id`` is always
+        included. ``ids_only`` skips the album expand altogether and returns
+        ``{id, saved_at, album_id}`` per favorite.
 
         ``user_token`` is accepted for call-site parity with the
         pre-migration signature (previously used to build an RLS-scoped
@@ -133,32 +237,68 @@ class FavoritesService:
         admin client here since FastAPI already authenticated the caller.
         """
         del user_token  # unused; see docstring
+        params = {"filter": f"user = {escape_filter_value(user_id)}"}
+        if ids_only:
+            params["fields"] = "id,created,album"
+            shape = _favorite_id_only
+        else:
+            params["expand"] = "album"
+            if album_fields:
+                projected = sorted({'id', *album_fields})
+                params["fields"] = "id,created,reasoning," + ",".join(f"expand.album.{f}" for f in projected)
+            shape = _favorite_with_album
+
+        next_cursor = None
         try:
-            favorites = await self.client.list_all_records(
-                "favorites",
-                filter=f"user = {escape_filter_value(user_id)}",
-                sort="-created",
-                expand="album",
+            if limit is None:
+                async with aclosing(self.client.iter_records("favorites", sort="-created", **params)) as favorites:
+                    results = [shape(fav) async for fav in favorites]
+            else:
+                page = await self.client.list_page("favorites", limit=limit, cursor=cursor, **params)
+                results = [shape(fav) for fav in page.items]
+                next_cursor = page.next_cursor
+            results = [r for r in results if r]
+
+            return UserFavoritesList(
+                success=True, favorites=results, total=len(results), next_cursor=next_cursor
             )
 
-            results = []
-            for fav in favorites:
-                album = fav.get('expand', {}).get('album')
-                if not album:
-                    continue
-                results.append({
-                    'id': fav['id'],
-                    'saved_at': fav['created'],
-                    'reasoning': fav.get('reasoning', ''),
-                    'albums': album,
-                })
-
-            return UserFavoritesList(success=True, favorites=results, total=len(results))
-
         except PocketBaseError as e:
             logger.error(f"Error getting favorites: {e}")
             return UserFavoritesList(success=False, favorites=[], total=0)
 
+    async def get_favorites_version(self, user_id: str) -> str | None:
+        """Cheap fingerprint of everything ``get_user_favorites`` returns.
+
+        Combines the favorite count, the latest favorite ``updated`` and the
+        latest ``updated`` among the user's albums (metadata on a shared
+        album can change through another user's save), using two
+        single-row queries with no expand. Returns None if PocketBase
+        can't be read, in which case callers should skip caching.
+        """
+        user_filter = escape_filter_value(user_id)
+        try:
+            favorites, albums = await asyncio.gather(
+                self.client.get_list(
+                    "favorites", filter=f"user = {user_filter}", sort="-updated", perPage=1, fields="updated"
+                ),
+                self.client.get_list(
+                    "albums",
+                    filter=f"favorites_via_album.user ?= {user_filter}",
+                    sort="-updated",
+                    perPage=1,
+                    skipTotal=1,
+                    fields="updated",
+                ),
+            )
+        except PocketBaseError as e:
+            logger.error(f"Error reading favorites version: {e}")
+            return None
+
+        latest_favorite = (favorites.get("items") or [{}])[0].get("updated", "")
+        latest_album = (albums.get("items") or [{}])[0].get("updated", "")
+        return f"{favorites.get('totalItems', 0)}|{latest_favorite}|{latest_album}"
+
     async def save_album(self, user_id: str, album_data: dict) -> FavoriteActionResponse:
         """Save album method for authenticated endpoints."""
         try:
@@ -203,6 +343,8 @@ class FavoritesService:
         except PocketBaseError as e:
             logger.error(f"Error updating favorite: {e}")
             return FavoriteActionResponse(success=False, message=f"Failed to update favorite: {e}")
+        finally:
+            self.invalidate_favorite_keys(user_id)
 
     async def get_favorites_with_album_details(self, user_id: str, user_token: str | None = None):
         """Get favorites with details, for authenticated endpoints."""
@@ -220,3 +362,6 @@ class FavoritesService:
 
 
 favorites_service = FavoritesService()
+REGISTRY.on_collect(
+    lambda: CACHE_ENTRIES.set(len(favorites_service._favorite_keys), cache="favorite_keys")
+)
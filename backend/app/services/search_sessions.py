@@ -1,22 +1,85 @@
+import asyncio
+import base64
+import gzip
+import hashlib
 import logging
+import random
+from datetime import UTC, datetime
 from typing import Any
 
 from app.clients.pocketbase import (
+    Page,
+    PocketBaseBatchError,
     PocketBaseError,
+    PocketBaseUnavailableError,
+    batch_create,
+    batch_update,
+    derive_record_id,
     escape_filter_value,
     get_shared_pocketbase_client,
 )
+from app.config import settings
 from app.models.albums import AlbumData
+from app.models.analytics import AnalyticsEvent, TrackEventsResponse
 
 logger = logging.getLogger('deepcuts')
 
-# get_sessions emulates Supabase's `search_session_clicks!inner(...)` (only
-# return sessions that have at least one click) by over-fetching candidate
-# sessions and filtering in Python, since PocketBase's relation expansion is
-# always a left join. This multiplier bounds how many extra candidates we're
-# willing to check per request; small hobby-scale traffic makes this cheap.
-_SESSIONS_OVERFETCH_MULTIPLIER = 5
-_SESSIONS_OVERFETCH_CAP = 200
+# Must stay within the batch.maxRequests setting applied by the
+# add_dwell_events_and_enable_batch migration.
+_BATCH_MAX_REQUESTS = 50
+
+# Back-relation expansion for get_sessions: embeds each session's outputs
+# and clicks in the search_inputs response instead of one query per child
+# collection per session.
+_SESSION_BACK_RELATIONS = "search_outputs_via_session,search_clicks_via_session"
+
+
+def _rollup_update(session_id: str, clicks: int = 0, favorites: int = 0) -> dict[str, Any]:
+    """Batch request bumping a session's rollup counters.
+
+    Uses PocketBase's `field+` modifier so concurrent writers increment the
+    stored value rather than overwrite each other's read-modify-write.
+    """
+    data: dict[str, Any] = {"last_interaction_at": datetime.now(UTC).isoformat()}
+    if clicks:
+        data["total_clicks+"] = clicks
+    if favorites:
+        data["total_favorites+"] = favorites
+    return batch_update("search_inputs", session_id, data)
+
+
+def _pack_batches(chunks: list[list[dict[str, Any]]]) -> list[list[dict[str, Any]]]:
+    """Pack chunks of batch requests into as few batches as fit within
+    ``_BATCH_MAX_REQUESTS``, never splitting a chunk across two, so each
+    chunk's requests commit or roll back together."""
+    batches: list[list[dict[str, Any]]] = []
+    for chunk in chunks:
+        if batches and len(batches[-1]) + len(chunk) <= _BATCH_MAX_REQUESTS:
+            batches[-1].extend(chunk)
+        else:
+            batches.append(list(chunk))
+    return batches
+
+
+def encode_raw_response(text: str) -> dict[str, Any]:
+    """Build the raw_responses record for an AI transcript.
+
+    The id is derived from the content hash, so the same transcript stored
+    twice is one record, not two.
+    """
+    raw = text.encode()
+    digest = hashlib.sha256(raw).hexdigest()
+    return {
+        "id": derive_record_id("raw_responses", digest),
+        "sha256": digest,
+        "encoding": "gzip",
+        "size": len(raw),
+        "data": base64.b64encode(gzip.compress(raw)).decode(),
+    }
+
+
+def decode_raw_response(record: dict[str, Any]) -> str:
+    return gzip.decompress(base64.b64decode(record["data"])).decode()
 
 
 class SearchSessionService:
@@ -34,11 +97,12 @@ class SearchSessionService:
         ip_address: str | None = None,
         user_agent: str | None = None,
         raw_response: str | None = None,
+        timings: dict[str, float] | None = None,
     ) -> str | None:
         if not albums:
             return None
         try:
-            session = await self.client.create_record("search_inputs", {
+            session = await self._create_search_input({
                 "query": query,
                 "user_email": user_email,
                 "ip_address": ip_address,
@@ -47,8 +111,9 @@ class SearchSessionService:
                 "results_count": len(albums),
                 "raw_results_count": raw_results_count,
                 "filtered_count": filtered_count,
-                "raw_response": raw_response,
-            })
+                "raw_response_ref": None,
+                "timings": timings,
+            }, raw_response)
             session_id = session["id"]
 
             for i, a in enumerate(albums):
@@ -69,21 +134,79 @@ class SearchSessionService:
             logger.error(f"Error creating search session: {e}")
             return None
 
+    async def _create_search_input(self, record: dict[str, Any], raw_response: str | None) -> dict[str, Any]:
+        """Create the search_inputs record, in the same batch as its AI
+        transcript when the search is sampled.
+
+        Only ``settings.RAW_RESPONSE_SAMPLE_RATE`` of searches keep theirs.
+        The transcript is created, never upserted, under an id derived from
+        its content, so one already stored has the batch rejected on that id
+        and the session is saved referencing the stored copy. Any other
+        failure to store it is logged and the session is saved without one.
+        """
+        if raw_response and random.random() < settings.RAW_RESPONSE_SAMPLE_RATE:
+            stored = encode_raw_response(raw_response)
+            try:
+                _, session = await self.client.batch([
+                    batch_create("raw_responses", stored),
+                    batch_create("search_inputs", {**record, "raw_response_ref": stored["id"]}),
+                ])
+                return session
+            except PocketBaseBatchError as e:
+                if e.index not in (0, None):
+                    raise
+                if e.rejected_id(0):
+                    record = {**record, "raw_response_ref": stored["id"]}
+                else:
+                    logger.error(f"Error storing raw response: {e}")
+        return await self.client.create_record("search_inputs", record)
+
+    async def get_raw_response(self, session_id: str) -> dict[str, Any] | None:
+        """Load one session's AI transcript, or None if the session doesn't exist.
+
+        ``raw_response`` is None when the search wasn't sampled. Sessions
+        saved before raw responses moved out of row still carry it inline.
+        """
+        try:
+            session = await self.client.get_record(
+                "search_inputs", session_id, fields="id,user_email,raw_response_ref,raw_response"
+            )
+            if not session:
+                return None
+            raw_response = session.get("raw_response") or None
+            if session.get("raw_response_ref"):
+                record = await self.client.get_record("raw_responses", session["raw_response_ref"])
+                if record:
+                    raw_response = decode_raw_response(record)
+            return {
+                "session_id": session["id"],
+                "user_email": session.get("user_email"),
+                "raw_response": raw_response,
+            }
+        except PocketBaseError as e:
+            logger.error(f"Error fetching raw response: {e}")
+            return None
+
     async def track_filtered_albums(
         self,
         session_id: str,
         filtered_albums: list[dict[str, str]],
     ) -> None:
+        # The session's filtered_count is set when it is created, so these
+        # rows have no rollup to keep in step with.
+        chunks = [
+            [batch_create("filtered_albums", {
+                "session": session_id,
+                "album_title": a.get("title"),
+                "album_artist": a.get("artist"),
+                "filter_reason": a.get("reason", "not_found"),
+            })]
+            for a in filtered_albums
+            if a.get("title") and a.get("artist")
+        ]
         try:
-            for a in filtered_albums:
-                if not a.get("title") or not a.get("artist"):
-                    continue
-                await self.client.create_record("filtered_albums", {
-                    "session": session_id,
-                    "album_title": a.get("title"),
-                    "album_artist": a.get("artist"),
-                    "filter_reason": a.get("reason", "not_found"),
-                })
+            for batch in _pack_batches(chunks):
+                await self.client.batch(batch)
         except PocketBaseError as e:
             logger.error(f"Error tracking filtered albums: {e}")
 
@@ -94,14 +217,21 @@ class SearchSessionService:
         album_artist: str,
         user_email: str | None = None,
     ) -> None:
+        click = {
+            "session": session_id,
+            "album_title": album_title,
+            "album_artist": album_artist,
+            "action": "click",
+            "user_email": user_email,
+        }
         try:
-            await self.client.create_record("search_clicks", {
-                "session": session_id,
-                "album_title": album_title,
-                "album_artist": album_artist,
-                "action": "click",
-                "user_email": user_email,
-            })
+            if session_id:
+                await self.client.batch([
+                    batch_create("search_clicks", click),
+                    _rollup_update(session_id, clicks=1),
+                ])
+            else:
+                await self.client.create_record("search_clicks", click)
         except PocketBaseError as e:
             logger.error(f"Error tracking click: {e}")
 
@@ -115,84 +245,154 @@ class SearchSessionService:
     ) -> None:
         try:
             if session_id:
-                await self.client.create_record("search_clicks", {
-                    "session": session_id,
-                    "album_title": album_title,
-                    "album_artist": album_artist,
-                    "action": "favorite" if favorited else "unfavorite",
-                    "user_email": user_email,
-                })
+                await self.client.batch([
+                    batch_create("search_clicks", {
+                        "session": session_id,
+                        "album_title": album_title,
+                        "album_artist": album_artist,
+                        "action": "favorite" if favorited else "unfavorite",
+                        "user_email": user_email,
+                    }),
+                    _rollup_update(session_id, favorites=1 if favorited else 0),
+                ])
         except PocketBaseError as e:
             logger.error(f"Error tracking favorite: {e}")
 
-    async def get_sessions(
+    async def track_events(
         self,
+        events: list[AnalyticsEvent],
         user_email: str | None = None,
-        limit: int = 50,
-    ) -> list[dict[str, Any]]:
-        try:
-            overfetch = min(limit * _SESSIONS_OVERFETCH_MULTIPLIER, _SESSIONS_OVERFETCH_CAP)
-            params: dict[str, Any] = {"sort": "-created", "perPage": overfetch}
-            if user_email:
-                params["filter"] = f"user_email = {escape_filter_value(user_email)}"
+    ) -> TrackEventsResponse:
+        """Write a batch of client events to search_clicks, plus the rollup
+        counters of every session they touch, in as few requests as the
+        batch size allows.
 
-            candidates = await self.client.list_records("search_inputs", **params)
+        Each session's events travel in the same batch as the rollup bump
+        they add up to, so a failed batch can't leave the counters out of
+        step with search_clicks. A session with more events than fit in one
+        batch is split into parts that each carry their own bump.
 
-            results = []
-            for session in candidates:
-                clicks = await self.client.list_records(
-                    "search_clicks", filter=f"session = {escape_filter_value(session['id'])}"
-                )
-                if not clicks:
-                    continue
+        Favorite/unfavorite events without a session are dropped, matching
+        ``track_favorite``. A batch PocketBase rejects, such as one naming a
+        session that doesn't exist, is skipped and the rest are still
+        written. ``recorded`` counts only the events in batches that
+        committed, and ``success`` is False if any batch failed.
+        """
+        by_session: dict[str | None, list[AnalyticsEvent]] = {}
+        for event in events:
+            if event.type in ("favorite", "unfavorite") and not event.session_id:
+                continue
+            by_session.setdefault(event.session_id, []).append(event)
 
-                outputs = await self.client.list_records(
-                    "search_outputs", filter=f"session = {escape_filter_value(session['id'])}"
-                )
+        chunks = []
+        for session_id, session_events in by_session.items():
+            if not session_id:
+                chunks.extend([self._event_request(e, user_email)] for e in session_events)
+                continue
+            for start in range(0, len(session_events), _BATCH_MAX_REQUESTS - 1):
+                part = session_events[start:start + _BATCH_MAX_REQUESTS - 1]
+                chunks.append([
+                    *(self._event_request(e, user_email) for e in part),
+                    _rollup_update(
+                        session_id,
+                        clicks=sum(1 for e in part if e.type == "click"),
+                        favorites=sum(1 for e in part if e.type == "favorite"),
+                    ),
+                ])
 
-                results.append({
-                    "id": session["id"],
-                    "query": session["query"],
-                    "user_email": session.get("user_email"),
-                    "ai_model": session.get("ai_model"),
-                    "results_count": session.get("results_count"),
-                    "raw_results_count": session.get("raw_results_count"),
-                    "filtered_count": session.get("filtered_count"),
-                    "created_at": session["created"],
-                    "search_output": outputs,
-                    "search_session_clicks": clicks,
-                })
+        recorded = 0
+        success = True
+        for batch in _pack_batches(chunks):
+            try:
+                await self.client.batch(batch)
+            except PocketBaseUnavailableError as e:
+                logger.error(f"Error tracking events: {e}")
+                success = False
+                break
+            except PocketBaseError as e:
+                logger.error(f"Error tracking events: {e}")
+                success = False
+                continue
+            recorded += sum(1 for request in batch if request["method"] == "POST")
+        return TrackEventsResponse(success=success, recorded=recorded)
 
-                if len(results) >= limit:
-                    break
+    @staticmethod
+    def _event_request(event: AnalyticsEvent, user_email: str | None) -> dict[str, Any]:
+        record: dict[str, Any] = {
+            "session": event.session_id,
+            "album_title": event.title,
+            "album_artist": event.artist,
+            "action": event.type,
+            "user_email": user_email,
+        }
+        if event.dwell_ms is not None:
+            record["dwell_ms"] = event.dwell_ms
+        return batch_create("search_clicks", record)
 
-            return results
+    async def get_sessions(
+        self,
+        user_email: str | None = None,
+        limit: int = 50,
+        cursor: str | None = None,
+    ) -> Page:
+        """List sessions that have at least one click, newest first.
+
+        The "has clicks" condition and both child lists are resolved by
+        PocketBase in one query via back-relations, so a page costs a
+        single round trip. Raises ``InvalidCursorError`` for a bad cursor.
+        """
+        filters = ["search_clicks_via_session.id != ''"]
+        if user_email:
+            filters.append(f"user_email = {escape_filter_value(user_email)}")
+        try:
+            page = await self.client.list_page(
+                "search_inputs",
+                limit=limit,
+                cursor=cursor,
+                filter=" && ".join(filters),
+                expand=_SESSION_BACK_RELATIONS,
+            )
         except PocketBaseError as e:
             logger.error(f"Error fetching sessions: {e}")
-            return []
+            return Page(items=[], next_cursor=None)
+
+        results = []
+        for session in page.items:
+            expanded = session.get("expand") or {}
+            outputs = expanded.get("search_outputs_via_session") or []
+            results.append({
+                "id": session["id"],
+                "query": session["query"],
+                "user_email": session.get("user_email"),
+                "ai_model": session.get("ai_model"),
+                "results_count": session.get("results_count"),
+                "raw_results_count": session.get("raw_results_count"),
+                "filtered_count": session.get("filtered_count"),
+                "created_at": session["created"],
+                "search_output": sorted(outputs, key=lambda o: o.get("rank") or 0),
+                "search_session_clicks": expanded.get("search_clicks_via_session") or [],
+            })
+        return Page(items=results, next_cursor=page.next_cursor)
+
+    async def get_session_analytics(self, session_id: str, include_events: bool = False) -> dict[str, Any]:
+        """Summarize one session from the rollup counters on its record.
 
-    async def get_session_analytics(self, session_id: str) -> dict[str, Any]:
+        The summary is a single record read. The outputs, clicks and
+        filtered albums behind it are only fetched when ``include_events``
+        is set.
+        """
         try:
             session = await self.client.get_record("search_inputs", session_id)
             if not session:
                 return {}
 
-            outputs = await self.client.list_records(
-                "search_outputs", filter=f"session = {escape_filter_value(session_id)}"
-            )
-            all_clicks = await self.client.list_records(
-                "search_clicks", filter=f"session = {escape_filter_value(session_id)}"
-            )
-            filtered = await self.client.list_records(
-                "filtered_albums", filter=f"session = {escape_filter_value(session_id)}"
-            )
-
-            clicks = [c for c in all_clicks if c.get("action") == "click"]
-            favorites = [c for c in all_clicks if c.get("action") in ("favorite", "unfavorite")]
+            total_clicks = session.get("total_clicks") or 0
+            total_favorites = session.get("total_favorites") or 0
+            total_filtered = session.get("filtered_count") or 0
             raw_count = session.get("raw_results_count", 0)
             results_count = session.get("results_count", 1)
 
-            return {
+            analytics = {
                 "id": session["id"],
                 "query": session["query"],
                 "user_email": session.get("user_email"),
@@ -201,16 +401,26 @@ class SearchSessionService:
                 "raw_results_count": raw_count,
                 "filtered_count": session.get("filtered_count"),
                 "created_at": session["created"],
-                "search_output": outputs,
-                "search_session_clicks": all_clicks,
-                "search_session_filtered_albums": filtered,
-                "total_clicks": len(clicks),
-                "total_favorites": len([f for f in favorites if f.get("action") == "favorite"]),
-                "total_filtered": len(filtered),
-                "click_rate": len(clicks) / max(results_count, 1),
-                "favorite_rate": len([f for f in favorites if f.get("action") == "favorite"]) / max(results_count, 1),
-                "filter_rate": len(filtered) / max(raw_count, 1) if raw_count else 0,
+                "last_interaction_at": session.get("last_interaction_at") or None,
+                "total_clicks": total_clicks,
+                "total_favorites": total_favorites,
+                "total_filtered": total_filtered,
+                "click_rate": total_clicks / max(results_count, 1),
+                "favorite_rate": total_favorites / max(results_count, 1),
+                "filter_rate": total_filtered / max(raw_count, 1) if raw_count else 0,
             }
+
+            if include_events:
+                outputs_by_session, clicks_by_session, filtered_by_session = await asyncio.gather(
+                    self.client.prefetch_related([session], "search_outputs", "session"),
+                    self.client.prefetch_related([session], "search_clicks", "session"),
+                    self.client.prefetch_related([session], "filtered_albums", "session"),
+                )
+                analytics["search_output"] = outputs_by_session[session_id]
+                analytics["search_session_clicks"] = clicks_by_session[session_id]
+                analytics["search_session_filtered_albums"] = filtered_by_session[session_id]
+
+            return analytics
         except PocketBaseError as e:
             logger.error(f"Error fetching session analytics: {e}")
             return {}
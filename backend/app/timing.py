@@ -0,0 +1,88 @@
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+
+@dataclass
+class Stage:
+    duration_ms: float = 0.0
+    count: int = 0
+
+
+class StageTimer:
+    """Wall-clock time spent in each named stage of one request.
+
+    A stage entered more than once (one per verified album, say) adds up,
+    so concurrent calls can sum past the request's own duration; the call
+    count is kept alongside to make that readable.
+    """
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.stages: dict[str, Stage] = {}
+
+    def add(self, name: str, duration_ms: float) -> None:
+        stage = self.stages.setdefault(name, Stage())
+        stage.duration_ms += duration_ms
+        stage.count += 1
+
+    def since_start(self, name: str) -> None:
+        """Record ``name`` as the time from the start of the request."""
+        self.add(name, (time.perf_counter() - self.started) * 1000)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - start) * 1000)
+
+    def as_dict(self) -> dict[str, float]:
+        return {name: round(stage.duration_ms, 1) for name, stage in self.stages.items()}
+
+    def header(self) -> str:
+        """The stages as a ``Server-Timing`` header value."""
+        metrics = []
+        for name, stage in self.stages.items():
+            metric = f"{name};dur={stage.duration_ms:.1f}"
+            if stage.count > 1:
+                metric += f';desc="{stage.count} calls"'
+            metrics.append(metric)
+        return ", ".join(metrics)
+
+
+_request_timer: ContextVar[StageTimer | None] = ContextVar("request_timer", default=None)
+
+
+@contextmanager
+def stage_timing() -> Iterator[StageTimer]:
+    """Collect stage timings for the code run inside this block, including
+    tasks it spawns, which inherit the timer through their context."""
+    timer = StageTimer()
+    reset = _request_timer.set(timer)
+    try:
+        yield timer
+    finally:
+        _request_timer.reset(reset)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time this block as ``name`` on the current request's timer, if any."""
+    timer = _request_timer.get()
+    if timer is None:
+        yield
+        return
+    with timer.stage(name):
+        yield
+
+
+def mark(name: str, since: float) -> None:
+    """Record ``name`` as the time since ``since`` (a ``time.perf_counter()``
+    reading) on the current request's timer, if any."""
+    timer = _request_timer.get()
+    if timer is not None:
+        timer.add(name, (time.perf_counter() - since) * 1000)
@@ -0,0 +1,330 @@
+import atexit
+import json
+import logging
+import queue
+import random
+import re
+import sys
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, TextIO
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+
+# OTLP span kinds.
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+_TRACEPARENT = re.compile(r"00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})")
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_span_id: str | None
+    kind: int = SPAN_KIND_INTERNAL
+    start_ns: int = field(default_factory=time.time_ns)
+    end_ns: int = 0
+    attributes: dict[str, Any] = field(default_factory=dict)
+    events: list[tuple[str, int]] = field(default_factory=list)
+    error: str | None = None
+
+    def to_otlp(self) -> dict[str, Any]:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": _otlp_attributes(self.attributes),
+            "events": [{"name": name, "timeUnixNano": str(ts)} for name, ts in self.events],
+            "status": {"code": STATUS_ERROR, "message": self.error} if self.error else {"code": STATUS_OK},
+        }
+        if self.parent_span_id:
+            span["parentSpanId"] = self.parent_span_id
+        return span
+
+
+def _otlp_value(value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: dict[str, Any]) -> list[dict[str, Any]]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+
+class Trace:
+    """The spans of one request. ``recording`` is off when no exporter is
+    configured, in which case only the trace id is kept, for logs and
+    response headers."""
+
+    def __init__(self, trace_id: str, parent_span_id: str | None, sampled: bool, recording: bool):
+        self.trace_id = trace_id
+        self.parent_span_id = parent_span_id
+        self.sampled = sampled
+        self.recording = recording
+        self.spans: list[Span] = []
+
+
+class FileExporter:
+    """Appends each exported trace as one line of OTLP/JSON (an
+    ``ExportTraceServiceRequest``), the format the OpenTelemetry
+    Collector's file exporter writes and its otlpjsonfile receiver reads.
+    ``target`` is a file path, or ``stdout``.
+
+    ``export`` only queues the spans; a daemon thread serializes and
+    writes them, so the event loop never waits on the file. Once
+    ``max_queued`` traces are waiting, further ones are dropped and counted
+    in ``deepcuts_traces_dropped_total`` rather than held in memory.
+    """
+
+    def __init__(self, target: str, max_queued: int = 1000):
+        self.target = target
+        self._queue: queue.Queue[list[Span]] = queue.Queue(maxsize=max_queued)
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def export(self, spans: list[Span]) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+        try:
+            self._queue.put_nowait(spans)
+        except queue.Full:
+            # Imported here: app.metrics imports this module.
+            from app.metrics import TRACES_DROPPED
+            TRACES_DROPPED.inc()
+
+    def flush(self) -> None:
+        """Wait until every queued trace has been written."""
+        self._queue.join()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                lines = "".join(self._line(spans) + "\n" for spans in batch)
+                if self.target == "stdout":
+                    self._write(sys.stdout, lines)
+                else:
+                    with open(self.target, "a", encoding="utf-8") as f:
+                        self._write(f, lines)
+            except OSError as e:
+                logging.getLogger("deepcuts").warning(f"Could not export {len(batch)} traces: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    @staticmethod
+    def _line(spans: list[Span]) -> str:
+        return json.dumps({"resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes({
+                "service.name": settings.PROJECT_NAME.lower(),
+                "service.version": settings.PROJECT_VERSION,
+                "deployment.environment": settings.ENVIRONMENT,
+            })},
+            "scopeSpans": [{
+                "scope": {"name": __name__},
+                "spans": [span.to_otlp() for span in spans],
+            }],
+        }]})
+
+    @staticmethod
+    def _write(stream: TextIO, lines: str) -> None:
+        stream.write(lines)
+        stream.flush()
+
+
+exporter: FileExporter | None = FileExporter(settings.TRACE_EXPORT) if settings.TRACE_EXPORT else None
+
+_current_trace: ContextVar[Trace | None] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+def current_trace_id() -> str | None:
+    trace = _current_trace.get()
+    return trace.trace_id if trace else None
+
+
+@contextmanager
+def start_trace(traceparent: str | None = None) -> Iterator[Trace]:
+    """Begin the trace for one request, continuing the caller's if it sent a
+    valid W3C ``traceparent``, and export it once the block exits.
+
+    A trace is exported if it was sampled, by the caller's flag or else at
+    ``TRACE_SAMPLE_RATE``, or if it took longer than ``TRACE_SLOW_MS``:
+    spans are buffered until the request ends, so slow requests are kept
+    even when sampling passed them over.
+    """
+    match = _TRACEPARENT.fullmatch(traceparent.strip().lower()) if traceparent else None
+    if match and match.group(1) != "0" * 32:
+        trace_id, parent_span_id = match.group(1), match.group(2)
+        sampled = bool(int(match.group(3), 16) & 1)
+    else:
+        trace_id, parent_span_id = _new_id(128), None
+        sampled = random.random() < settings.TRACE_SAMPLE_RATE
+
+    trace = Trace(trace_id, parent_span_id, sampled, recording=exporter is not None)
+    reset = _current_trace.set(trace)
+    started = time.perf_counter()
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(reset)
+        slow = (time.perf_counter() - started) * 1000 >= settings.TRACE_SLOW_MS
+        if exporter and trace.spans and (trace.sampled or slow):
+            exporter.export(trace.spans)
+
+
+@contextmanager
+def span(name: str, kind: int = SPAN_KIND_INTERNAL, **attributes: Any) -> Iterator[Span | None]:
+    """Record this block as a span of the current trace, a child of the
+    enclosing span. Yields None, and records nothing, outside a recording
+    trace."""
+    trace = _current_trace.get()
+    if trace is None or not trace.recording:
+        yield None
+        return
+
+    parent = _current_span.get()
+    current = Span(
+        name=name,
+        trace_id=trace.trace_id,
+        span_id=_new_id(64),
+        parent_span_id=parent.span_id if parent else trace.parent_span_id,
+        kind=kind,
+        attributes=attributes,
+    )
+    reset = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.end_ns = time.time_ns()
+        _current_span.reset(reset)
+        trace.spans.append(current)
+
+
+def set_attribute(key: str, value: Any) -> None:
+    """Set an attribute on the current span, if any."""
+    current = _current_span.get()
+    if current is not None:
+        current.attributes[key] = value
+
+
+def add_event(name: str) -> None:
+    """Mark a point in time on the current span, if any."""
+    current = _current_span.get()
+    if current is not None:
+        current.events.append((name, time.time_ns()))
+
+
+class TraceMiddleware:
+    """Runs each HTTP request in its own trace, under a server span, and
+    returns the trace id in ``X-Trace-Id``.
+
+    A pure ASGI middleware rather than ``@app.middleware("http")``, so the
+    trace ends only once the app has sent the last of the body: spans
+    recorded while a ``StreamingResponse`` streams are kept, and the
+    server span covers the whole response.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        with (
+            start_trace(Headers(scope=scope).get("traceparent")) as trace,
+            span(
+                method,
+                kind=SPAN_KIND_SERVER,
+                **{"http.request.method": method, "url.path": scope["path"]},
+            ) as server_span,
+        ):
+            async def send_with_trace_id(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    MutableHeaders(scope=message)["X-Trace-Id"] = trace.trace_id
+                    if server_span:
+                        server_span.attributes["http.response.status_code"] = message["status"]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_trace_id)
+            finally:
+                route = scope.get("route")
+                if server_span and route is not None:
+                    server_span.name = f"{method} {route.path}"
+                    server_span.attributes["http.route"] = route.path
+
+
+class TraceLogFilter(logging.Filter):
+    """Sets ``trace_id`` on each record: the id of the request trace it was
+    logged in, or "-" outside one. Installed on handlers rather than
+    loggers, since a logger's filters skip records propagated from its
+    children."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = current_trace_id() or "-"
+        return True
+
+
+class TraceIdFormatter(logging.Formatter):
+    """Formats records with ``inner``, ending each one logged inside a
+    request in ``[trace_id=...]``."""
+
+    def __init__(self, inner: logging.Formatter):
+        super().__init__()
+        self.inner = inner
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = self.inner.format(record)
+        trace_id = getattr(record, "trace_id", "-")
+        return line if trace_id == "-" else f"{line} [trace_id={trace_id}]"
+
+
+def install_log_correlation(*logger_names: str) -> None:
+    """Tag what the handlers of ``logger_names``, and the last-resort
+    handler used by loggers without any, write with the trace id."""
+    handlers = [logging.lastResort] if logging.lastResort else []
+    for name in logger_names:
+        handlers.extend(logging.getLogger(name).handlers)
+    for handler in handlers:
+        if not any(isinstance(f, TraceLogFilter) for f in handler.filters):
+            handler.addFilter(TraceLogFilter())
+        if not isinstance(handler.formatter, TraceIdFormatter):
+            handler.setFormatter(TraceIdFormatter(handler.formatter or logging.Formatter()))
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""Throughput and allocations of the CPU-bound functions on the search path.
+
+Times ``parse_recommendations``, ``fuzzy_match``, ``clean_discogs_title``,
+``AlbumEvaluator.evaluate`` and ``escape_filter_value``. Each runs against
+a realistic corpus built from the seeded fixtures (AI transcripts, a few
+thousand Discogs-shaped titles) and an adversarial one (long, malformed or
+nearly-matching inputs). Reports ops/sec and the peak memory traced by
+tracemalloc during a single call.
+
+Save a run with ``--save`` and pass it to ``--compare`` on a later run to
+print the speedup of each case.
+
+Usage:
+    python benchmarks/bench_hot_functions.py [--filter fuzzy] [--min-time 0.2]
+    python benchmarks/bench_hot_functions.py --save before.json
+    python benchmarks/bench_hot_functions.py --compare before.json
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import timeit
+import tracemalloc
+from collections.abc import Callable
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# app.main builds its service singletons at import time; nothing here talks
+# to PocketBase, so placeholders are enough.
+os.environ.setdefault("POCKETBASE_URL", "http://pocketbase.bench")
+os.environ.setdefault("POCKETBASE_ADMIN_EMAIL", "bench@deepcuts.test")
+os.environ.setdefault("POCKETBASE_ADMIN_PASSWORD", "bench")
+
+from app.clients.pocketbase import escape_filter_value  # noqa: E402
+from app.main import clean_discogs_title, fuzzy_match  # noqa: E402
+from app.models.albums import AlbumData  # noqa: E402
+from app.services.ai import ai_service  # noqa: E402
+from app.services.evaluator import AlbumEvaluator  # noqa: E402
+from benchmarks import fixtures  # noqa: E402
+
+SEED = 0
+
+
+@dataclass
+class Case:
+    name: str
+    fn: Callable[[Any], Any]
+    inputs: list[Any]
+
+
+@dataclass
+class CaseResult:
+    name: str
+    calls: int
+    ops_per_sec: float
+    us_per_op: float
+    peak_kib: float
+
+
+def transcript_corpus(catalog: fixtures.Catalog, rng: random.Random, n: int = 20) -> list[str]:
+    return [
+        fixtures.build_transcript(catalog.recommend(rng), rng.choice(fixtures.GENRES), rng)
+        for _ in range(n)
+    ]
+
+
+def adversarial_transcripts(catalog: fixtures.Catalog, rng: random.Random) -> list[str]:
+    transcript = fixtures.build_transcript(catalog.recommend(rng), "shoegaze", rng)
+    return [
+        # The model ran out of tokens before <recommendations>: the search
+        # scans the whole response for nothing.
+        transcript.split("<recommendations>")[0] * 40,
+        # Every album is missing </explanation>, so each lazy match runs
+        # to the end of the block before failing.
+        transcript.replace("</explanation>", ""),
+        # A rambling model: 100 albums with long explanations.
+        fixtures.build_transcript(catalog.recommend(rng, count=100), "shoegaze", rng).replace(
+            "carrying the second half", "carrying the second half " + "and more " * 60
+        ),
+    ]
+
+
+def fuzzy_pairs(catalog: fixtures.Catalog, rng: random.Random, n: int = 300) -> list[tuple[str, str]]:
+    pairs = []
+    for _ in range(n):
+        album, other = rng.sample(catalog.albums, 2)
+        kind = rng.random()
+        if kind < 0.3:
+            pairs.append((album.title, album.title))
+        elif kind < 0.6:
+            typo = list(album.title)
+            typo[rng.randrange(len(typo))] = rng.choice("aeiou")
+            pairs.append((album.title, "".join(typo) + " (Remastered)"))
+        else:
+            pairs.append((album.title, other.title))
+    return pairs
+
+
+def adversarial_fuzzy_pairs(rng: random.Random) -> list[tuple[str, str]]:
+    words = [rng.choice(fixtures.GENRES) for _ in range(60)]
+    long_text = " ".join(words)
+    near = " ".join(w[::-1] if i % 7 == 0 else w for i, w in enumerate(words))
+    return [
+        (long_text, near),
+        (long_text, long_text[::-1]),
+        ("a" * 400, "a" * 399 + "b"),
+        ("!!! ??? ...", "--- ***"),
+    ]
+
+
+def album_lists(catalog: fixtures.Catalog, rng: random.Random, count: int, reasoning_words: int) -> list[AlbumData]:
+    return [
+        AlbumData(
+            id=album.id or str(i),
+            title=album.title,
+            artist=album.artist,
+            year=album.year,
+            genre=rng.choice(fixtures.GENRES + ["jazz", "rock"]),
+            reasoning=" ".join(rng.choice(["tape", "hiss", "swung", "modal", "like"]) for _ in range(reasoning_words)),
+        )
+        for i, album in enumerate(catalog.recommend(rng, count=count))
+    ]
+
+
+def evaluate_inputs(albums: list[AlbumData]) -> tuple[list[AlbumData], dict[str, bool]]:
+    return albums, {f"{a.title} by {a.artist}": i % 4 != 0 for i, a in enumerate(albums)}
+
+
+def build_cases() -> list[Case]:
+    rng = random.Random(SEED)
+    catalog = fixtures.Catalog(seed=SEED, size=2000)
+    parse = ai_service.parse_recommendations
+    evaluator = AlbumEvaluator()
+
+    def evaluate(args: tuple[list[AlbumData], dict[str, bool]]) -> dict[str, Any]:
+        return evaluator.evaluate(args[0], "shoegaze", args[1])
+
+    names = [a.artist for a in catalog.albums] + [a.title for a in catalog.albums]
+    return [
+        Case("parse_recommendations/transcripts", parse, transcript_corpus(catalog, rng)),
+        Case("parse_recommendations/adversarial", parse, adversarial_transcripts(catalog, rng)),
+        Case("fuzzy_match/pairs", lambda p: fuzzy_match(*p), fuzzy_pairs(catalog, rng)),
+        Case("fuzzy_match/adversarial", lambda p: fuzzy_match(*p), adversarial_fuzzy_pairs(rng)),
+        Case("clean_discogs_title/titles", clean_discogs_title,
+             fixtures.discogs_raw_titles(catalog, 3000, seed=SEED)),
+        Case("clean_discogs_title/adversarial", clean_discogs_title, [
+            " = ".join(["Ансамбль (2)*"] * 200) + " - " + " - ".join(["Side A"] * 200),
+            "(12) " + " / ".join(names[:300]),
+            " – ".join(names[:300]) + " = " + "*" * 2000,
+        ]),
+        Case("AlbumEvaluator.evaluate/recommendations", evaluate, [
+            evaluate_inputs(album_lists(catalog, rng, 10, 25)) for _ in range(20)
+        ]),
+        Case("AlbumEvaluator.evaluate/adversarial", evaluate, [
+            evaluate_inputs(album_lists(catalog, rng, 200, 400))
+        ]),
+        Case("escape_filter_value/names", escape_filter_value, names + ["Guns N' Roses", 'The "Band"']),
+        Case("escape_filter_value/adversarial", escape_filter_value, [
+            '\\"' * 5000, "x" * 10000 + '"', "\\" * 10000,
+        ]),
+    ]
+
+
+def run_case(case: Case, min_time: float) -> CaseResult:
+    def loop() -> None:
+        for item in case.inputs:
+            case.fn(item)
+
+    loop()
+    timer = timeit.Timer(loop)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    best = min(timer.repeat(repeat=3, number=number)) / number
+    calls = len(case.inputs)
+
+    # Peak bytes held at once during a call, averaged over the corpus.
+    tracemalloc.start()
+    peaks = []
+    for item in case.inputs:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        case.fn(item)
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+
+    return CaseResult(
+        name=case.name,
+        calls=calls,
+        ops_per_sec=round(calls / best, 1),
+        us_per_op=round(best / calls * 1e6, 2),
+        peak_kib=round(sum(peaks) / len(peaks) / 1024, 2),
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filter", default="", help="only run cases whose name contains this")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per timing repeat")
+    parser.add_argument("--save", type=Path, help="write results to this JSON file")
+    parser.add_argument("--compare", type=Path, help="print speedups against a saved run")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    baseline = {}
+    if args.compare:
+        baseline = {r["name"]: r for r in json.loads(args.compare.read_text())}
+
+    results = []
+    print(f"{'case':<42} {'calls':>6} {'ops/sec':>12} {'us/op':>10} {'peak KiB':>9}"
+          + (f" {'speedup':>8}" if baseline else ""))
+    for case in build_cases():
+        if args.filter not in case.name:
+            continue
+        r = run_case(case, args.min_time)
+        results.append(r)
+        line = f"{r.name:<42} {r.calls:>6} {r.ops_per_sec:>12,.1f} {r.us_per_op:>10} {r.peak_kib:>9}"
+        if r.name in baseline:
+            line += f" {r.ops_per_sec / baseline[r.name]['ops_per_sec']:>7.2f}x"
+        print(line)
+
+    if args.save:
+        args.save.write_text(json.dumps([asdict(r) for r in results], indent=2) + "\n")
+        print(f"Results written to {args.save}")
+
+
+if __name__ == "__main__":
+    main()
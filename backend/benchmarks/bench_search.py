@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""End-to-end latency and throughput of POST /api/v1/search.
+
+Runs the real FastAPI app in-process through ``httpx.ASGITransport``, with
+every upstream (Anthropic, Gemini, Spotify, Discogs, PocketBase) replaced by
+a ``MockTransport`` stand-in from ``upstream_stubs``. No network calls are
+made and no API keys are needed. At each concurrency level it reports
+p50/p95/p99 latency and throughput, and with ``--check`` exits 1 if any of
+them regressed past ``--tolerance`` against the stored baseline.
+
+Latency profiles default to ``upstream_stubs.DEFAULT_PROFILES``; override
+them per upstream with a JSON file, e.g.
+``{"anthropic": {"median_ms": 9000, "sigma": 0.5, "error_rate": 0.02}}``.
+
+Usage:
+    python benchmarks/bench_search.py [--concurrency 1 4 16] [--requests 40]
+    python benchmarks/bench_search.py --check            # gate against the baseline
+    python benchmarks/bench_search.py --update-baseline  # record a new baseline
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+from collections.abc import Iterator
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx  # noqa: E402
+
+from benchmarks import fixtures  # noqa: E402
+from benchmarks.upstream_stubs import (  # noqa: E402
+    ANTHROPIC_HOST,
+    DISCOGS_HOST,
+    GEMINI_HOST,
+    POCKETBASE_URL,
+    StubUpstreams,
+    load_profiles,
+)
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baselines" / "bench_search.json"
+MODELS = {"claude": "claude-sonnet-4-6", "gemini": "gemini-2.5-flash"}
+QUERIES = [
+    "Kind of Blue by Miles Davis",
+    "Pacific Breeze city pop",
+    "Pretoria amapiano from 2019",
+    "Loveless by My Bloody Valentine",
+    "Promises by Floating Points",
+    "late-night broken beat",
+]
+# Latency metrics may rise and throughput may fall by at most this
+# fraction of the baseline before --check fails.
+DEFAULT_TOLERANCE = 0.25
+
+
+@dataclass
+class LevelResult:
+    concurrency: int
+    requests: int
+    errors: int
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    throughput_rps: float
+
+
+def install_stubs(stubs: StubUpstreams, model: str) -> None:
+    """Point the app's upstream clients at the stand-ins.
+
+    Must run before ``app.main`` is imported: the services capture the
+    shared PocketBase client, and the AI service reads its keys and
+    model, at import time.
+    """
+    os.environ.update({
+        "POCKETBASE_URL": POCKETBASE_URL,
+        "POCKETBASE_ADMIN_EMAIL": "bench@deepcuts.test",
+        "POCKETBASE_ADMIN_PASSWORD": "bench",
+        "SPOTIFY_CLIENT_ID": "bench",
+        "SPOTIFY_CLIENT_SECRET": "bench",
+        "DISCOGS_KEY": "bench",
+        "DISCOGS_SECRET": "bench",
+        "SPOTIFY_ACCOUNTS_URL": "https://accounts.spotify.com",
+        "SPOTIFY_API_URL": "https://api.spotify.com",
+        "DISCOGS_API_URL": f"https://{DISCOGS_HOST}",
+        "CLAUDE_API_KEY": "bench",
+        "GEMINI_API_KEY": "bench",
+        "ACTIVE_MODEL": model,
+    })
+
+    import anthropic
+    import google.generativeai as genai
+
+    from app.clients import pocketbase, upstream
+
+    pocketbase._shared_client = pocketbase.PocketBaseClient(
+        base_url=POCKETBASE_URL,
+        admin_email="bench@deepcuts.test",
+        admin_password="bench",
+        transport=stubs.async_transport(),
+    )
+    upstream._shared_client = upstream.create_upstream_client(stubs.async_transport())
+
+    from app.services.ai import ai_service
+
+    ai_sync_client = httpx.Client(transport=stubs.sync_transport())
+    ai_service.claude_client = anthropic.Anthropic(
+        api_key="bench", base_url=f"https://{ANTHROPIC_HOST}", http_client=ai_sync_client
+    )
+
+    class StubGenerativeModel:
+        """Stands in for ``genai.GenerativeModel``, whose gRPC/REST stack
+        can't take an httpx transport, by posting the same request body
+        through the stub transport."""
+
+        def __init__(self, model_name: str, **kwargs: Any):
+            self.model_name = model_name
+
+        def generate_content(self, prompt: str, stream: bool = False) -> Any:
+            body = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+            if stream:
+                return StubStreamedResponse(self.model_name, body)
+            response = ai_sync_client.post(
+                f"https://{GEMINI_HOST}/v1beta/models/{self.model_name}:generateContent", json=body
+            )
+            response.raise_for_status()
+            return SimpleNamespace(text=_gemini_text(response.json()))
+
+    class StubStreamedResponse:
+        """Iterates the chunks of a streamed response as they arrive; ``text``
+        is their concatenation once iteration has finished."""
+
+        def __init__(self, model_name: str, body: dict[str, Any]):
+            self.model_name = model_name
+            self.body = body
+            self.text = ""
+
+        def __iter__(self) -> Iterator[SimpleNamespace]:
+            url = f"https://{GEMINI_HOST}/v1beta/models/{self.model_name}:streamGenerateContent"
+            with ai_sync_client.stream("POST", url, json=self.body) as response:
+                response.raise_for_status()
+                # The stub sends one array element per chunk, prefixed by
+                # the array's "[" or ",".
+                for chunk in response.iter_raw():
+                    if chunk == b"]":
+                        continue
+                    text = _gemini_text(json.loads(chunk[1:]))
+                    self.text += text
+                    yield SimpleNamespace(text=text)
+
+    genai.GenerativeModel = StubGenerativeModel
+
+
+def _gemini_text(body: dict[str, Any]) -> str:
+    return body["candidates"][0]["content"]["parts"][0]["text"]
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def run_level(client: httpx.AsyncClient, concurrency: int, total: int, seed: int) -> LevelResult:
+    rng = random.Random(seed)
+    queries = [rng.choice(QUERIES) for _ in range(total)]
+    latencies: list[float] = []
+    errors = 0
+
+    async def worker() -> None:
+        nonlocal errors
+        while queries:
+            query = queries.pop()
+            start = time.perf_counter()
+            response = await client.post("/api/v1/search", json={"query": query})
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return LevelResult(
+        concurrency=concurrency,
+        requests=total,
+        errors=errors,
+        p50_ms=round(percentile(latencies, 50), 1),
+        p95_ms=round(percentile(latencies, 95), 1),
+        p99_ms=round(percentile(latencies, 99), 1),
+        throughput_rps=round(total / elapsed, 2),
+    )
+
+
+async def run(args: argparse.Namespace, stubs: StubUpstreams) -> list[LevelResult]:
+    from app.main import app
+
+    transport = httpx.ASGITransport(app=app, client=("203.0.113.10", 50000))
+    async with httpx.AsyncClient(transport=transport, base_url="http://deepcuts.bench", timeout=120) as client:
+        # Warm-up: admin auth, imports and first-request lazy setup.
+        await run_level(client, 1, 2, args.seed)
+        results = []
+        for concurrency in args.concurrency:
+            total = max(args.requests, concurrency * 2)
+            results.append(await run_level(client, concurrency, total, args.seed + concurrency))
+    return results
+
+
+def compare(results: list[LevelResult], baseline: dict[str, Any], tolerance: float) -> list[str]:
+    regressions = []
+    levels = baseline["levels"]
+    for result in results:
+        base = levels.get(str(result.concurrency))
+        if not base:
+            continue
+        for metric in ("p50_ms", "p95_ms", "p99_ms"):
+            current, limit = getattr(result, metric), base[metric] * (1 + tolerance)
+            if current > limit:
+                regressions.append(
+                    f"c={result.concurrency} {metric}: {current} > {base[metric]} (+{tolerance:.0%})"
+                )
+        current, floor = result.throughput_rps, base["throughput_rps"] * (1 - tolerance)
+        if current < floor:
+            regressions.append(
+                f"c={result.concurrency} throughput_rps: {current} < {base['throughput_rps']} (-{tolerance:.0%})"
+            )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=40, help="requests per concurrency level")
+    parser.add_argument("--model", choices=sorted(MODELS), default="claude")
+    parser.add_argument("--profiles", type=Path, help="JSON file of per-upstream profile overrides")
+    parser.add_argument("--fabricated-rate", type=float, default=0.1,
+                        help="fraction of AI picks that don't exist upstream")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--check", action="store_true", help="exit 1 on regression against the baseline")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--verbose", action="store_true", help="keep the app's logging")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+
+    overrides = json.loads(args.profiles.read_text()) if args.profiles else None
+    profiles = load_profiles(overrides)
+    stubs = StubUpstreams(profiles, fixtures.Catalog(seed=args.seed), args.seed, args.fabricated_rate)
+    install_stubs(stubs, MODELS[args.model])
+
+    results = asyncio.run(run(args, stubs))
+    searches = sum(r.requests for r in results) + 2
+
+    print(f"model={MODELS[args.model]} seed={args.seed}")
+    print(f"{'concurrency':>11} {'requests':>8} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>7}")
+    for r in results:
+        print(f"{r.concurrency:>11} {r.requests:>8} {r.errors:>6} {r.p50_ms:>8} {r.p95_ms:>8} {r.p99_ms:>8} {r.throughput_rps:>7}")
+    print("upstream calls per search: " + ", ".join(
+        f"{name}={count / searches:.1f}" for name, count in sorted(stubs.calls.items())
+    ))
+
+    scenario = {
+        "model": args.model,
+        "seed": args.seed,
+        "fabricated_rate": args.fabricated_rate,
+        "profiles": {name: asdict(p) for name, p in profiles.items()},
+    }
+    if args.update_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps({
+            "scenario": scenario,
+            "levels": {str(r.concurrency): asdict(r) for r in results},
+        }, indent=2) + "\n")
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    if not args.check:
+        return
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}; run with --update-baseline first", file=sys.stderr)
+        sys.exit(2)
+    baseline = json.loads(args.baseline.read_text())
+    if baseline["scenario"] != scenario:
+        print("Baseline was recorded with a different scenario; rerun with --update-baseline",
+              file=sys.stderr)
+        sys.exit(2)
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("\nRegressions against baseline:", file=sys.stderr)
+        for line in regressions:
+            print(f"  {line}", file=sys.stderr)
+        sys.exit(1)
+    print(f"\nNo regressions beyond {args.tolerance:.0%} of baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""Per-request serialization cost of search and analytics responses.
+
+Compares the path FastAPI took before the orjson change (a copied
+recommendations list and a validated SearchResponse for search, plus
+response-model validation, jsonable_encoder and json.dumps) against the
+current one (model_construct, model_dump and orjson). The analytics payload
+mimics a 50-session /search-results page.
+
+Usage:
+    python benchmarks/bench_serialization.py [--number 2000]
+"""
+import argparse
+import sys
+import timeit
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.responses import JSONResponse, ORJSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_model_field  # noqa: E402
+
+from app.models.albums import AlbumData, SearchResponse  # noqa: E402
+
+SEARCH_FIELD = create_model_field("Response_search_albums", SearchResponse, mode="serialization")
+
+
+def make_albums(n: int = 20) -> list[AlbumData]:
+    return [
+        AlbumData(
+            id=str(uuid.uuid4()),
+            title=f"Album {i}",
+            artist=f"Artist {i}",
+            year=1970 + i,
+            genre="Jazz",
+            reasoning="A long explanation of why this record fits the query. " * 6,
+        )
+        for i in range(n)
+    ]
+
+
+def make_search_results_page(sessions: int = 50, outputs: int = 10) -> dict:
+    rows = []
+    for s in range(sessions):
+        for rank in range(1, outputs + 1):
+            rows.append({
+                "session_id": f"session{s:07d}",
+                "query": f"late night jazz {s}",
+                "user_email": "listener@deepcuts.casa",
+                "ai_model": "claude-sonnet",
+                "results_count": outputs,
+                "created_at": "2026-01-01 12:00:00.000Z",
+                "album_title": f"Album {rank}",
+                "album_artist": f"Artist {rank}",
+                "album_year": 1970 + rank,
+                "album_genre": "Jazz",
+                "rank": rank,
+            })
+    return {"results": rows, "next_cursor": "eyJjcmVhdGVkIjoiMjAyNiJ9"}
+
+
+def run_sync(coro):
+    """Drive a coroutine that never actually suspends (serialize_response
+    with is_coroutine=True) without an event loop."""
+    try:
+        coro.send(None)
+    except StopIteration as done:
+        return done.value
+    raise RuntimeError("coroutine suspended")
+
+
+def search_before(albums: list[AlbumData]) -> bytes:
+    copies = [
+        AlbumData(
+            id=a.id, title=a.title, artist=a.artist, year=a.year, genre=a.genre,
+            spotify_preview_url=None, spotify_url=None, discogs_url=a.discogs_url,
+            cover_url=None, reasoning=a.reasoning,
+        )
+        for a in albums
+    ]
+    response = SearchResponse(
+        query="late night jazz", recommendations=copies, total_found=len(copies),
+        processing_time_ms=1200, session_id="session0000001", attempted_count=len(copies),
+        verified_count=len(copies), filtered=[],
+    )
+    content = run_sync(serialize_response(field=SEARCH_FIELD, response_content=response))
+    return JSONResponse(content).body
+
+
+def search_after(albums: list[AlbumData]) -> bytes:
+    response = SearchResponse.model_construct(
+        query="late night jazz", recommendations=albums, total_found=len(albums),
+        processing_time_ms=1200, session_id="session0000001", attempted_count=len(albums),
+        verified_count=len(albums), filtered=[],
+    )
+    return ORJSONResponse(response.model_dump(mode="json")).body
+
+
+def analytics_before(payload: dict) -> bytes:
+    return JSONResponse(run_sync(serialize_response(response_content=payload))).body
+
+
+def analytics_after(payload: dict) -> bytes:
+    return ORJSONResponse(payload).body
+
+
+def bench(label: str, before, after, arg, number: int) -> None:
+    t_before = min(timeit.repeat(lambda: before(arg), number=number, repeat=5)) / number
+    t_after = min(timeit.repeat(lambda: after(arg), number=number, repeat=5)) / number
+    print(
+        f"{label:<36} before {t_before * 1e6:9.1f} us   after {t_after * 1e6:9.1f} us   "
+        f"{t_before / t_after:5.1f}x"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=2000, help="calls per timing run")
+    args = parser.parse_args()
+
+    bench("search (20 albums)", search_before, search_after, make_albums(), args.number)
+    bench(
+        "analytics search-results (500 rows)",
+        analytics_before, analytics_after, make_search_results_page(), max(args.number // 20, 1),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""Deterministic fixture data for the benchmarks.
+
+A seeded album catalog, plus builders for the response bodies the backend
+gets from each upstream (Spotify, Discogs, Anthropic, Gemini, PocketBase).
+The same seed always produces the same catalog and transcripts, so two
+benchmark runs exercise identical inputs.
+"""
+import json
+import random
+from dataclasses import dataclass
+from typing import Any
+
+_ADJECTIVES = [
+    "Blue", "Midnight", "Golden", "Quiet", "Electric", "Velvet", "Distant", "Broken",
+    "Silver", "Hollow", "Northern", "Endless", "Paper", "Crystal", "Burning", "Lunar",
+]
+_NOUNS = [
+    "Rooms", "Harbour", "Signals", "Gardens", "Machines", "Tides", "Mirrors", "Highway",
+    "Lanterns", "Archives", "Weather", "Orchard", "Satellites", "Rivers", "Cathedral", "Static",
+]
+_FIRST_NAMES = [
+    "Yumi", "Thabo", "Marcos", "Ines", "Kofi", "Hiroshi", "Lena", "Sipho",
+    "Nadia", "Oskar", "Amara", "Tomás", "Keiko", "Ruben", "Zanele", "Élodie",
+]
+_LAST_NAMES = [
+    "Arakawa", "Mokoena", "Valle", "Duarte", "Mensah", "Tanaka", "Falk", "Ndlovu",
+    "Haddad", "Lindqvist", "Okafor", "Ferreira", "Sato", "Brandt", "Khumalo", "Moreau",
+]
+_BANDS = [
+    "The {noun}", "{adj} {noun}", "{adj} Collective", "{noun} Ensemble", "{adj} Quartet",
+]
+GENRES = [
+    "spiritual jazz", "city pop", "deep house", "amapiano", "broken beat", "shoegaze",
+    "post-punk", "kwaito", "gqom", "UK bass", "ambient techno", "Afro-tech",
+]
+_TRAITS = [
+    "tape-saturated Rhodes voicings", "a dry, close-miked rhythm section",
+    "log-drum basslines under sparse keys", "reverb-soaked guitar layers",
+    "swung 16th-note hi-hats at 122 BPM", "modal piano vamps that stretch past six minutes",
+    "chopped vocal samples pitched down a fifth", "analog synth arpeggios over live bass",
+]
+
+
+@dataclass(frozen=True)
+class CatalogAlbum:
+    id: str
+    title: str
+    artist: str
+    year: int
+    genre: str
+
+
+class Catalog:
+    """A seeded set of albums the stub upstreams agree exist."""
+
+    def __init__(self, seed: int = 0, size: int = 300):
+        rng = random.Random(seed)
+        self.seed = seed
+        self.albums: list[CatalogAlbum] = []
+        self._by_key: dict[tuple[str, str], CatalogAlbum] = {}
+        while len(self.albums) < size:
+            album = CatalogAlbum(
+                id=f"{len(self.albums) + 1:06d}",
+                title=_title(rng),
+                artist=_artist(rng),
+                year=rng.randint(1962, 2024),
+                genre=rng.choice(GENRES),
+            )
+            key = (album.title.lower(), album.artist.lower())
+            if key in self._by_key:
+                continue
+            self.albums.append(album)
+            self._by_key[key] = album
+
+    def find(self, title: str, artist: str) -> CatalogAlbum | None:
+        return self._by_key.get((title.strip().lower(), artist.strip().lower()))
+
+    def get(self, album_id: str) -> CatalogAlbum | None:
+        index = int(album_id) - 1 if album_id.isdigit() else -1
+        return self.albums[index] if 0 <= index < len(self.albums) else None
+
+    def search(self, text: str, limit: int = 10) -> list[CatalogAlbum]:
+        """Albums whose title or artist shares a word with ``text``, best first."""
+        words = set(text.lower().split())
+        scored = []
+        for album in self.albums:
+            overlap = len(words & set(f"{album.title} {album.artist}".lower().split()))
+            if overlap:
+                scored.append((-overlap, album.id, album))
+        scored.sort()
+        return [album for _, _, album in scored[:limit]]
+
+    def recommend(
+        self, rng: random.Random, count: int = 10, fabricated_rate: float = 0.1
+    ) -> list[CatalogAlbum]:
+        """Pick ``count`` recommendations; about ``fabricated_rate`` of them
+        are plausible-looking albums that aren't in the catalog."""
+        picks = []
+        for album in rng.sample(self.albums, count):
+            if rng.random() < fabricated_rate:
+                album = CatalogAlbum(
+                    id="", title=_title(rng), artist=_artist(rng), year=album.year, genre=album.genre
+                )
+            picks.append(album)
+        return picks
+
+
+def _title(rng: random.Random) -> str:
+    return f"{rng.choice(_ADJECTIVES)} {rng.choice(_NOUNS)}"
+
+
+def _artist(rng: random.Random) -> str:
+    if rng.random() < 0.6:
+        return f"{rng.choice(_FIRST_NAMES)} {rng.choice(_LAST_NAMES)}"
+    return rng.choice(_BANDS).format(adj=rng.choice(_ADJECTIVES), noun=rng.choice(_NOUNS))
+
+
+def build_transcript(albums: list[CatalogAlbum], query: str, rng: random.Random) -> str:
+    """An AI response in the shape the recommendation prompt asks for:
+    analysis and candidate-scoring sections, then ``<recommendations>``."""
+    candidates = "\n\n".join(
+        f"{a.title} | {a.artist} | {a.year} | Independent | LP\n"
+        f"Existence confidence: {rng.randint(8, 10)}/10\n"
+        f"Evidence: follow-up to an earlier {a.genre} record, produced in-house.\n"
+        f"Similarity score: {rng.randint(6, 10)}/10\n"
+        f"Similarity reasoning: shares {rng.choice(_TRAITS)} with the input."
+        for a in albums
+    )
+    recommendations = "\n".join(
+        "<album>\n"
+        f"    <title>{a.title}</title>\n"
+        f"    <artist>{a.artist}</artist>\n"
+        f"    <year>{a.year}</year>\n"
+        f"    <genre>{a.genre}</genre>\n"
+        f"    <explanation>Built on {rng.choice(_TRAITS)}, with {rng.choice(_TRAITS)} "
+        "carrying the second half of the record.</explanation>\n"
+        "</album>"
+        for a in albums
+    )
+    return (
+        "<album_analysis>\n"
+        f"a) {query}: existence confidence 9/10.\n"
+        + "\n".join(f"   - {trait}: {rng.randint(4, 10)}/10" for trait in _TRAITS)
+        + "\n</album_analysis>\n\n"
+        f"<recommendation_search>\n{candidates}\n</recommendation_search>\n\n"
+        f"<recommendations>\n{recommendations}\n</recommendations>"
+    )
+
+
+def discogs_title(album: CatalogAlbum) -> str:
+    return f"{album.artist} - {album.title}"
+
+
+_TRANSLITERATIONS = ["山下達郎", "大貫妙子", "Ансамбль", "فرقة", "Κουαρτέτο"]
+
+
+def discogs_raw_titles(catalog: Catalog, count: int, seed: int = 0) -> list[str]:
+    """Release titles in the shapes Discogs' search returns them: name
+    disambiguators (``Artist (2)``), transliterated ``=`` aliases, ``*``
+    name variations, split releases and ``–`` track listings."""
+    rng = random.Random(seed)
+    titles = []
+    for _ in range(count):
+        album = rng.choice(catalog.albums)
+        shape = rng.random()
+        if shape < 0.45:
+            titles.append(discogs_title(album))
+        elif shape < 0.6:
+            titles.append(f"{album.artist} ({rng.randint(2, 9)}) - {album.title}")
+        elif shape < 0.7:
+            titles.append(f"{album.artist}* - {album.title}")
+        elif shape < 0.8:
+            alias = rng.choice(_TRANSLITERATIONS)
+            titles.append(f"{alias} = {album.artist} - {album.title} = {album.title.upper()}")
+        elif shape < 0.9:
+            other = rng.choice(catalog.albums)
+            titles.append(f"{album.artist} / {other.artist} - {album.title} / {other.title}")
+        else:
+            alias = rng.choice(_TRANSLITERATIONS)
+            titles.append(f"{alias} = {album.artist} – {album.title}")
+    return titles
+
+
+# --- Upstream response bodies ---
+
+def spotify_token_body() -> dict[str, Any]:
+    return {"access_token": "stub-spotify-token", "token_type": "Bearer", "expires_in": 3600}
+
+
+def spotify_search_body(album: CatalogAlbum | None) -> dict[str, Any]:
+    items = []
+    if album:
+        items.append({
+            "id": f"sp{album.id}",
+            "name": album.title,
+            "album_type": "album",
+            "artists": [{"name": album.artist}],
+            "images": [{"url": f"https://i.scdn.test/{album.id}.jpg"}],
+            "external_urls": {"spotify": f"https://open.spotify.test/album/{album.id}"},
+        })
+    return {"albums": {"items": items, "total": len(items)}}
+
+
+def spotify_tracks_body(album_id: str) -> dict[str, Any]:
+    return {"items": [
+        {"id": f"{album_id}t{n}", "track_number": n, "preview_url": f"https://p.scdn.test/{album_id}/{n}.mp3"}
+        for n in range(1, 9)
+    ]}
+
+
+def discogs_search_body(albums: list[CatalogAlbum]) -> dict[str, Any]:
+    return {
+        "pagination": {"page": 1, "pages": 1, "items": len(albums)},
+        "results": [
+            {
+                "id": int(album.id),
+                "title": discogs_title(album),
+                "year": str(album.year),
+                "format": ["Vinyl", "LP", "Album"],
+                "cover_image": f"https://i.discogs.test/{album.id}.jpg",
+                "thumb": f"https://i.discogs.test/{album.id}-thumb.jpg",
+            }
+            for album in albums
+        ],
+    }
+
+
+def discogs_release_body(album: CatalogAlbum) -> dict[str, Any]:
+    return {
+        "id": int(album.id),
+        "title": album.title,
+        "artists": [{"name": album.artist}],
+        "year": album.year,
+        "images": [
+            {"type": "primary", "uri": f"https://i.discogs.test/{album.id}-primary.jpg"},
+            {"type": "secondary", "uri": f"https://i.discogs.test/{album.id}-back.jpg"},
+        ],
+    }
+
+
+def anthropic_message_body(model: str, text: str) -> dict[str, Any]:
+    return {
+        "id": "msg_stub",
+        "type": "message",
+        "role": "assistant",
+        "model": model,
+        "content": [{"type": "text", "text": text}],
+        "stop_reason": "end_turn",
+        "stop_sequence": None,
+        "usage": {"input_tokens": 1800, "output_tokens": len(text) // 4},
+    }
+
+
+def split_text(text: str, pieces: int) -> list[str]:
+    """``text`` cut into ``pieces`` roughly equal chunks, as a model streams it."""
+    size = max(1, -(-len(text) // pieces))
+    return [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+
+def anthropic_stream_events(model: str, text: str, pieces: int = 8) -> list[bytes]:
+    """The server-sent events of a streamed Messages API response, one
+    chunk of ``text`` per ``content_block_delta``."""
+    message = anthropic_message_body(model, "")
+    message["content"] = []
+    message["stop_reason"] = None
+    events: list[tuple[str, dict[str, Any]]] = [
+        ("message_start", {"type": "message_start", "message": message}),
+        ("content_block_start", {
+            "type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""},
+        }),
+    ]
+    events += [
+        ("content_block_delta", {
+            "type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": chunk},
+        })
+        for chunk in split_text(text, pieces)
+    ]
+    events += [
+        ("content_block_stop", {"type": "content_block_stop", "index": 0}),
+        ("message_delta", {
+            "type": "message_delta",
+            "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+            "usage": {"output_tokens": len(text) // 4},
+        }),
+        ("message_stop", {"type": "message_stop"}),
+    ]
+    return [f"event: {name}\ndata: {json.dumps(data)}\n\n".encode() for name, data in events]
+
+
+def gemini_stream_chunks(text: str, pieces: int = 8) -> list[bytes]:
+    """A streamed ``generateContent`` response as the REST transport reads
+    it: one JSON array, delivered a candidate chunk at a time."""
+    chunks = [json.dumps(gemini_content_body(chunk)) for chunk in split_text(text, pieces)]
+    return [f"{'[' if i == 0 else ','}{chunk}".encode() for i, chunk in enumerate(chunks)] + [b"]"]
+
+
+def gemini_content_body(text: str) -> dict[str, Any]:
+    return {
+        "candidates": [{
+            "content": {"parts": [{"text": text}], "role": "model"},
+            "finishReason": "STOP",
+            "index": 0,
+        }],
+        "usageMetadata": {"promptTokenCount": 1800, "candidatesTokenCount": len(text) // 4},
+    }
+
+
+def error_body(status: int) -> dict[str, Any]:
+    if status == 429:
+        return {"error": {"status": 429, "message": "Rate limit exceeded"}}
+    return {"error": {"status": status, "message": "Internal server error"}}
@@ -0,0 +1,175 @@
+"""Local HTTP stand-in for the Spotify, Discogs, Anthropic and Gemini APIs.
+
+Serves every endpoint the backend calls, all from one port, answering from
+the seeded fixture catalog after a delay and failure roll drawn from each
+upstream's ``LatencyProfile``. Run it from backend/ with:
+
+    uvicorn benchmarks.upstream_simulator:app --port 8900
+
+and point the backend at it:
+
+    SPOTIFY_ACCOUNTS_URL=http://localhost:8900 SPOTIFY_API_URL=http://localhost:8900 \\
+    DISCOGS_API_URL=http://localhost:8900 ANTHROPIC_BASE_URL=http://localhost:8900 \\
+    GEMINI_API_URL=http://localhost:8900 uvicorn app.main:app
+
+``SIMULATOR_PROFILES`` names a JSON file of profile overrides (same format
+as ``bench_search.py --profiles``) and ``SIMULATOR_SEED`` seeds the catalog
+and every latency draw. Profiles can also be changed while it runs, to
+script a degradation mid-test:
+
+    curl -X PUT localhost:8900/_simulator/profiles/discogs \\
+        -H 'Content-Type: application/json' -d '{"rate_limit_rate": 0.5}'
+    curl localhost:8900/_simulator/stats
+
+For in-process use, wrap ``create_app()`` in ``httpx.ASGITransport``.
+"""
+import asyncio
+import json
+import os
+from collections.abc import AsyncIterator
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any
+
+from fastapi import Body, FastAPI, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from benchmarks import fixtures
+from benchmarks.upstream_stubs import (
+    FIRST_CHUNK_FRACTION,
+    LatencyProfile,
+    StubUpstreams,
+    fault_headers,
+    load_profiles,
+)
+
+SIMULATED_UPSTREAMS = ("spotify", "discogs", "anthropic", "gemini")
+
+
+def create_app(
+    profiles: dict[str, LatencyProfile] | None = None,
+    seed: int = 0,
+    fabricated_rate: float = 0.1,
+) -> FastAPI:
+    stubs = StubUpstreams(
+        profiles or load_profiles(), fixtures.Catalog(seed=seed), seed, fabricated_rate
+    )
+    app = FastAPI(title="DeepCuts upstream simulator", docs_url=None, redoc_url=None)
+    app.state.stubs = stubs
+
+    async def simulate(upstream: str) -> JSONResponse | None:
+        """Wait out this call's latency; return the error response if the
+        call was drawn to fail."""
+        delay, status = stubs.plan(upstream)
+        await asyncio.sleep(delay)
+        if status:
+            return JSONResponse(
+                fixtures.error_body(status), status_code=status, headers=fault_headers(status)
+            )
+        return None
+
+    async def simulate_stream(upstream: str, path: str, payload: dict[str, Any]) -> Response | None:
+        """Stream the AI response this request asks for, paced across its
+        latency, or return None if it didn't ask for one."""
+        streamed = stubs.stream(upstream, path, payload)
+        if not streamed:
+            return None
+        delay, status = stubs.plan(upstream)
+        if status:
+            await asyncio.sleep(delay)
+            return JSONResponse(
+                fixtures.error_body(status), status_code=status, headers=fault_headers(status)
+            )
+        media_type, chunks = streamed
+        await asyncio.sleep(delay * FIRST_CHUNK_FRACTION)
+        gap = delay * (1 - FIRST_CHUNK_FRACTION) / max(1, len(chunks) - 1)
+
+        async def paced() -> AsyncIterator[bytes]:
+            for i, chunk in enumerate(chunks):
+                if i:
+                    await asyncio.sleep(gap)
+                yield chunk
+
+        return StreamingResponse(paced(), media_type=media_type)
+
+    def not_found() -> JSONResponse:
+        return JSONResponse(fixtures.error_body(404), status_code=404)
+
+    # --- Spotify ---
+
+    @app.post("/api/token")
+    async def spotify_token():
+        return await simulate("spotify") or fixtures.spotify_token_body()
+
+    @app.get("/v1/search")
+    async def spotify_search(q: str = ""):
+        return await simulate("spotify") or stubs.spotify_search(q)
+
+    @app.get("/v1/albums/{album_id}/tracks")
+    async def spotify_tracks(album_id: str):
+        return await simulate("spotify") or stubs.spotify_tracks(album_id) or not_found()
+
+    # --- Discogs ---
+
+    @app.get("/database/search")
+    async def discogs_search(q: str = ""):
+        return await simulate("discogs") or stubs.discogs_search(q)
+
+    @app.get("/releases/{release_id}")
+    async def discogs_release(release_id: int):
+        return await simulate("discogs") or stubs.discogs_release(release_id) or not_found()
+
+    # --- AI providers ---
+
+    @app.post("/v1/messages")
+    async def anthropic_messages(request: Request, payload: dict[str, Any] = Body(...)):
+        return (
+            await simulate_stream("anthropic", request.url.path, payload)
+            or await simulate("anthropic")
+            or stubs.anthropic_message(payload)
+        )
+
+    @app.post("/v1beta/models/{model}:generateContent")
+    async def gemini_generate_content(model: str, payload: dict[str, Any] = Body(...)):
+        return await simulate("gemini") or stubs.gemini_content(payload)
+
+    @app.post("/v1beta/models/{model}:streamGenerateContent")
+    async def gemini_stream_generate_content(
+        model: str, request: Request, payload: dict[str, Any] = Body(...)
+    ):
+        return await simulate_stream("gemini", request.url.path, payload)
+
+    # --- Control ---
+
+    @app.get("/_simulator/stats")
+    async def stats():
+        return {
+            "calls": dict(stubs.calls),
+            "profiles": {name: asdict(stubs.profiles[name]) for name in SIMULATED_UPSTREAMS},
+        }
+
+    @app.put("/_simulator/profiles/{upstream}")
+    async def update_profile(upstream: str, fields: dict[str, float] = Body(...)):
+        if upstream not in SIMULATED_UPSTREAMS:
+            raise HTTPException(status_code=404, detail=f"Unknown upstream {upstream!r}")
+        try:
+            stubs.profiles[upstream] = LatencyProfile(**{**asdict(stubs.profiles[upstream]), **fields})
+        except TypeError as e:
+            raise HTTPException(status_code=400, detail=str(e)) from e
+        return asdict(stubs.profiles[upstream])
+
+    @app.post("/_simulator/reset")
+    async def reset():
+        stubs.calls.clear()
+        return {"calls": {}}
+
+    return app
+
+
+def _app_from_env() -> FastAPI:
+    path = os.getenv("SIMULATOR_PROFILES")
+    overrides = json.loads(Path(path).read_text()) if path else None
+    return create_app(load_profiles(overrides), seed=int(os.getenv("SIMULATOR_SEED", "0")))
+
+
+app = _app_from_env()
@@ -0,0 +1,266 @@
+"""``httpx.MockTransport`` stand-ins for every upstream the backend calls.
+
+Each upstream answers from the seeded ``fixtures.Catalog`` after a delay
+drawn from its ``LatencyProfile``, and fails a configurable fraction of
+calls with a 429 or 500. Spotify, Discogs and PocketBase are called through
+async clients, so they get an async transport that sleeps without blocking
+the loop; the Anthropic SDK client (and the Gemini stand-in) are
+synchronous and get a sync transport that blocks, exactly as the real SDK
+call does. Streamed AI responses arrive chunk by chunk across the drawn
+latency, so time to first token is measurable.
+"""
+import asyncio
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from collections.abc import Iterator
+from dataclasses import asdict, dataclass
+from datetime import UTC, datetime
+from typing import Any
+from urllib.parse import unquote
+
+import httpx
+
+from benchmarks import fixtures
+
+SPOTIFY_HOSTS = {"accounts.spotify.com", "api.spotify.com"}
+DISCOGS_HOST = "api.discogs.com"
+ANTHROPIC_HOST = "api.anthropic.com"
+GEMINI_HOST = "generativelanguage.googleapis.com"
+POCKETBASE_URL = "http://pocketbase.bench"
+
+
+@dataclass
+class LatencyProfile:
+    """Latency and failure behaviour of one upstream.
+
+    Latency is log-normal around ``median_ms``; ``sigma`` sets the tail
+    (0 gives a fixed delay, 0.5 puts p99 at roughly 3x the median).
+    """
+
+    median_ms: float
+    sigma: float = 0.4
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+
+    def delay(self, rng: random.Random) -> float:
+        if self.sigma <= 0:
+            return self.median_ms / 1000
+        return rng.lognormvariate(math.log(self.median_ms), self.sigma) / 1000
+
+    def fault(self, rng: random.Random) -> int | None:
+        roll = rng.random()
+        if roll < self.rate_limit_rate:
+            return 429
+        if roll < self.rate_limit_rate + self.error_rate:
+            return 500
+        return None
+
+
+# Scaled well below production so a full run takes seconds; pass a
+# profiles file to reproduce real-world latencies.
+DEFAULT_PROFILES = {
+    "anthropic": LatencyProfile(median_ms=250, sigma=0.3),
+    "gemini": LatencyProfile(median_ms=200, sigma=0.3),
+    "spotify": LatencyProfile(median_ms=40, sigma=0.5, rate_limit_rate=0.01),
+    "discogs": LatencyProfile(median_ms=60, sigma=0.5, rate_limit_rate=0.02),
+    "pocketbase": LatencyProfile(median_ms=3, sigma=0.3),
+}
+
+
+# Streamed AI responses send their first chunk this far into the drawn
+# latency and spread the rest evenly over the remainder.
+FIRST_CHUNK_FRACTION = 0.2
+
+
+def load_profiles(overrides: dict[str, dict[str, float]] | None = None) -> dict[str, LatencyProfile]:
+    profiles = {name: LatencyProfile(**asdict(p)) for name, p in DEFAULT_PROFILES.items()}
+    for name, fields in (overrides or {}).items():
+        if name not in profiles:
+            raise ValueError(f"Unknown upstream {name!r}; expected one of {sorted(profiles)}")
+        profiles[name] = LatencyProfile(**{**asdict(profiles[name]), **fields})
+    return profiles
+
+
+def _json(status: int, body: Any) -> httpx.Response:
+    return httpx.Response(status, json=body)
+
+
+def fault_headers(status: int) -> dict[str, str]:
+    return {"Retry-After": "1"} if status == 429 else {}
+
+
+class StubUpstreams:
+    """Upstream stand-ins over one catalog and set of profiles.
+
+    ``async_transport``/``sync_transport`` route ``httpx`` requests to them
+    by host; ``upstream_simulator`` serves the same methods over HTTP.
+    Calls are counted per upstream in ``calls``.
+    """
+
+    def __init__(
+        self,
+        profiles: dict[str, LatencyProfile],
+        catalog: fixtures.Catalog,
+        seed: int = 0,
+        fabricated_rate: float = 0.1,
+    ):
+        self.profiles = profiles
+        self.catalog = catalog
+        self.fabricated_rate = fabricated_rate
+        self.calls: Counter[str] = Counter()
+        self._rng = random.Random(seed)
+        # The sync transport is driven from worker threads by the AI SDKs.
+        self._lock = threading.Lock()
+
+    def plan(self, upstream: str) -> tuple[float, int | None]:
+        """Count a call to ``upstream`` and draw its delay and, if this call
+        should fail, the status to fail it with."""
+        profile = self.profiles[upstream]
+        with self._lock:
+            self.calls[upstream] += 1
+            return profile.delay(self._rng), profile.fault(self._rng)
+
+    def async_transport(self) -> httpx.MockTransport:
+        async def handler(request: httpx.Request) -> httpx.Response:
+            upstream = self._upstream(request)
+            delay, status = self.plan(upstream)
+            await asyncio.sleep(delay)
+            return self._fault(status) if status else self._respond(upstream, request)
+
+        return httpx.MockTransport(handler)
+
+    def sync_transport(self) -> httpx.MockTransport:
+        def handler(request: httpx.Request) -> httpx.Response:
+            upstream = self._upstream(request)
+            delay, status = self.plan(upstream)
+            streamed = None if status else self.stream(upstream, request.url.path, _loads(request.read()))
+            if not streamed:
+                time.sleep(delay)
+                return self._fault(status) if status else self._respond(upstream, request)
+
+            media_type, chunks = streamed
+            time.sleep(delay * FIRST_CHUNK_FRACTION)
+            gap = delay * (1 - FIRST_CHUNK_FRACTION) / max(1, len(chunks) - 1)
+
+            def paced() -> Iterator[bytes]:
+                for i, chunk in enumerate(chunks):
+                    if i:
+                        time.sleep(gap)
+                    yield chunk
+
+            return httpx.Response(200, headers={"Content-Type": media_type}, content=paced())
+
+        return httpx.MockTransport(handler)
+
+    def _fault(self, status: int) -> httpx.Response:
+        return httpx.Response(status, json=fixtures.error_body(status), headers=fault_headers(status))
+
+    def _upstream(self, request: httpx.Request) -> str:
+        host = request.url.host
+        if host in SPOTIFY_HOSTS:
+            return "spotify"
+        if host == DISCOGS_HOST:
+            return "discogs"
+        if host == ANTHROPIC_HOST:
+            return "anthropic"
+        if host == GEMINI_HOST:
+            return "gemini"
+        if host == httpx.URL(POCKETBASE_URL).host:
+            return "pocketbase"
+        raise AssertionError(f"Unexpected upstream request: {request.method} {request.url}")
+
+    def _respond(self, upstream: str, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        params = request.url.params
+        if upstream == "pocketbase":
+            return self._pocketbase(request)
+        if upstream == "anthropic":
+            return _json(200, self.anthropic_message(_loads(request.read())))
+        if upstream == "gemini":
+            return _json(200, self.gemini_content(_loads(request.read())))
+        if path == "/api/token":
+            return _json(200, fixtures.spotify_token_body())
+        if path == "/v1/search":
+            return _json(200, self.spotify_search(params.get("q", "")))
+        if path == "/database/search":
+            return _json(200, self.discogs_search(params.get("q", "")))
+        body = None
+        if match := re.fullmatch(r"/v1/albums/([^/]+)/tracks", path):
+            body = self.spotify_tracks(match.group(1))
+        elif match := re.fullmatch(r"/releases/(\d+)", path):
+            body = self.discogs_release(int(match.group(1)))
+        return _json(200, body) if body else _json(404, fixtures.error_body(404))
+
+    # --- Per-endpoint responses ---
+
+    def transcript(self, query: str) -> str:
+        with self._lock:
+            rng = random.Random(self._rng.random())
+        albums = self.catalog.recommend(rng, fabricated_rate=self.fabricated_rate)
+        return fixtures.build_transcript(albums, query, rng)
+
+    def spotify_search(self, q: str) -> dict[str, Any]:
+        match = re.fullmatch(r"album:(.*) artist:(.*)", q)
+        return fixtures.spotify_search_body(self.catalog.find(*match.groups()) if match else None)
+
+    def spotify_tracks(self, album_id: str) -> dict[str, Any] | None:
+        album = self.catalog.get(album_id.removeprefix("sp"))
+        return fixtures.spotify_tracks_body(album.id) if album else None
+
+    def discogs_search(self, q: str) -> dict[str, Any]:
+        return fixtures.discogs_search_body(self.catalog.search(q, limit=10))
+
+    def discogs_release(self, release_id: int) -> dict[str, Any] | None:
+        album = self.catalog.get(f"{release_id:06d}")
+        return fixtures.discogs_release_body(album) if album else None
+
+    def anthropic_message(self, payload: dict[str, Any]) -> dict[str, Any]:
+        prompt = payload["messages"][0]["content"]
+        return fixtures.anthropic_message_body(payload["model"], self.transcript(prompt[:60]))
+
+    def gemini_content(self, payload: dict[str, Any]) -> dict[str, Any]:
+        prompt = payload["contents"][0]["parts"][0]["text"]
+        return fixtures.gemini_content_body(self.transcript(prompt[:60]))
+
+    def stream(self, upstream: str, path: str, payload: dict[str, Any]) -> tuple[str, list[bytes]] | None:
+        """The media type and chunks of a streamed AI response, or None if
+        this request doesn't ask for one."""
+        if upstream == "anthropic" and payload.get("stream"):
+            prompt = payload["messages"][0]["content"]
+            return "text/event-stream", fixtures.anthropic_stream_events(
+                payload["model"], self.transcript(prompt[:60])
+            )
+        if upstream == "gemini" and path.endswith(":streamGenerateContent"):
+            prompt = payload["contents"][0]["parts"][0]["text"]
+            return "application/json", fixtures.gemini_stream_chunks(self.transcript(prompt[:60]))
+        return None
+
+    def _pocketbase(self, request: httpx.Request) -> httpx.Response:
+        path = unquote(request.url.path)
+        if path.endswith("/auth-with-password"):
+            return _json(200, {"token": "stub-admin-token", "record": {"id": "admin"}})
+        if path == "/api/batch":
+            requests = _loads(request.read())["requests"]
+            return _json(200, [{"status": 200, "body": _record(r.get("body"))} for r in requests])
+        if request.method == "GET" and path.endswith("/records"):
+            return _json(200, {"page": 1, "perPage": 30, "totalItems": 0, "totalPages": 0, "items": []})
+        if request.method in ("POST", "PATCH") and "/records" in path:
+            return _json(200, _record(_loads(request.read())))
+        if request.method == "DELETE":
+            return httpx.Response(204)
+        return _json(404, {"status": 404, "message": "The requested resource wasn't found."})
+
+
+def _loads(content: bytes) -> Any:
+    return json.loads(content) if content else {}
+
+
+def _record(data: dict[str, Any] | None) -> dict[str, Any]:
+    now = datetime.now(UTC).strftime("%Y-%m-%d %H:%M:%S.000Z")
+    return {"id": uuid.uuid4().hex[:15], "created": now, "updated": now, **(data or {})}
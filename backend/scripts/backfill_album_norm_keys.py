@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Backfill albums.norm_key on existing album records.
+
+Albums created before the add_albums_norm_key migration have an empty
+norm_key, and find-or-create only looks albums up by that key — so run this
+after applying the migration and before deploying the backend that depends
+on it. Records whose key is already correct are skipped, so it is safe to
+re-run.
+
+If two existing albums normalize to the same key (e.g. they differ only in
+non-ASCII case, which SQLite's lower() ignores), the unique index rejects
+the second one; it is reported and left empty for manual merging.
+
+Usage:
+    POCKETBASE_URL=... POCKETBASE_ADMIN_EMAIL=... POCKETBASE_ADMIN_PASSWORD=... \\
+        python scripts/backfill_album_norm_keys.py
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.clients.pocketbase import (  # noqa: E402
+    PocketBaseClient,
+    PocketBaseError,
+    get_pocketbase_client,
+)
+from app.services.favorites import album_norm_key  # noqa: E402
+
+
+async def backfill_album(client: PocketBaseClient, album: dict) -> str:
+    """Returns "updated", "unchanged" or "conflict"."""
+    norm_key = album_norm_key(album["title"], album["artist"])
+    if album.get("norm_key") == norm_key:
+        return "unchanged"
+    try:
+        await client.update_record("albums", album["id"], {"norm_key": norm_key})
+    except PocketBaseError as e:
+        print(f"  conflict: {album['id']} ({album['title']} / {album['artist']}): {e}")
+        return "conflict"
+    return "updated"
+
+
+async def run_backfill() -> dict[str, int]:
+    client = get_pocketbase_client()
+    counts = {"updated": 0, "unchanged": 0, "conflict": 0}
+    async for album in client.iter_records("albums", fields="id,title,artist,norm_key"):
+        counts[await backfill_album(client, album)] += 1
+    return counts
+
+
+def main() -> None:
+    try:
+        counts = asyncio.run(run_backfill())
+    except PocketBaseError as e:
+        print(f"Backfill failed: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(
+        f"\nDone: {counts['updated']} updated, {counts['unchanged']} already set, "
+        f"{counts['conflict']} conflicts."
+    )
+    if counts["conflict"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""Backfill the rollup counters on existing search_inputs records.
+
+Sessions created before the add_search_inputs_rollups migration have no
+total_clicks / total_favorites / last_interaction_at. This recomputes
+them from search_clicks, a page of sessions at a time, and writes absolute
+values — so it is safe to re-run, but run it while analytics writes are
+quiet or an increment landing mid-page can be overwritten.
+
+Usage:
+    POCKETBASE_URL=... POCKETBASE_ADMIN_EMAIL=... POCKETBASE_ADMIN_PASSWORD=... \\
+        python scripts/backfill_session_rollups.py
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.clients.pocketbase import (  # noqa: E402
+    PocketBaseClient,
+    PocketBaseError,
+    get_pocketbase_client,
+)
+
+PAGE_SIZE = 100
+
+
+def compute_rollup(clicks: list[dict]) -> dict:
+    last_interaction = max((c["created"] for c in clicks if c.get("created")), default="")
+    return {
+        "total_clicks": sum(1 for c in clicks if c.get("action") == "click"),
+        "total_favorites": sum(1 for c in clicks if c.get("action") == "favorite"),
+        "last_interaction_at": last_interaction,
+    }
+
+
+async def backfill_page(client: PocketBaseClient, sessions: list[dict]) -> int:
+    clicks = await client.prefetch_related(sessions, "search_clicks", "session")
+    for session in sessions:
+        rollup = compute_rollup(clicks[session["id"]])
+        await client.update_record("search_inputs", session["id"], rollup)
+    return len(sessions)
+
+
+async def run_backfill() -> int:
+    client = get_pocketbase_client()
+    updated = 0
+    cursor = None
+    while True:
+        page = await client.list_page("search_inputs", limit=PAGE_SIZE, cursor=cursor, fields="id,created")
+        updated += await backfill_page(client, page.items)
+        print(f"Backfilled {updated} sessions")
+        if not page.next_cursor:
+            return updated
+        cursor = page.next_cursor
+
+
+def main() -> None:
+    try:
+        updated = asyncio.run(run_backfill())
+    except PocketBaseError as e:
+        print(f"Backfill failed: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"\nDone: {updated} sessions backfilled.")
+
+
+if __name__ == "__main__":
+    main()
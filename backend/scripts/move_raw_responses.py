@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Move inline search_inputs.raw_response transcripts to raw_responses.
+
+Sessions saved before the create_raw_responses migration carry their AI
+transcript inline. This compresses each one into raw_responses
+(deduplicated by content hash, like new searches), points the session's
+raw_response_ref at it and clears the inline copy, one transactional batch
+per page of sessions. Every existing transcript is kept regardless of
+RAW_RESPONSE_SAMPLE_RATE. Safe to re-run; moved sessions no longer match.
+
+Usage:
+    POCKETBASE_URL=... POCKETBASE_ADMIN_EMAIL=... POCKETBASE_ADMIN_PASSWORD=... \\
+        python scripts/move_raw_responses.py
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.clients.pocketbase import (  # noqa: E402
+    PocketBaseClient,
+    PocketBaseError,
+    batch_update,
+    batch_upsert,
+    get_pocketbase_client,
+)
+from app.services.search_sessions import encode_raw_response  # noqa: E402
+
+# Two batch requests per session; stays within batch.maxRequests (50).
+SESSIONS_PER_BATCH = 25
+
+
+def move_requests(session: dict) -> list[dict]:
+    record = encode_raw_response(session["raw_response"])
+    return [
+        batch_upsert("raw_responses", record),
+        batch_update("search_inputs", session["id"], {"raw_response_ref": record["id"], "raw_response": ""}),
+    ]
+
+
+async def move_page(client: PocketBaseClient, sessions: list[dict]) -> int:
+    for start in range(0, len(sessions), SESSIONS_PER_BATCH):
+        chunk = sessions[start:start + SESSIONS_PER_BATCH]
+        await client.batch([request for session in chunk for request in move_requests(session)])
+    return len(sessions)
+
+
+async def run_move() -> int:
+    client = get_pocketbase_client()
+    moved = 0
+    cursor = None
+    while True:
+        page = await client.list_page(
+            "search_inputs",
+            limit=SESSIONS_PER_BATCH * 4,
+            cursor=cursor,
+            filter="raw_response != ''",
+            fields="id,created,raw_response",
+        )
+        moved += await move_page(client, page.items)
+        print(f"Moved {moved} raw responses")
+        if not page.next_cursor:
+            return moved
+        cursor = page.next_cursor
+
+
+def main() -> None:
+    try:
+        moved = asyncio.run(run_move())
+    except PocketBaseError as e:
+        print(f"Move failed: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"\nDone: {moved} raw responses moved.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,17 @@
+import csv
+import io
+import json
 from unittest.mock import AsyncMock
 
+import httpx
 import pytest
 from fastapi import HTTPException
 from fastapi.testclient import TestClient
 
 from app import main as main_module
+from app.clients.pocketbase import Page, PocketBaseClient, decode_cursor, encode_cursor
 from app.main import app
+from app.models.analytics import TrackEventsResponse
 from app.services.auth import AuthenticatedUser
 
 
@@ -89,7 +95,7 @@ class TestSearchResultsAndSummary:
         monkeypatch.setattr(
             main_module,
             "_fetch_sessions_with_outputs",
-            AsyncMock(return_value=[
+            AsyncMock(return_value=Page(items=[
                 {
                     "id": "s1",
                     "query": "radiohead",
@@ -103,7 +109,7 @@ class TestSearchResultsAndSummary:
                         {"id": "o2", "album_title": "Kid A", "album_artist": "Radiohead", "rank": 2},
                     ],
                 }
-            ]),
+            ], next_cursor=None)),
         )
 
         resp = client.get(
@@ -120,12 +126,12 @@ class TestSearchResultsAndSummary:
         monkeypatch.setattr(
             main_module,
             "_fetch_sessions_with_outputs",
-            AsyncMock(return_value=[
+            AsyncMock(return_value=Page(items=[
                 {
                     "id": "s1", "query": "q", "user_email": "owner@deepcuts.casa", "created": "2026-01-01",
                     "results_count": 0, "raw_results_count": 0, "filtered_count": 0, "outputs": [],
                 }
-            ]),
+            ], next_cursor=None)),
         )
 
         resp = client.get(
@@ -140,7 +146,7 @@ class TestSearchResultsAndSummary:
         monkeypatch.setattr(
             main_module,
             "_fetch_sessions_with_outputs",
-            AsyncMock(return_value=[
+            AsyncMock(return_value=Page(items=[
                 {
                     "id": "s1", "query": "radiohead", "user_email": "owner@deepcuts.casa",
                     "created": "2026-01-01", "results_count": 2, "filtered_count": 0,
@@ -149,13 +155,14 @@ class TestSearchResultsAndSummary:
                         {"album_title": "Kid A", "album_artist": "Radiohead"},
                     ],
                 }
-            ]),
+            ], next_cursor=None)),
         )
 
         resp = client.get(
             "/api/v1/analytics/search-summary", headers={"Authorization": "Bearer good-token"}
         )
         assert resp.status_code == 200
+        assert resp.json()["next_cursor"] is None
         summary = resp.json()["summaries"][0]
         assert summary["output_count"] == 2
         assert summary["albums"] == ["OK Computer by Radiohead", "Kid A by Radiohead"]
@@ -165,12 +172,12 @@ class TestSearchResultsAndSummary:
         monkeypatch.setattr(
             main_module,
             "_fetch_sessions_with_outputs",
-            AsyncMock(return_value=[
+            AsyncMock(return_value=Page(items=[
                 {
                     "id": "s1", "query": "q", "user_email": "owner@deepcuts.casa", "created": "2026-01-01",
                     "results_count": 0, "filtered_count": 0, "outputs": [],
                 }
-            ]),
+            ], next_cursor=None)),
         )
 
         resp = client.get(
@@ -181,6 +188,30 @@ class TestSearchResultsAndSummary:
         assert summary["albums"] is None
 
 
+    def test_search_results_passes_cursor_through(self, client, monkeypatch):
+        as_user(monkeypatch, "owner@deepcuts.casa")
+        cursor = encode_cursor({"created": "2026-01-01", "id": "s1"})
+        fetch = AsyncMock(return_value=Page(items=[], next_cursor="next"))
+        monkeypatch.setattr(main_module, "_fetch_sessions_with_outputs", fetch)
+
+        resp = client.get(
+            "/api/v1/analytics/search-results",
+            params={"limit": 10, "cursor": cursor},
+            headers={"Authorization": "Bearer good-token"},
+        )
+
+        assert resp.json() == {"results": [], "next_cursor": "next"}
+        fetch.assert_awaited_once_with("owner@deepcuts.casa", 10, cursor)
+
+    def test_search_summary_rejects_malformed_cursor(self, client, monkeypatch):
+        as_user(monkeypatch, "owner@deepcuts.casa")
+
+        resp = client.get(
+            "/api/v1/analytics/search-summary?cursor=garbage", headers={"Authorization": "Bearer good-token"}
+        )
+        assert resp.status_code == 400
+
+
 class TestSearchSessionsList:
     def test_requires_auth(self, client):
         resp = client.get("/api/v1/analytics/sessions")
@@ -188,12 +219,239 @@ class TestSearchSessionsList:
 
     def test_scopes_to_authenticated_users_email(self, client, monkeypatch):
         as_user(monkeypatch, "owner@deepcuts.casa")
-        mock_get_sessions = AsyncMock(return_value=[{"id": "s1"}])
+        mock_get_sessions = AsyncMock(return_value=Page(items=[{"id": "s1"}], next_cursor="next"))
         monkeypatch.setattr(main_module.search_session_service, "get_sessions", mock_get_sessions)
 
         resp = client.get(
             "/api/v1/analytics/sessions", headers={"Authorization": "Bearer good-token"}
         )
         assert resp.status_code == 200
-        assert resp.json()["sessions"] == [{"id": "s1"}]
-        mock_get_sessions.assert_awaited_once_with(user_email="owner@deepcuts.casa", limit=50)
+        assert resp.json() == {"sessions": [{"id": "s1"}], "next_cursor": "next"}
+        mock_get_sessions.assert_awaited_once_with(user_email="owner@deepcuts.casa", limit=50, cursor=None)
+
+    def test_rejects_malformed_cursor(self, client, monkeypatch):
+        as_user(monkeypatch, "owner@deepcuts.casa")
+        mock_get_sessions = AsyncMock()
+        monkeypatch.setattr(main_module.search_session_service, "get_sessions", mock_get_sessions)
+
+        resp = client.get(
+            "/api/v1/analytics/sessions?cursor=garbage", headers={"Authorization": "Bearer good-token"}
+        )
+        assert resp.status_code == 400
+        mock_get_sessions.assert_not_awaited()
+
+
+@pytest.mark.parametrize("path", [
+    "/api/v1/analytics/sessions",
+    "/api/v1/analytics/search-results",
+    "/api/v1/analytics/search-summary",
+])
+@pytest.mark.parametrize("limit", [0, 201])
+def test_paginated_endpoints_reject_out_of_range_limit(client, monkeypatch, path, limit):
+    as_user(monkeypatch, "owner@deepcuts.casa")
+
+    resp = client.get(path, params={"limit": limit}, headers={"Authorization": "Bearer good-token"})
+
+    assert resp.status_code == 422
+
+
+class TestTrackEvents:
+    def test_authenticates_once_per_batch(self, client, monkeypatch):
+        auth = AsyncMock(return_value=AuthenticatedUser(id="user-1", email="owner@deepcuts.casa"))
+        monkeypatch.setattr(main_module, "authenticate_token", auth)
+        mock_track = AsyncMock(return_value=TrackEventsResponse(success=True, recorded=2))
+        monkeypatch.setattr(main_module.search_session_service, "track_events", mock_track)
+
+        resp = client.post(
+            "/api/v1/analytics/events",
+            json={"events": [
+                {"type": "click", "session_id": "s1", "title": "OK Computer", "artist": "Radiohead"},
+                {"type": "dwell", "session_id": "s1", "title": "OK Computer", "artist": "Radiohead", "dwell_ms": 900},
+            ]},
+            headers={"Authorization": "Bearer good-token"},
+        )
+
+        assert resp.status_code == 200
+        assert resp.json() == {"success": True, "recorded": 2}
+        auth.assert_awaited_once()
+        events = mock_track.await_args.args[0]
+        assert [e.type for e in events] == ["click", "dwell"]
+        assert mock_track.await_args.kwargs["user_email"] == "owner@deepcuts.casa"
+
+    def test_reports_failure_when_the_batch_is_rejected(self, client, monkeypatch):
+        use_pocketbase(monkeypatch, lambda request: httpx.Response(400, json={"message": "invalid relation"}))
+        monkeypatch.setattr(main_module.search_session_service, "client", main_module.pocketbase_client)
+
+        resp = client.post("/api/v1/analytics/events", json={"events": [
+            {"type": "click", "session_id": "missing", "title": "OK Computer", "artist": "Radiohead"},
+        ]})
+
+        assert resp.status_code == 200
+        assert resp.json() == {"success": False, "recorded": 0}
+
+    def test_rejects_unknown_event_type(self, client):
+        resp = client.post("/api/v1/analytics/events", json={"events": [{"type": "scroll"}]})
+        assert resp.status_code == 422
+
+
+def use_pocketbase(monkeypatch, handler):
+    def wrapped(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/api/collections/_superusers/auth-with-password":
+            return httpx.Response(200, json={"token": "admin-token"})
+        return handler(request)
+
+    monkeypatch.setattr(main_module, "pocketbase_client", PocketBaseClient(
+        base_url="http://pocketbase.test",
+        admin_email="admin@test.invalid",
+        admin_password="admin-password",
+        transport=httpx.MockTransport(wrapped),
+    ))
+
+
+def paged_sessions_handler(session_requests):
+    """Two pages of one session each: s2 (with two outputs), then s1 (none)."""
+    sessions = [
+        {"id": "s2", "query": "kid a", "created": "2026-01-02"},
+        {"id": "s1", "query": "ok computer", "created": "2026-01-01"},
+    ]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/api/collections/search_inputs/records":
+            session_requests.append(request.url.params)
+            remaining = sessions[1:] if "created <" in request.url.params["filter"] else sessions
+            return httpx.Response(200, json={"items": remaining})
+        if request.url.path == "/api/collections/search_outputs/records":
+            items = []
+            if 'session = "s2"' in request.url.params["filter"]:
+                items = [
+                    {"id": "o1", "session": "s2", "album_title": "Kid A", "rank": 1},
+                    {"id": "o2", "session": "s2", "album_title": "Amnesiac", "rank": 2},
+                ]
+            return httpx.Response(200, json={"items": items, "totalPages": 1})
+        raise AssertionError(f"unexpected request: {request.method} {request.url.path}")
+
+    return handler
+
+
+class TestSearchResultsExport:
+    @pytest.fixture(autouse=True)
+    def one_session_per_page(self, monkeypatch):
+        monkeypatch.setattr(main_module, "_EXPORT_PAGE_SIZE", 1)
+
+    def test_requires_auth(self, client):
+        resp = client.get("/api/v1/analytics/search-results/export")
+        assert resp.status_code == 401
+
+    def test_streams_ndjson_across_pages(self, client, monkeypatch):
+        as_user(monkeypatch, "owner@deepcuts.casa")
+        session_requests = []
+        use_pocketbase(monkeypatch, paged_sessions_handler(session_requests))
+
+        resp = client.get(
+            "/api/v1/analytics/search-results/export", headers={"Authorization": "Bearer good-token"}
+        )
+
+        assert resp.status_code == 200
+        assert resp.headers["content-type"] == "application/x-ndjson"
+        rows = [json.loads(line) for line in resp.text.splitlines()]
+        assert [(r["input_id"], r["output_id"]) for r in rows] == [("s2", "o1"), ("s2", "o2"), ("s1", None)]
+        assert len(session_requests) == 2
+        assert "raw_response" not in session_requests[0]["fields"]
+        assert rows[0]["resume_cursor"] is None
+        assert rows[2]["resume_cursor"] is not None
+
+    def test_resume_cursor_restarts_at_that_rows_session(self, client, monkeypatch):
+        as_user(monkeypatch, "owner@deepcuts.casa")
+        use_pocketbase(monkeypatch, paged_sessions_handler([]))
+        headers = {"Authorization": "Bearer good-token"}
+
+        first = client.get("/api/v1/analytics/search-results/export", headers=headers)
+        resume_cursor = json.loads(first.text.splitlines()[-1])["resume_cursor"]
+        resumed = client.get(
+            "/api/v1/analytics/search-results/export", params={"cursor": resume_cursor}, headers=headers
+        )
+
+        assert [json.loads(line)["input_id"] for line in resumed.text.splitlines()] == ["s1"]
+
+    def test_streams_csv_with_header(self, client, monkeypatch):
+        as_user(monkeypatch, "owner@deepcuts.casa")
+        use_pocketbase(monkeypatch, paged_sessions_handler([]))
+
+        resp = client.get(
+            "/api/v1/analytics/search-results/export?format=csv",
+            headers={"Authorization": "Bearer good-token"},
+        )
+
+        assert resp.headers["content-type"].startswith("text/csv")
+        rows = list(csv.DictReader(io.StringIO(resp.text)))
+        assert [r["album_title"] for r in rows] == ["Kid A", "Amnesiac", ""]
+
+    @pytest.mark.parametrize("format", ["ndjson", "csv"])
+    def test_pocketbase_failure_ends_with_error_row(self, client, monkeypatch, format):
+        as_user(monkeypatch, "owner@deepcuts.casa")
+        handler = paged_sessions_handler([])
+
+        def failing_second_page(request: httpx.Request) -> httpx.Response:
+            if "created <" in request.url.params.get("filter", ""):
+                return httpx.Response(500)
+            return handler(request)
+
+        use_pocketbase(monkeypatch, failing_second_page)
+
+        resp = client.get(
+            "/api/v1/analytics/search-results/export",
+            params={"format": format},
+            headers={"Authorization": "Bearer good-token"},
+        )
+
+        if format == "csv":
+            rows = list(csv.DictReader(io.StringIO(resp.text)))
+        else:
+            rows = [json.loads(line) for line in resp.text.splitlines()]
+        *data, trailer = rows
+        assert [r["output_id"] for r in data] == ["o1", "o2"]
+        assert not data[-1].get("error")
+        assert trailer["error"]
+        assert decode_cursor(trailer["resume_cursor"]) == ("2026-01-02", "s2")
+
+    def test_rejects_malformed_cursor(self, client, monkeypatch):
+        as_user(monkeypatch, "owner@deepcuts.casa")
+
+        resp = client.get(
+            "/api/v1/analytics/search-results/export?cursor=garbage",
+            headers={"Authorization": "Bearer good-token"},
+        )
+        assert resp.status_code == 400
+
+
+class TestSessionRawResponse:
+    def test_returns_transcript_to_owner(self, client, monkeypatch):
+        as_user(monkeypatch, "owner@deepcuts.casa")
+        monkeypatch.setattr(
+            main_module.search_session_service, "get_raw_response",
+            AsyncMock(return_value={"session_id": "s1", "user_email": "owner@deepcuts.casa", "raw_response": "text"}),
+        )
+
+        resp = client.get("/api/v1/analytics/sessions/s1/raw-response", headers={"Authorization": "Bearer good-token"})
+
+        assert resp.status_code == 200
+        assert resp.json() == {"session_id": "s1", "raw_response": "text"}
+
+    def test_rejects_other_users(self, client, monkeypatch):
+        as_user(monkeypatch, "intruder@deepcuts.casa")
+        monkeypatch.setattr(
+            main_module.search_session_service, "get_raw_response",
+            AsyncMock(return_value={"session_id": "s1", "user_email": "owner@deepcuts.casa", "raw_response": "text"}),
+        )
+
+        resp = client.get("/api/v1/analytics/sessions/s1/raw-response", headers={"Authorization": "Bearer good-token"})
+
+        assert resp.status_code == 403
+
+    def test_missing_session_is_404(self, client, monkeypatch):
+        as_user(monkeypatch, "owner@deepcuts.casa")
+        monkeypatch.setattr(main_module.search_session_service, "get_raw_response", AsyncMock(return_value=None))
+
+        resp = client.get("/api/v1/analytics/sessions/s1/raw-response", headers={"Authorization": "Bearer good-token"})
+
+        assert resp.status_code == 404
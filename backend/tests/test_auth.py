@@ -1,21 +1,38 @@
+import asyncio
+import base64
+import json
+
+import httpx
 import pytest
 from fastapi import HTTPException
 
-from app.clients.pocketbase import PocketBaseUnavailableError
-from app.services.auth import get_current_user
+from app.clients.pocketbase import PocketBaseClient, PocketBaseUnavailableError
+from app.services.auth import get_current_user, request_auth_scope, user_token_cache
 
 
 class FakePocketBaseClient:
-    def __init__(self, record=None, error=None):
+    def __init__(self, record=None, error=None, delay=0.0):
         self._record = record
         self._error = error
+        self._delay = delay
+        self.calls = 0
 
     async def verify_user_token(self, token: str):
+        self.calls += 1
+        if self._delay:
+            await asyncio.sleep(self._delay)
         if self._error:
             raise self._error
         return self._record
 
 
+def make_jwt(**claims) -> str:
+    def segment(data: dict) -> str:
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).rstrip(b"=").decode()
+
+    return f"{segment({'alg': 'HS256'})}.{segment(claims)}.signature"
+
+
 @pytest.fixture(autouse=True)
 def reset_shared_client(monkeypatch):
     # Ensure each test controls exactly which client get_current_user resolves,
@@ -25,7 +42,9 @@ def reset_shared_client(monkeypatch):
     def patch_client(client):
         monkeypatch.setattr(auth_module, "get_shared_pocketbase_client", lambda: client)
 
+    user_token_cache.clear()
     yield patch_client
+    user_token_cache.clear()
 
 
 async def test_returns_authenticated_user_for_valid_token(reset_shared_client):
@@ -62,3 +81,97 @@ async def test_raises_503_when_pocketbase_unavailable(reset_shared_client):
         await get_current_user("valid-token")
 
     assert exc_info.value.status_code == 503
+
+
+async def test_verified_token_is_served_from_cache(reset_shared_client):
+    client = FakePocketBaseClient(record={"id": "u1", "email": "listener@deepcuts.casa"})
+    reset_shared_client(client)
+
+    await get_current_user("valid-token")
+    user = await get_current_user("valid-token")
+
+    assert user.id == "u1"
+    assert client.calls == 1
+
+
+async def test_cache_entry_expires_with_token(reset_shared_client, monkeypatch):
+    client = FakePocketBaseClient(record={"id": "u1", "email": "listener@deepcuts.casa"})
+    reset_shared_client(client)
+    token = make_jwt(exp=1_000_010)
+    monkeypatch.setattr("app.services.auth.time.time", lambda: 1_000_000)
+
+    await get_current_user(token)
+    monkeypatch.setattr("app.services.auth.time.time", lambda: 1_000_011)
+    await get_current_user(token)
+
+    assert client.calls == 2
+
+
+async def test_invalid_token_is_negatively_cached(reset_shared_client):
+    client = FakePocketBaseClient(record=None)
+    reset_shared_client(client)
+
+    for _ in range(3):
+        with pytest.raises(HTTPException):
+            await get_current_user("bad-token")
+
+    assert client.calls == 1
+
+
+async def test_unavailable_pocketbase_is_not_cached(reset_shared_client):
+    client = FakePocketBaseClient(error=PocketBaseUnavailableError("timed out"))
+    reset_shared_client(client)
+
+    for _ in range(2):
+        with pytest.raises(HTTPException):
+            await get_current_user("valid-token")
+
+    assert client.calls == 2
+
+
+async def test_auth_refresh_503_is_not_cached(reset_shared_client):
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        return httpx.Response(503 if len(calls) == 1 else 200, json={
+            "record": {"id": "u1", "email": "listener@deepcuts.casa"}
+        })
+
+    reset_shared_client(PocketBaseClient(
+        base_url="http://pocketbase.test",
+        admin_email="admin@test.invalid",
+        admin_password="admin-password",
+        transport=httpx.MockTransport(handler),
+    ))
+
+    with pytest.raises(HTTPException) as exc_info:
+        await get_current_user("valid-token")
+    user = await get_current_user("valid-token")
+
+    assert exc_info.value.status_code == 503
+    assert user.id == "u1"
+    assert len(calls) == 2
+
+
+async def test_concurrent_verifications_share_one_call(reset_shared_client):
+    client = FakePocketBaseClient(record={"id": "u1", "email": "listener@deepcuts.casa"}, delay=0.01)
+    reset_shared_client(client)
+
+    users = await asyncio.gather(*(get_current_user("valid-token") for _ in range(5)))
+
+    assert {u.id for u in users} == {"u1"}
+    assert client.calls == 1
+
+
+async def test_request_scope_memoizes_without_touching_cache(reset_shared_client):
+    client = FakePocketBaseClient(record={"id": "u1", "email": "listener@deepcuts.casa"})
+    reset_shared_client(client)
+
+    with request_auth_scope():
+        first = await get_current_user("valid-token")
+        user_token_cache.clear()
+        second = await get_current_user("valid-token")
+
+    assert first is second
+    assert client.calls == 1
@@ -1,7 +1,14 @@
+import json
+from unittest.mock import AsyncMock
+
 import httpx
+from fastapi.testclient import TestClient
 
-from app.clients.pocketbase import PocketBaseClient
-from app.models.favorites import AddToFavoritesRequest
+from app import main as main_module
+from app.clients.pocketbase import PocketBaseClient, derive_record_id
+from app.main import app
+from app.models.favorites import AddToFavoritesRequest, UserFavoritesList
+from app.services.auth import AuthenticatedUser
 from app.services.favorites import FavoritesService
 
 
@@ -26,91 +33,107 @@ def admin_auth_or(handler):
     return wrapped
 
 
-class TestAddToFavorites:
-    async def test_creates_new_album_and_favorite(self):
-        created_album = {"id": "album-1", "title": "OK Computer", "artist": "Radiohead"}
+class FakeCreateStore:
+    """In-memory stand-in for PocketBase's transactional batch of record
+    creates on albums and favorites: a create of an id that is already
+    taken rejects the whole batch, reporting the failed request."""
 
-        def handler(request: httpx.Request) -> httpx.Response:
-            path = request.url.path
-            if path == "/api/collections/albums/records" and request.method == "GET":
-                return httpx.Response(200, json={"items": []})  # no existing match
-            if path == "/api/collections/albums/records" and request.method == "POST":
-                return httpx.Response(201, json=created_album)
-            if path == "/api/collections/favorites/records" and request.method == "GET":
-                return httpx.Response(200, json={"items": []})  # not already favorited
-            if path == "/api/collections/favorites/records" and request.method == "POST":
-                body = httpx.Request("POST", request.url, content=request.content).content
-                assert b'"album-1"' in body
-                return httpx.Response(201, json={"id": "fav-1", "user": "user-1", "album": "album-1"})
-            raise AssertionError(f"unexpected request: {request.method} {path}")
+    def __init__(self):
+        self.records: dict[tuple[str, str], dict] = {}
+        self.batch_calls = 0
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        if request.url.path != "/api/batch":
+            raise AssertionError(f"unexpected request: {request.method} {request.url.path}")
+        self.batch_calls += 1
+        created = {}
+        for index, item in enumerate(json.loads(request.content)["requests"]):
+            assert item["method"] == "POST"
+            key = (item["url"].split("/")[3], item["body"]["id"])
+            if key in self.records or key in created:
+                return httpx.Response(400, json={"status": 400, "message": "Batch transaction failed.", "data": {
+                    "requests": {str(index): {"code": "batch_request_failed", "response": {
+                        "status": 400, "data": {"id": {"code": "validation_pk_not_unique"}},
+                    }}},
+                }})
+            created[key] = dict(item["body"])
+        self.records.update(created)
+        return httpx.Response(200, json=[{"status": 200, "body": body} for body in created.values()])
 
-        service = make_service(admin_auth_or(handler))
-        request = AddToFavoritesRequest(album_data={"title": "OK Computer", "artist": "Radiohead"})
+
+class TestAddToFavorites:
+    async def test_creates_album_and_favorite_in_one_batch(self):
+        store = FakeCreateStore()
+        service = make_service(admin_auth_or(store))
+        request = AddToFavoritesRequest(
+            album_data={"title": "OK Computer ", "artist": "Radiohead", "genre": "Alternative", "reasoning": "Moody"}
+        )
 
         result = await service.add_to_favorites("user-1", "listener@deepcuts.casa", request)
 
         assert result.success is True
         assert result.message == "Album added to favorites"
+        assert store.batch_calls == 1
+        album_id = derive_record_id("albums", "ok computer|radiohead")
+        album = store.records[("albums", album_id)]
+        favorite = store.records[("favorites", derive_record_id("favorites", "user-1", album_id))]
+        assert album["title"] == "OK Computer"
+        assert album["genre"] == "Alternative"
+        assert favorite["album"] == album_id
+        assert favorite["reasoning"] == "Moody"
+
+    async def test_never_rewrites_an_existing_album(self):
+        store = FakeCreateStore()
+        service = make_service(admin_auth_or(store))
+        await service.add_to_favorites(
+            "user-1", "", AddToFavoritesRequest(album_data={"title": "OK Computer", "artist": "Radiohead"})
+        )
 
-    async def test_reuses_existing_album_and_updates_metadata(self):
-        existing_album = {"id": "album-1", "title": "OK Computer", "artist": "Radiohead"}
-        update_called = {"value": False}
+        result = await service.add_to_favorites("user-2", "", AddToFavoritesRequest(
+            album_data={"title": "ok computer", "artist": "RADIOHEAD", "genre": "Art Rock"}
+        ))
 
-        def handler(request: httpx.Request) -> httpx.Response:
-            path = request.url.path
-            if path == "/api/collections/albums/records" and request.method == "GET":
-                return httpx.Response(200, json={"items": [existing_album]})
-            if path == "/api/collections/albums/records/album-1" and request.method == "PATCH":
-                update_called["value"] = True
-                return httpx.Response(200, json=existing_album)
-            if path == "/api/collections/favorites/records" and request.method == "GET":
-                return httpx.Response(200, json={"items": []})
-            if path == "/api/collections/favorites/records" and request.method == "POST":
-                return httpx.Response(201, json={"id": "fav-1"})
-            raise AssertionError(f"unexpected request: {request.method} {path}")
+        assert result.message == "Album added to favorites"
+        assert store.batch_calls == 3
+        album_id = derive_record_id("albums", "ok computer|radiohead")
+        assert store.records[("albums", album_id)] == {
+            "id": album_id, "title": "OK Computer", "artist": "Radiohead", "norm_key": "ok computer|radiohead",
+        }
+        assert ("favorites", derive_record_id("favorites", "user-2", album_id)) in store.records
 
-        service = make_service(admin_auth_or(handler))
-        request = AddToFavoritesRequest(
-            album_data={"title": "OK Computer", "artist": "Radiohead", "genre": "Alternative Rock"}
-        )
+    async def test_existing_favorite_is_reported_and_left_alone(self):
+        store = FakeCreateStore()
+        service = make_service(admin_auth_or(store))
+        await service.add_to_favorites("user-1", "", AddToFavoritesRequest(
+            album_data={"title": "OK Computer", "artist": "Radiohead", "reasoning": "Moody"}
+        ))
 
-        result = await service.add_to_favorites("user-1", "listener@deepcuts.casa", request)
+        result = await service.add_to_favorites("user-1", "", AddToFavoritesRequest(
+            album_data={"title": "OK Computer", "artist": "Radiohead", "reasoning": "Changed my mind"}
+        ))
 
         assert result.success is True
-        assert update_called["value"] is True
-
-    async def test_is_idempotent_for_same_user_and_album(self):
-        existing_album = {"id": "album-1", "title": "OK Computer", "artist": "Radiohead"}
-        create_favorite_calls = {"count": 0}
+        assert result.message == "Album already in favorites"
+        assert len(store.records) == 2
+        [favorite] = [record for (collection, _), record in store.records.items() if collection == "favorites"]
+        assert favorite["reasoning"] == "Moody"
 
+    async def test_other_rejections_are_failures(self):
         def handler(request: httpx.Request) -> httpx.Response:
-            path = request.url.path
-            if path == "/api/collections/albums/records" and request.method == "GET":
-                return httpx.Response(200, json={"items": [existing_album]})
-            if path == "/api/collections/favorites/records" and request.method == "GET":
-                return httpx.Response(200, json={"items": [{"id": "fav-1", "user": "user-1", "album": "album-1"}]})
-            if path == "/api/collections/favorites/records" and request.method == "POST":
-                create_favorite_calls["count"] += 1
-                return httpx.Response(201, json={"id": "fav-1"})
-            raise AssertionError(f"unexpected request: {request.method} {path}")
+            return httpx.Response(400, json={"data": {"requests": {"0": {"response": {
+                "data": {"title": {"code": "validation_max_text_constraint"}},
+            }}}}})
 
         service = make_service(admin_auth_or(handler))
         request = AddToFavoritesRequest(album_data={"title": "OK Computer", "artist": "Radiohead"})
 
         result = await service.add_to_favorites("user-1", "listener@deepcuts.casa", request)
 
-        assert result.success is True
-        assert result.message == "Album already in favorites"
-        assert create_favorite_calls["count"] == 0
+        assert result.success is False
 
-    async def test_returns_failure_when_album_creation_fails(self):
+    async def test_unavailable_pocketbase_is_a_failure(self):
         def handler(request: httpx.Request) -> httpx.Response:
-            path = request.url.path
-            if path == "/api/collections/albums/records" and request.method == "GET":
-                return httpx.Response(200, json={"items": []})
-            if path == "/api/collections/albums/records" and request.method == "POST":
-                return httpx.Response(400, json={"message": "validation failed"})
-            raise AssertionError(f"unexpected request: {request.method} {path}")
+            raise httpx.ConnectError("connection refused")
 
         service = make_service(admin_auth_or(handler))
         request = AddToFavoritesRequest(album_data={"title": "OK Computer", "artist": "Radiohead"})
@@ -118,7 +141,6 @@ class TestAddToFavorites:
         result = await service.add_to_favorites("user-1", "listener@deepcuts.casa", request)
 
         assert result.success is False
-        assert "Failed to save album" in result.message
 
 
 class TestRemoveFromFavorites:
@@ -223,6 +245,59 @@ class TestGetUserFavorites:
         assert result.total == 31
 
 
+    async def test_paged_listing_returns_cursor(self):
+        seen = {}
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.path == "/api/collections/favorites/records":
+                seen.update(request.url.params)
+                return httpx.Response(200, json={"items": [
+                    {"id": f"fav-{i}", "created": f"2026-01-0{3 - i}", "expand": {"album": {"id": f"a{i}"}}}
+                    for i in range(3)
+                ]})
+            raise AssertionError(f"unexpected request: {request.method} {request.url.path}")
+
+        service = make_service(admin_auth_or(handler))
+        result = await service.get_user_favorites("user-1", limit=2)
+
+        assert seen["perPage"] == "3"
+        assert seen["skipTotal"] == "1"
+        assert seen["expand"] == "album"
+        assert [f["id"] for f in result.favorites] == ["fav-0", "fav-1"]
+        assert result.next_cursor is not None
+
+
+    async def test_projects_requested_album_fields(self):
+        seen = {}
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            seen.update(request.url.params)
+            return httpx.Response(200, json={"items": [
+                {"id": "fav-1", "created": "2026-01-01", "expand": {"album": {"id": "a1", "title": "Blue"}}}
+            ]})
+
+        service = make_service(admin_auth_or(handler))
+        result = await service.get_user_favorites("user-1", limit=20, album_fields=["title", "cover_url"])
+
+        assert seen["expand"] == "album"
+        assert seen["fields"] == "id,created,reasoning,expand.album.cover_url,expand.album.id,expand.album.title"
+        assert result.favorites[0]["albums"] == {"id": "a1", "title": "Blue"}
+
+    async def test_ids_only_skips_album_expand(self):
+        seen = {}
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            seen.update(request.url.params)
+            return httpx.Response(200, json={"items": [{"id": "fav-1", "created": "2026-01-01", "album": "a1"}]})
+
+        service = make_service(admin_auth_or(handler))
+        result = await service.get_user_favorites("user-1", limit=20, ids_only=True)
+
+        assert "expand" not in seen
+        assert seen["fields"] == "id,created,album"
+        assert result.favorites == [{"id": "fav-1", "saved_at": "2026-01-01", "album_id": "a1"}]
+
+
 class TestUpdateFavorite:
     async def test_updates_album_fields_for_owned_favorite(self):
         updated_fields = {}
@@ -254,3 +329,166 @@ class TestUpdateFavorite:
 
         assert result.success is False
         assert result.message == "Favorite not found"
+
+
+class TestGetFavoritesVersion:
+    async def test_combines_count_and_latest_updates(self):
+        def handler(request: httpx.Request) -> httpx.Response:
+            params = request.url.params
+            assert "expand" not in params
+            if request.url.path == "/api/collections/favorites/records":
+                assert params["filter"] == 'user = "user-1"'
+                return httpx.Response(200, json={"items": [{"updated": "2026-01-02"}], "totalItems": 7})
+            if request.url.path == "/api/collections/albums/records":
+                assert params["filter"] == 'favorites_via_album.user ?= "user-1"'
+                return httpx.Response(200, json={"items": [{"updated": "2026-01-03"}]})
+            raise AssertionError(f"unexpected request: {request.method} {request.url.path}")
+
+        service = make_service(admin_auth_or(handler))
+
+        assert await service.get_favorites_version("user-1") == "7|2026-01-02|2026-01-03"
+
+    async def test_returns_none_when_pocketbase_fails(self):
+        service = make_service(admin_auth_or(lambda request: httpx.Response(500, text="boom")))
+
+        assert await service.get_favorites_version("user-1") is None
+
+
+class TestFavoritesContains:
+    def favorites_handler(self, counter):
+        def handler(request: httpx.Request) -> httpx.Response:
+            path = request.url.path
+            if path == "/api/collections/favorites/records" and request.method == "GET":
+                counter["lists"] += 1
+                return httpx.Response(200, json={"totalPages": 1, "items": [
+                    {"expand": {"album": {"title": "Blue", "artist": "Joni Mitchell"}}},
+                    {"expand": {"album": {"title": "OK Computer", "artist": "Radiohead"}}},
+                ]})
+            if path == "/api/batch":
+                return httpx.Response(200, json=[
+                    {"status": 200, "body": {"id": "a1"}},
+                    {"status": 200, "body": {"id": "f1"}},
+                ])
+            raise AssertionError(f"unexpected request: {request.method} {path}")
+        return handler
+
+    async def test_answers_from_warmed_set(self):
+        counter = {"lists": 0}
+        service = make_service(admin_auth_or(self.favorites_handler(counter)))
+
+        first = await service.contains("user-1", ["blue | JONI MITCHELL", "Kid A|Radiohead"])
+        second = await service.contains("user-1", ["OK Computer|Radiohead"])
+
+        assert first == {"blue | JONI MITCHELL": True, "Kid A|Radiohead": False}
+        assert second == {"OK Computer|Radiohead": True}
+        assert counter["lists"] == 1
+
+    async def test_writes_invalidate_the_set(self):
+        counter = {"lists": 0}
+        service = make_service(admin_auth_or(self.favorites_handler(counter)))
+
+        await service.contains("user-1", ["Blue|Joni Mitchell"])
+        await service.add_to_favorites(
+            "user-1", "listener@deepcuts.casa", AddToFavoritesRequest(album_data={"title": "Kid A", "artist": "Radiohead"})
+        )
+        await service.contains("user-1", ["Blue|Joni Mitchell"])
+
+        assert counter["lists"] == 2
+
+    def test_endpoint_returns_membership(self, monkeypatch):
+        monkeypatch.setattr(
+            main_module, "authenticate_token",
+            AsyncMock(return_value=AuthenticatedUser(id="user-1", email="listener@deepcuts.casa")),
+        )
+        contains = AsyncMock(return_value={"Blue|Joni Mitchell": True})
+        monkeypatch.setattr(main_module.favorites_service, "contains", contains)
+
+        resp = TestClient(app).post(
+            "/api/v1/favorites/contains",
+            json={"keys": ["Blue|Joni Mitchell"]},
+            headers={"Authorization": "Bearer good-token"},
+        )
+
+        assert resp.json() == {"success": True, "favorited": {"Blue|Joni Mitchell": True}}
+        contains.assert_awaited_once_with("user-1", ["Blue|Joni Mitchell"])
+
+
+class TestFavoritesConditionalGet:
+    def setup_favorites(self, monkeypatch, version="3|a|b"):
+        monkeypatch.setattr(
+            main_module, "authenticate_token",
+            AsyncMock(return_value=AuthenticatedUser(id="user-1", email="listener@deepcuts.casa")),
+        )
+        monkeypatch.setattr(
+            main_module.favorites_service, "get_favorites_version", AsyncMock(return_value=version)
+        )
+        listing = AsyncMock(return_value=UserFavoritesList(success=True, favorites=[], total=0))
+        monkeypatch.setattr(main_module.favorites_service, "get_user_favorites", listing)
+        return listing
+
+    def test_matching_etag_answers_304_without_listing(self, monkeypatch):
+        listing = self.setup_favorites(monkeypatch)
+        client = TestClient(app)
+        headers = {"Authorization": "Bearer good-token"}
+
+        first = client.get("/api/v1/favorites", headers=headers)
+        etag = first.headers["etag"]
+        second = client.get("/api/v1/favorites", headers={**headers, "If-None-Match": etag})
+
+        assert first.status_code == 200
+        assert second.status_code == 304
+        assert second.headers["etag"] == etag
+        assert listing.await_count == 1
+
+    def test_etag_changes_with_version_and_query(self, monkeypatch):
+        self.setup_favorites(monkeypatch)
+        client = TestClient(app)
+        headers = {"Authorization": "Bearer good-token"}
+
+        etag = client.get("/api/v1/favorites", headers=headers).headers["etag"]
+        other_page = client.get("/api/v1/favorites?limit=10", headers={**headers, "If-None-Match": etag})
+        self.setup_favorites(monkeypatch, version="4|a|b")
+        changed = client.get("/api/v1/favorites", headers={**headers, "If-None-Match": etag})
+
+        assert other_page.status_code == 200
+        assert changed.status_code == 200
+        assert changed.headers["etag"] != etag
+
+    def test_failed_listing_is_not_tagged(self, monkeypatch):
+        listing = self.setup_favorites(monkeypatch)
+        listing.return_value = UserFavoritesList(success=False, favorites=[], total=0)
+
+        resp = TestClient(app).get("/api/v1/favorites", headers={"Authorization": "Bearer good-token"})
+
+        assert "etag" not in resp.headers
+
+
+    def test_passes_field_selection_through(self, monkeypatch):
+        listing = self.setup_favorites(monkeypatch)
+
+        resp = TestClient(app).get(
+            "/api/v1/favorites?fields=title,%20cover_url&ids_only=false",
+            headers={"Authorization": "Bearer good-token"},
+        )
+
+        assert resp.status_code == 200
+        assert listing.await_args.kwargs["album_fields"] == ["title", "cover_url"]
+        assert listing.await_args.kwargs["ids_only"] is False
+
+    def test_rejects_unknown_album_fields(self, monkeypatch):
+        self.setup_favorites(monkeypatch)
+
+        resp = TestClient(app).get(
+            "/api/v1/favorites?fields=title,password", headers={"Authorization": "Bearer good-token"}
+        )
+
+        assert resp.status_code == 400
+
+
+def test_settings_models_supports_conditional_get():
+    client = TestClient(app)
+
+    first = client.get("/api/v1/settings/models")
+    second = client.get("/api/v1/settings/models", headers={"If-None-Match": first.headers["etag"]})
+
+    assert second.status_code == 304
@@ -0,0 +1,113 @@
+import argparse
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.loadtest import (
+    EndpointStats,
+    LevelReport,
+    LoadTest,
+    Window,
+    check_saturation,
+    level_report,
+    parse_mix,
+)
+
+
+def make_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/api/v1/discogs/search")
+    async def autocomplete():
+        return {"results": []}
+
+    @app.post("/api/v1/search")
+    async def search():
+        return {"session_id": "s1", "recommendations": [{"title": "Loveless", "artist": "MBV"}]}
+
+    @app.post("/api/v1/analytics/events")
+    async def events(body: dict):
+        assert body["events"][0]["session_id"] == "s1"
+        return {"success": True, "recorded": len(body["events"])}
+
+    return app
+
+
+def report(offered: float, achieved: float, errors: int = 0, p95: float = 10.0) -> LevelReport:
+    stats = {"count": 100, "errors": errors, "p50_ms": p95, "p95_ms": p95, "p99_ms": p95}
+    return LevelReport(
+        target_rps=offered,
+        offered_rps=offered,
+        achieved_rps=achieved,
+        requests=100,
+        errors=errors,
+        endpoints={"search": stats},
+    )
+
+
+class TestParseMix:
+    def test_unlisted_endpoints_default_to_zero(self):
+        assert parse_mix("search=1,autocomplete=2.5") == {
+            "autocomplete": 2.5, "search": 1.0, "analytics": 0.0, "favorites": 0.0,
+        }
+
+    def test_rejects_unknown_endpoint(self):
+        with pytest.raises(argparse.ArgumentTypeError):
+            parse_mix("search=1,checkout=2")
+
+
+class TestJourney:
+    def test_types_then_searches_then_browses(self):
+        test = LoadTest(None, {"autocomplete": 3, "search": 1, "analytics": 2, "favorites": 0})
+        assert test.journey() == ["autocomplete"] * 3 + ["search"] + ["analytics"] * 2
+
+    def test_fractional_weights_average_out(self):
+        test = LoadTest(None, {"search": 0.25})
+        total = sum(len(test.journey()) for _ in range(4000))
+        assert 900 < total < 1100
+
+
+def test_endpoint_stats_percentile_and_histogram():
+    stats = EndpointStats(latencies_ms=[float(n) for n in range(1, 101)])
+    assert stats.percentile(50) == 50
+    assert stats.percentile(99) == 99
+    assert sum(stats.histogram()) == 100
+    assert stats.histogram()[:2] == [5, 5]
+
+
+class TestCheckSaturation:
+    def test_healthy_level(self):
+        first = report(5, 5)
+        assert not check_saturation(report(10, 9.8), first, max_error_rate=0.01, knee=3).saturated
+
+    def test_throughput_falling_behind_offered_load(self):
+        result = check_saturation(report(10, 7), None, max_error_rate=0.01, knee=3)
+        assert result.saturated
+        assert result.reasons == ["completed 7 of 10 rps offered"]
+
+    def test_error_rate(self):
+        assert check_saturation(report(10, 10, errors=5), None, max_error_rate=0.01, knee=3).saturated
+
+    def test_latency_knee_against_first_level(self):
+        first = report(5, 5, p95=100)
+        assert not check_saturation(report(10, 10, p95=250), first, max_error_rate=0.01, knee=3).saturated
+        assert check_saturation(report(10, 10, p95=350), first, max_error_rate=0.01, knee=3).saturated
+
+
+async def test_records_requests_started_in_window():
+    transport = httpx.ASGITransport(app=make_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        test = LoadTest(client, {"autocomplete": 2, "search": 1, "analytics": 1}, think_scale=0)
+        await test.visitor()  # before any window: not recorded
+        window = test._window = Window()
+        await test.visitor()
+        window.close()
+        await window.settled.wait()
+
+    result = level_report(4, window)
+    assert result.requests == 4
+    assert result.errors == 0
+    assert {kind: s["count"] for kind, s in result.endpoints.items()} == {
+        "analytics": 1, "autocomplete": 2, "search": 1,
+    }
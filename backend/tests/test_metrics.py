@@ -0,0 +1,188 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main as main_module
+from app import metrics
+from app.clients.pocketbase import PocketBaseClient, PocketBaseUnavailableError
+from app.clients.upstream import create_upstream_client
+
+
+def test_counter_renders_labelled_samples():
+    counter = metrics.Counter("test_calls_total", "Calls.", ("host",))
+    counter.inc(host='a"b')
+    counter.inc(2, host='a"b')
+
+    assert counter.render() == (
+        "# HELP test_calls_total Calls.\n"
+        "# TYPE test_calls_total counter\n"
+        'test_calls_total{host="a\\"b"} 3.0'
+    )
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = metrics.Histogram("test_seconds", "Latency.", ("op",), buckets=(0.1, 1))
+    histogram.observe(0.05, op="get")
+    histogram.observe(0.5, op="get")
+    histogram.observe(5, op="get")
+
+    assert histogram.render().splitlines()[2:] == [
+        'test_seconds_bucket{op="get",le="0.1"} 1',
+        'test_seconds_bucket{op="get",le="1.0"} 2',
+        'test_seconds_bucket{op="get",le="+Inf"} 3',
+        'test_seconds_sum{op="get"} 5.55',
+        'test_seconds_count{op="get"} 3',
+    ]
+
+
+def test_labels_must_match_declared_names():
+    with pytest.raises(ValueError):
+        metrics.Counter("test_total", "Calls.", ("host",)).inc(status="200")
+
+
+@pytest.mark.parametrize("path,label", [
+    ("/v1/search", "/v1/search"),
+    ("/releases/1234", "/releases/{id}"),
+    ("/v1/albums/4aawyAB9vmqN3uQ7FjRGTy/tracks", "/v1/albums/{id}/tracks"),
+])
+def test_endpoint_label_templates_ids(path, label):
+    assert metrics.endpoint_label(path) == label
+
+
+@pytest.mark.parametrize("path,collection", [
+    ("/api/collections/favorites/records", "favorites"),
+    ("/api/collections/search_inputs/records/abc123", "search_inputs"),
+    ("/api/batch", "batch"),
+])
+def test_pocketbase_collection(path, collection):
+    assert metrics.pocketbase_collection(path) == collection
+
+
+async def test_upstream_client_records_status_and_failures():
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.startswith("/releases/"):
+            raise httpx.ConnectTimeout("timed out")
+        return httpx.Response(429)
+
+    client = create_upstream_client(httpx.MockTransport(handler))
+    before = metrics.UPSTREAM_RESPONSES.value(
+        upstream="api.discogs.test", endpoint="/database/search", status="429"
+    )
+
+    await client.get("https://api.discogs.test/database/search")
+    with pytest.raises(httpx.ConnectTimeout):
+        await client.get("https://api.discogs.test/releases/42")
+
+    assert metrics.UPSTREAM_RESPONSES.value(
+        upstream="api.discogs.test", endpoint="/database/search", status="429"
+    ) == before + 1
+    assert metrics.UPSTREAM_RESPONSES.value(
+        upstream="api.discogs.test", endpoint="/releases/{id}", status="error"
+    ) >= 1
+    assert metrics.UPSTREAM_REQUEST_SECONDS.count(
+        upstream="api.discogs.test", endpoint="/database/search"
+    ) >= 1
+
+
+async def test_pocketbase_send_records_collection_and_status():
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/raise"):
+            raise httpx.ConnectError("refused")
+        return httpx.Response(404)
+
+    client = PocketBaseClient(
+        base_url="http://pocketbase.test",
+        admin_email="admin@test.invalid",
+        admin_password="admin-password",
+        transport=httpx.MockTransport(handler),
+    )
+    labels = {"collection": "metrics_probe", "method": "GET"}
+    before = metrics.POCKETBASE_REQUESTS.value(status="404", **labels)
+
+    await client._send("GET", "/api/collections/metrics_probe/records")
+    with pytest.raises(PocketBaseUnavailableError):
+        await client._send("GET", "/api/collections/metrics_probe/raise")
+
+    assert metrics.POCKETBASE_REQUESTS.value(status="404", **labels) == before + 1
+    assert metrics.POCKETBASE_REQUESTS.value(status="error", **labels) >= 1
+
+
+async def test_pool_gauges_count_in_flight_requests():
+    release = asyncio.Event()
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await release.wait()
+        return httpx.Response(200, text="ok")
+
+    transport = metrics.CountingTransport(httpx.MockTransport(handler), httpx.Limits(max_connections=1))
+    client = httpx.AsyncClient(transport=transport)
+    requests = [asyncio.create_task(client.get("http://probe.test/")) for _ in range(3)]
+    await asyncio.sleep(0)
+
+    metrics.observe_pool("probe", transport)
+    assert metrics.POOL_IN_FLIGHT_REQUESTS.value(client="probe") == 3
+    assert metrics.POOL_QUEUED_REQUESTS.value(client="probe") == 2
+    assert metrics.POOL_MAX_CONNECTIONS.value(client="probe") == 1
+
+    release.set()
+    await asyncio.gather(*requests)
+    metrics.observe_pool("probe", transport)
+    assert metrics.POOL_IN_FLIGHT_REQUESTS.value(client="probe") == 0
+
+
+async def test_streamed_response_holds_its_connection_until_closed():
+    transport = metrics.CountingTransport(httpx.MockTransport(lambda request: httpx.Response(200, text="ok")))
+    client = httpx.AsyncClient(transport=transport)
+
+    async with client.stream("GET", "http://probe.test/") as response:
+        assert transport.in_flight == 1
+        await response.aread()
+    assert transport.in_flight == 0
+
+
+def test_pocketbase_client_exposes_its_transport():
+    client = PocketBaseClient(
+        base_url="http://pocketbase.test", admin_email="admin@test.invalid", admin_password="admin-password"
+    )
+    assert client.transport.in_flight == 0
+    assert client.transport.max_connections == metrics.DEFAULT_POOL_LIMITS.max_connections
+
+
+def test_metrics_endpoint_serves_exposition_format(monkeypatch):
+    monkeypatch.setattr(main_module.settings, "METRICS_TOKEN", None)
+    monkeypatch.setattr(main_module.settings, "ENVIRONMENT", "development")
+
+    resp = TestClient(main_module.app).get("/metrics")
+
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "# TYPE deepcuts_upstream_request_duration_seconds histogram" in resp.text
+    assert 'deepcuts_cache_entries{cache="user_token"}' in resp.text
+
+
+def test_metrics_endpoint_is_closed_outside_development_without_token(monkeypatch):
+    monkeypatch.setattr(main_module.settings, "METRICS_TOKEN", None)
+    monkeypatch.setattr(main_module.settings, "ENVIRONMENT", "production")
+
+    assert TestClient(main_module.app).get("/metrics").status_code == 403
+
+
+def test_metrics_endpoint_requires_token_when_configured(monkeypatch):
+    monkeypatch.setattr(main_module.settings, "METRICS_TOKEN", "scrape-secret")
+    client = TestClient(main_module.app)
+
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"}).status_code == 200
+
+
+async def test_verification_outcomes_are_counted(monkeypatch):
+    for name in ("SPOTIFY_CLIENT_ID", "SPOTIFY_CLIENT_SECRET", "DISCOGS_KEY", "DISCOGS_SECRET"):
+        monkeypatch.delenv(name, raising=False)
+    before = metrics.ALBUM_VERIFICATIONS.value(result="assumed_real")
+
+    assert await main_module.verify_album_exists("Loveless", "My Bloody Valentine") is True
+
+    assert metrics.ALBUM_VERIFICATIONS.value(result="assumed_real") == before + 1
@@ -1,17 +1,34 @@
+import asyncio
+import base64
 import json
+import re
+import time
+from contextlib import aclosing
 
 import httpx
 import pytest
 
 from app.clients.pocketbase import (
+    InvalidCursorError,
     PocketBaseAuthError,
     PocketBaseClient,
     PocketBaseError,
     PocketBaseUnavailableError,
+    decode_cursor,
+    derive_record_id,
+    encode_cursor,
     escape_filter_value,
+    token_expiry,
 )
 
 
+def make_jwt(**claims) -> str:
+    def segment(data: dict) -> str:
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).rstrip(b"=").decode()
+
+    return f"{segment({'alg': 'HS256', 'typ': 'JWT'})}.{segment(claims)}.signature"
+
+
 def make_client(handler) -> PocketBaseClient:
     transport = httpx.MockTransport(handler)
     return PocketBaseClient(
@@ -42,6 +59,12 @@ class TestVerifyUserToken:
         record = await client.verify_user_token("bad-token")
         assert record is None
 
+    @pytest.mark.parametrize("status", [429, 500, 503])
+    async def test_non_auth_failure_raises_unavailable_error(self, status):
+        client = make_client(lambda request: httpx.Response(status))
+        with pytest.raises(PocketBaseUnavailableError):
+            await client.verify_user_token("user-token")
+
     async def test_timeout_raises_unavailable_error(self):
         def handler(request: httpx.Request) -> httpx.Response:
             raise httpx.TimeoutException("timed out", request=request)
@@ -114,6 +137,67 @@ class TestAdminAuthentication:
         assert auth_calls == 2
         assert data_calls == 2
 
+    async def test_concurrent_401s_share_one_reauthentication(self):
+        auth_calls = 0
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            nonlocal auth_calls
+            if request.url.path == "/api/collections/_superusers/auth-with-password":
+                auth_calls += 1
+                await asyncio.sleep(0.01)
+                return httpx.Response(200, json={"token": f"admin-token-{auth_calls}"})
+            if request.headers["authorization"] == "admin-token-1":
+                return httpx.Response(401, json={"message": "token expired"})
+            return httpx.Response(200, json={"items": []})
+
+        client = make_client(handler)
+        # Cold start: one auth for the initial token, then every request is
+        # rejected with it and they share one reauthentication.
+        await asyncio.gather(*(client.list_records("albums") for _ in range(10)))
+        assert auth_calls == 2
+
+    async def test_refreshes_in_background_shortly_before_expiry(self):
+        tokens = [make_jwt(exp=time.time() + 10), make_jwt(exp=time.time() + 3600)]
+        auth_calls = 0
+        seen = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            nonlocal auth_calls
+            if request.url.path == "/api/collections/_superusers/auth-with-password":
+                auth_calls += 1
+                return httpx.Response(200, json={"token": tokens[auth_calls - 1]})
+            seen.append(request.headers["authorization"])
+            return httpx.Response(200, json={"items": []})
+
+        client = make_client(handler)
+        await client.list_records("albums")
+        await client.list_records("albums")
+        await client._admin_refresh_task
+        await client.list_records("albums")
+
+        assert auth_calls == 2
+        assert seen == [tokens[0], tokens[0], tokens[1]]
+
+    async def test_expired_token_is_refreshed_before_the_request(self):
+        tokens = [make_jwt(exp=time.time() - 1), make_jwt(exp=time.time() + 3600)]
+        auth_calls = 0
+        seen = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            nonlocal auth_calls
+            if request.url.path == "/api/collections/_superusers/auth-with-password":
+                auth_calls += 1
+                return httpx.Response(200, json={"token": tokens[auth_calls - 1]})
+            seen.append(request.headers["authorization"])
+            return httpx.Response(200, json={"items": []})
+
+        client = make_client(handler)
+        await client._authenticate_admin()
+        await client.list_records("albums")
+
+        assert auth_calls == 2
+        assert seen == [tokens[1]]
+
     async def test_raises_auth_error_when_reauthentication_fails(self):
         def handler(request: httpx.Request) -> httpx.Response:
             if request.url.path == "/api/collections/_superusers/auth-with-password":
@@ -165,6 +249,277 @@ class TestListAllRecords:
         assert request_count["list"] == 1
 
 
+class TestDeriveRecordId:
+    def test_is_stable_and_matches_pocketbase_id_format(self):
+        record_id = derive_record_id("albums", "blue|joni mitchell")
+
+        assert record_id == derive_record_id("albums", "blue|joni mitchell")
+        assert len(record_id) == 15
+        assert record_id.isalnum() and record_id == record_id.lower()
+
+    def test_parts_are_not_simply_concatenated(self):
+        assert derive_record_id("ab", "c") != derive_record_id("a", "bc")
+
+
+class TestTokenExpiry:
+    def test_reads_exp_claim(self):
+        assert token_expiry(make_jwt(exp=1700000000)) == 1700000000.0
+
+    @pytest.mark.parametrize("token", ["opaque-token", make_jwt(sub="u1"), "a.!!!.c"])
+    def test_returns_none_without_usable_exp(self, token):
+        assert token_expiry(token) is None
+
+
+class TestIterRecords:
+    async def test_fetches_remaining_pages_concurrently_in_order(self):
+        in_flight = {"now": 0, "max": 0}
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.path == "/api/collections/_superusers/auth-with-password":
+                return httpx.Response(200, json={"token": "admin-token"})
+            page = int(request.url.params["page"])
+            in_flight["now"] += 1
+            in_flight["max"] = max(in_flight["max"], in_flight["now"])
+            # Later pages answer first, so ordering has to come from the client.
+            await asyncio.sleep(0.01 * (6 - page))
+            in_flight["now"] -= 1
+            return httpx.Response(200, json={"items": [{"id": f"p{page}"}], "totalPages": 5})
+
+        client = make_client(handler)
+        ids = [r["id"] async for r in client.iter_records("albums", concurrency=2)]
+
+        assert ids == ["p1", "p2", "p3", "p4", "p5"]
+        assert in_flight["max"] == 2
+
+    async def test_stopping_early_cancels_pending_pages(self):
+        requested = []
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.path == "/api/collections/_superusers/auth-with-password":
+                return httpx.Response(200, json={"token": "admin-token"})
+            page = int(request.url.params["page"])
+            requested.append(page)
+            return httpx.Response(200, json={"items": [{"id": f"p{page}"}], "totalPages": 50})
+
+        client = make_client(handler)
+        async with aclosing(client.iter_records("albums", concurrency=3)) as records:
+            async for record in records:
+                if record["id"] == "p2":
+                    break
+
+        assert max(requested) <= 5
+
+    async def test_ignores_skip_total(self):
+        def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.path == "/api/collections/_superusers/auth-with-password":
+                return httpx.Response(200, json={"token": "admin-token"})
+            assert "skipTotal" not in request.url.params
+            page = int(request.url.params["page"])
+            return httpx.Response(200, json={"items": [{"id": f"p{page}"}], "totalPages": 3})
+
+        client = make_client(handler)
+        ids = [r["id"] async for r in client.iter_records("albums", skipTotal=1)]
+
+        assert ids == ["p1", "p2", "p3"]
+
+    async def test_raises_on_failed_page(self):
+        def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.path == "/api/collections/_superusers/auth-with-password":
+                return httpx.Response(200, json={"token": "admin-token"})
+            if request.url.params["page"] == "2":
+                return httpx.Response(500, text="boom")
+            return httpx.Response(200, json={"items": [{"id": "p1"}], "totalPages": 3})
+
+        client = make_client(handler)
+        with pytest.raises(PocketBaseError):
+            [r async for r in client.iter_records("albums")]
+
+
+def id_ordered_store(ids, requests):
+    """Answer list requests over ``ids`` the way PocketBase does for
+    sample_records' ``id >= "x"`` / ``id < "x"`` seeks in id order."""
+    ids = sorted(ids)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/api/collections/_superusers/auth-with-password":
+            return httpx.Response(200, json={"token": "admin-token"})
+        params = request.url.params
+        requests.append(dict(params))
+        assert params["sort"] == "id" and params["skipTotal"] == "1" and "page" not in params
+        op, start = re.fullmatch(r'id (>=|<) "(\w+)"', params["filter"]).groups()
+        matching = [i for i in ids if (i >= start if op == ">=" else i < start)]
+        return httpx.Response(200, json={"items": [{"id": i} for i in matching[:int(params["perPage"])]]})
+    return handler
+
+
+class TestSampleRecords:
+    async def test_reads_a_few_runs_from_random_ids(self):
+        requests = []
+        client = make_client(id_ordered_store([f"{n:03d}" for n in range(1000)], requests))
+
+        sample = await client.sample_records("albums", 50)
+
+        assert 4 <= len(requests) <= 8
+        assert sum(int(r["perPage"]) for r in requests if r["filter"].startswith("id >=")) == 50
+        assert len({r["id"] for r in sample}) == len(sample) > 0
+
+    async def test_wraps_around_past_the_highest_id(self, monkeypatch):
+        monkeypatch.setattr("app.clients.pocketbase.random.choices", lambda alphabet, k: ["z"] * k)
+        requests = []
+        client = make_client(id_ordered_store(["a1", "b2", "c3"], requests))
+
+        sample = await client.sample_records("albums", 1)
+
+        assert sample == [{"id": "a1"}]
+        assert [r["filter"] for r in requests] == ['id >= "zzzzzzzzzzzzzzz"', 'id < "zzzzzzzzzzzzzzz"']
+
+    async def test_small_collection_returns_everything_once(self):
+        client = make_client(id_ordered_store(["album-1", "album-2"], []))
+
+        sample = await client.sample_records("albums", 10)
+
+        assert sorted(r["id"] for r in sample) == ["album-1", "album-2"]
+
+    async def test_empty_collection(self):
+        client = make_client(id_ordered_store([], []))
+        assert await client.sample_records("albums", 10) == []
+
+
+class TestCreateRecords:
+    async def test_sends_one_batch_request_per_chunk(self):
+        batches = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.path == "/api/collections/_superusers/auth-with-password":
+                return httpx.Response(200, json={"token": "admin-token"})
+            assert request.url.path == "/api/batch"
+            body = json.loads(request.content)
+            batches.append(body["requests"])
+            return httpx.Response(200, json=[
+                {"status": 200, "body": {"id": f"r{len(batches)}-{i}"}} for i in range(len(body["requests"]))
+            ])
+
+        client = make_client(handler)
+        created = await client.create_records("search_clicks", [{"action": "click"}] * 3, chunk_size=2)
+
+        assert [len(b) for b in batches] == [2, 1]
+        assert batches[0][0] == {
+            "method": "POST",
+            "url": "/api/collections/search_clicks/records",
+            "body": {"action": "click"},
+        }
+        assert [r["id"] for r in created] == ["r1-0", "r1-1", "r2-0"]
+
+    async def test_raises_when_batch_rejected(self):
+        def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.path == "/api/collections/_superusers/auth-with-password":
+                return httpx.Response(200, json={"token": "admin-token"})
+            return httpx.Response(400, json={"message": "batch failed"})
+
+        client = make_client(handler)
+        with pytest.raises(PocketBaseError):
+            await client.create_records("search_clicks", [{"action": "click"}])
+
+
+class TestPrefetchRelated:
+    async def test_groups_children_by_parent_with_one_query_per_chunk(self):
+        filters = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.path == "/api/collections/_superusers/auth-with-password":
+                return httpx.Response(200, json={"token": "admin-token"})
+            assert request.url.path == "/api/collections/search_outputs/records"
+            filters.append(request.url.params["filter"])
+            items = [
+                {"id": f"o-{sid}", "session": sid}
+                for sid in ("s1", "s2", "s3")
+                if f'session = "{sid}"' in request.url.params["filter"] and sid != "s2"
+            ]
+            return httpx.Response(200, json={"items": items, "totalPages": 1})
+
+        client = make_client(handler)
+        parents = [{"id": "s1"}, {"id": "s2"}, {"id": "s3"}]
+        grouped = await client.prefetch_related(parents, "search_outputs", "session", chunk_size=2)
+
+        assert sorted(filters) == ['session = "s1" || session = "s2"', 'session = "s3"']
+        assert grouped == {"s1": [{"id": "o-s1", "session": "s1"}], "s2": [], "s3": [{"id": "o-s3", "session": "s3"}]}
+
+    async def test_no_parents_makes_no_requests(self):
+        def handler(request: httpx.Request) -> httpx.Response:
+            raise AssertionError(f"should not make requests: {request.method} {request.url.path}")
+
+        client = make_client(handler)
+        assert await client.prefetch_related([], "search_outputs", "session") == {}
+
+
+class TestListPage:
+    async def test_requests_one_extra_record_and_skips_total(self):
+        seen = {}
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.path == "/api/collections/_superusers/auth-with-password":
+                return httpx.Response(200, json={"token": "admin-token"})
+            seen.update(request.url.params)
+            return httpx.Response(200, json={"items": [
+                {"id": "a3", "created": "2026-01-03"},
+                {"id": "a2", "created": "2026-01-02"},
+                {"id": "a1", "created": "2026-01-01"},
+            ]})
+
+        client = make_client(handler)
+        page = await client.list_page("albums", limit=2, filter='genre = "dub"')
+
+        assert seen["perPage"] == "3"
+        assert seen["skipTotal"] == "1"
+        assert seen["sort"] == "-created,-id"
+        assert seen["filter"] == '(genre = "dub")'
+        assert [r["id"] for r in page.items] == ["a3", "a2"]
+        assert decode_cursor(page.next_cursor) == ("2026-01-02", "a2")
+
+    async def test_last_page_has_no_cursor(self):
+        def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.path == "/api/collections/_superusers/auth-with-password":
+                return httpx.Response(200, json={"token": "admin-token"})
+            return httpx.Response(200, json={"items": [{"id": "a1", "created": "2026-01-01"}]})
+
+        client = make_client(handler)
+        page = await client.list_page("albums", limit=2)
+
+        assert page.next_cursor is None
+
+    async def test_rejects_limit_below_one(self):
+        client = make_client(lambda request: httpx.Response(500))
+        with pytest.raises(ValueError):
+            await client.list_page("albums", limit=0)
+
+    async def test_limit_is_clamped_to_pocketbase_per_page_cap(self):
+        seen = {}
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.path == "/api/collections/_superusers/auth-with-password":
+                return httpx.Response(200, json={"token": "admin-token"})
+            seen.update(request.url.params)
+            per_page = int(request.url.params["perPage"])
+            return httpx.Response(200, json={"items": [
+                {"id": f"a{i}", "created": "2026-01-01"} for i in range(min(per_page, 1000))
+            ]})
+
+        client = make_client(handler)
+        page = await client.list_page("albums", limit=2000)
+
+        assert seen["perPage"] == "1000"
+        assert len(page.items) == 999
+        assert page.next_cursor is not None
+
+    async def test_cursor_round_trips(self):
+        cursor = encode_cursor({"id": "a2", "created": "2026-01-02 10:00:00.000Z"})
+        assert decode_cursor(cursor) == ("2026-01-02 10:00:00.000Z", "a2")
+
+    async def test_malformed_cursor_raises(self):
+        with pytest.raises(InvalidCursorError):
+            decode_cursor("not-a-cursor")
+
+
 class TestEscapeFilterValue:
     def test_wraps_plain_value_in_quotes(self):
         assert escape_filter_value("OK Computer") == '"OK Computer"'
@@ -0,0 +1,116 @@
+import time
+from pathlib import Path
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from app import main as main_module
+from app import profiling
+
+
+@pytest.fixture(autouse=True)
+def fast_sampler(monkeypatch, tmp_path):
+    monkeypatch.setattr(profiling.sampler, "interval", 0.001)
+    monkeypatch.setattr(profiling.settings, "PROFILE_DIR", str(tmp_path))
+
+
+def _busy(seconds: float) -> None:
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def test_slow_block_is_sampled_as_collapsed_stacks():
+    with profiling.profile_if_slow(0) as profile:
+        _busy(0.05)
+
+    assert profile.samples > 0
+    assert any(stack.endswith("test_profiling:_busy") for stack in profile.stacks)
+    first = profile.collapsed().splitlines()[0]
+    stack, count = first.rsplit(" ", 1)
+    assert ";" in stack and int(count) > 0
+
+
+def test_fast_block_is_not_sampled():
+    with profiling.profile_if_slow(60_000) as profile:
+        _busy(0.01)
+
+    assert profile.samples == 0
+
+
+def test_saved_file_is_tagged_with_route_and_session(tmp_path):
+    profile = profiling.Profile(thread_id=None, sample_from=0)
+    profile.stacks["a;b"] = 3
+
+    path = Path(profiling.save(profile, "POST /api/v1/search", "sess123"))
+
+    assert path.parent == tmp_path
+    assert "_POST-api-v1-search_sess123_" in path.name
+    assert path.suffix == ".folded"
+    assert path.read_text() == "a;b 3\n"
+
+
+def test_slow_requests_write_a_profile(monkeypatch, tmp_path):
+    class SlowRegistry:
+        def render(self) -> str:
+            _busy(0.05)
+            return ""
+
+    monkeypatch.setattr(main_module.settings, "PROFILE_SLOW_MS", 0)
+    monkeypatch.setattr(main_module.settings, "METRICS_TOKEN", None)
+    monkeypatch.setattr(main_module, "REGISTRY", SlowRegistry())
+
+    assert TestClient(main_module.app).get("/metrics").status_code == 200
+
+    [path] = tmp_path.iterdir()
+    assert "_GET-metrics_" in path.name
+    assert "SlowRegistry.render;" in path.read_text()
+
+
+def test_streamed_body_is_profiled(monkeypatch, tmp_path):
+    async def body():
+        yield "first\n"
+        _busy(0.05)
+        yield "second\n"
+
+    app = FastAPI()
+    app.add_middleware(profiling.ProfileMiddleware)
+
+    @app.get("/sessions/{session_id}/export")
+    async def export(session_id: str):
+        return StreamingResponse(body())
+
+    monkeypatch.setattr(profiling.settings, "PROFILE_SLOW_MS", 0)
+
+    assert TestClient(app).get("/sessions/s42/export").text == "first\nsecond\n"
+
+    [path] = tmp_path.iterdir()
+    assert "_GET-sessions-session-id-export_s42_" in path.name
+    assert "body;tests.test_profiling:_busy" in path.read_text()
+
+
+def test_profiling_endpoints_are_admin_only(monkeypatch):
+    client = TestClient(main_module.app)
+    monkeypatch.setattr(main_module.settings, "ADMIN_TOKEN", None)
+    assert client.post("/api/v1/admin/profiling/start").status_code == 403
+
+    monkeypatch.setattr(main_module.settings, "ADMIN_TOKEN", "admin-secret")
+    wrong = {"Authorization": "Bearer wrong"}
+    assert client.post("/api/v1/admin/profiling/start", headers=wrong).status_code == 401
+
+
+def test_on_demand_profiling_starts_and_stops(monkeypatch):
+    monkeypatch.setattr(main_module.settings, "ADMIN_TOKEN", "admin-secret")
+    client = TestClient(main_module.app, headers={"Authorization": "Bearer admin-secret"})
+
+    assert client.post("/api/v1/admin/profiling/start").status_code == 200
+    assert client.post("/api/v1/admin/profiling/start").status_code == 409
+    time.sleep(0.02)
+    resp = client.post("/api/v1/admin/profiling/stop")
+
+    assert resp.status_code == 200
+    assert Path(resp.headers["X-Profile-Path"]).read_text() == resp.text
+    assert "MainThread;" in resp.text
+    assert client.post("/api/v1/admin/profiling/stop").status_code == 409
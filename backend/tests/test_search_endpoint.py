@@ -1,5 +1,7 @@
+from types import SimpleNamespace
 from unittest.mock import AsyncMock
 
+import httpx
 import pytest
 from fastapi.testclient import TestClient
 
@@ -73,3 +75,104 @@ def test_search_with_exclude_drops_excluded_albums(client):
     assert resp.status_code == 200
     titles = [a["title"] for a in resp.json()["recommendations"]]
     assert "Album 0" not in titles
+
+
+async def test_verify_album_exists_uses_shared_upstream_client(monkeypatch):
+    from app.clients import upstream
+
+    seen = []
+
+    def handler(request):
+        seen.append(f"{request.url.host}{request.url.path}")
+        if request.url.path == "/api/token":
+            return httpx.Response(200, json={"access_token": "tok"})
+        return httpx.Response(200, json={"albums": {"items": [{
+            "name": "Loveless",
+            "album_type": "album",
+            "artists": [{"name": "My Bloody Valentine"}],
+        }]}})
+
+    monkeypatch.setenv("SPOTIFY_CLIENT_ID", "id")
+    monkeypatch.setenv("SPOTIFY_CLIENT_SECRET", "secret")
+    monkeypatch.setattr(main_module.settings, "SPOTIFY_ACCOUNTS_URL", "http://simulator.test")
+    monkeypatch.setattr(
+        upstream, "_shared_client", upstream.create_upstream_client(httpx.MockTransport(handler))
+    )
+
+    assert await main_module.verify_album_exists("Loveless", "My Bloody Valentine") is True
+    assert seen == ["simulator.test/api/token", "api.spotify.com/v1/search"]
+
+
+def test_search_reports_stage_timings(client, monkeypatch):
+    create_session = AsyncMock(return_value="session-1")
+    monkeypatch.setattr(main_module.search_session_service, "create_session", create_session)
+
+    resp = client.post("/api/v1/search", json={"query": "city pop"})
+
+    assert resp.status_code == 200
+    stages = [metric.split(";")[0] for metric in resp.headers["Server-Timing"].split(", ")]
+    assert stages == ["verify", "persist", "total"]
+    assert "timings" not in resp.json()
+    # Persistence is still running when the session row is written.
+    assert set(create_session.call_args.kwargs["timings"]) == {"verify"}
+
+
+def test_search_returns_timings_in_body_with_debug(client, monkeypatch):
+    monkeypatch.setattr(
+        main_module.search_session_service, "create_session", AsyncMock(return_value="session-1")
+    )
+
+    resp = client.post("/api/v1/search?debug=true", json={"query": "city pop"})
+
+    assert resp.status_code == 200
+    assert set(resp.json()["timings"]) == {"verify", "persist", "total"}
+
+
+def test_failed_search_still_sends_server_timing(client, monkeypatch):
+    monkeypatch.setattr(
+        main_module.ai_service,
+        "get_album_recommendations",
+        AsyncMock(return_value=RecommendationResult(albums=[], raw_response="")),
+    )
+    monkeypatch.setattr(
+        main_module.ai_service, "verify_model_exists", AsyncMock(return_value={"valid": True})
+    )
+
+    resp = client.post("/api/v1/search", json={"query": "city pop"})
+
+    assert resp.status_code == 503
+    assert resp.headers["Server-Timing"].startswith("total;dur=")
+
+
+async def test_ai_call_records_prompt_ttft_and_parse_stages(monkeypatch):
+    from app import metrics, timing
+    from app.services.ai import ai_service
+
+    class FakeStream:
+        text_stream = iter(["<recommendations>", "</recommendations>"])
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def get_final_message(self):
+            return SimpleNamespace(
+                content=[SimpleNamespace(type="text", text="<recommendations></recommendations>")],
+                usage=SimpleNamespace(input_tokens=1800, output_tokens=40),
+            )
+
+    fake_client = type("FakeClaude", (), {})()
+    fake_client.messages = type("FakeMessages", (), {"stream": lambda self, **kwargs: FakeStream()})()
+    monkeypatch.setattr(ai_service, "ACTIVE_MODEL", "claude-sonnet-4-6")
+    monkeypatch.setattr(ai_service, "claude_client", fake_client, raising=False)
+
+    with timing.stage_timing() as timer:
+        result = await ai_service.get_album_recommendations("Loveless")
+
+    assert result.raw_response == "<recommendations></recommendations>"
+    assert list(timer.stages) == ["prompt", "ai_ttft", "ai", "parse"]
+    assert timer.stages["ai_ttft"].duration_ms <= timer.stages["ai"].duration_ms
+    assert metrics.AI_RESPONSES.value(provider="anthropic", model="claude-sonnet-4-6", status="200") == 1
+    assert metrics.AI_TOKENS.value(provider="anthropic", model="claude-sonnet-4-6", direction="input") == 1800
@@ -4,7 +4,8 @@ import httpx
 
 from app.clients.pocketbase import PocketBaseClient
 from app.models.albums import AlbumData
-from app.services.search_sessions import SearchSessionService
+from app.models.analytics import AnalyticsEvent
+from app.services.search_sessions import SearchSessionService, encode_raw_response
 
 
 def make_service(handler) -> SearchSessionService:
@@ -93,17 +94,135 @@ class TestCreateSession:
         assert session_id is None
 
 
-class TestTrackFavorite:
-    async def test_records_favorite_action(self):
-        recorded = {}
+class TestRawResponses:
+    def session_handler(self, sessions, batches, rejection=None):
+        def handler(request: httpx.Request) -> httpx.Response:
+            path = request.url.path
+            if path == "/api/batch":
+                requests = json.loads(request.content)["requests"]
+                batches.append(requests)
+                if rejection:
+                    return httpx.Response(400, json={"data": {"requests": {"0": {"response": {"data": rejection}}}}})
+                return httpx.Response(200, json=[
+                    {"status": 200, "body": {"id": "raw-1"}}, {"status": 200, "body": {"id": "session-1"}},
+                ])
+            if path == "/api/collections/search_inputs/records" and request.method == "POST":
+                sessions.append(json.loads(request.content))
+                return httpx.Response(201, json={"id": "session-1"})
+            if path == "/api/collections/search_outputs/records":
+                return httpx.Response(201, json={"id": "output-1"})
+            raise AssertionError(f"unexpected request: {request.method} {path}")
+        return handler
+
+    async def test_stores_compressed_transcript_out_of_row(self):
+        sessions, batches = [], []
+        service = make_service(admin_auth_or(self.session_handler(sessions, batches)))
+        transcript = "Here are some albums... " * 500
+
+        session_id = await service.create_session(
+            query="radiohead", albums=[make_album("OK Computer", "Radiohead")], raw_response=transcript
+        )
+
+        [[stored, session]] = batches
+        assert session_id == "session-1"
+        assert sessions == []
+        assert stored["method"] == "POST"
+        assert stored["url"] == "/api/collections/raw_responses/records"
+        assert len(stored["body"]["data"]) < len(transcript) // 10
+        assert session["url"] == "/api/collections/search_inputs/records"
+        assert "raw_response" not in session["body"]
+        assert session["body"]["raw_response_ref"] == stored["body"]["id"]
+
+    async def test_transcript_already_stored_is_referenced(self):
+        sessions, batches = [], []
+        rejection = {"id": {"code": "validation_pk_not_unique"}}
+        service = make_service(admin_auth_or(self.session_handler(sessions, batches, rejection)))
+
+        session_id = await service.create_session(
+            query="radiohead", albums=[make_album("OK Computer", "Radiohead")], raw_response="transcript"
+        )
+
+        assert session_id == "session-1"
+        assert len(batches) == 1
+        assert sessions[0]["raw_response_ref"] == encode_raw_response("transcript")["id"]
+
+    async def test_session_is_saved_when_the_transcript_is_rejected(self):
+        sessions, batches = [], []
+        rejection = {"data": {"code": "validation_file_size_limit"}}
+        service = make_service(admin_auth_or(self.session_handler(sessions, batches, rejection)))
+
+        session_id = await service.create_session(
+            query="radiohead", albums=[make_album("OK Computer", "Radiohead")], raw_response="transcript"
+        )
+
+        assert session_id == "session-1"
+        assert sessions[0]["raw_response_ref"] is None
+
+    async def test_identical_transcripts_share_one_record(self):
+        assert encode_raw_response("same text")["id"] == encode_raw_response("same text")["id"]
+        assert encode_raw_response("same text")["id"] != encode_raw_response("other text")["id"]
+
+    async def test_unsampled_search_stores_no_transcript(self, monkeypatch):
+        monkeypatch.setattr("app.services.search_sessions.settings.RAW_RESPONSE_SAMPLE_RATE", 0.0)
+        sessions, batches = [], []
+        service = make_service(admin_auth_or(self.session_handler(sessions, batches)))
+
+        await service.create_session(
+            query="radiohead", albums=[make_album("OK Computer", "Radiohead")], raw_response="transcript"
+        )
+
+        assert batches == []
+        assert sessions[0]["raw_response_ref"] is None
+
+    async def test_loads_and_decompresses_transcript(self):
+        stored = encode_raw_response("the full transcript")
 
         def handler(request: httpx.Request) -> httpx.Response:
-            if request.url.path == "/api/collections/search_clicks/records":
-                recorded.update(json.loads(request.content))
-                return httpx.Response(201, json={"id": "click-1"})
-            raise AssertionError(f"unexpected request: {request.method} {request.url.path}")
+            path = request.url.path
+            if path == "/api/collections/search_inputs/records/session-1":
+                return httpx.Response(200, json={
+                    "id": "session-1", "user_email": "owner@deepcuts.casa",
+                    "raw_response_ref": stored["id"], "raw_response": "",
+                })
+            if path == f"/api/collections/raw_responses/records/{stored['id']}":
+                return httpx.Response(200, json=stored)
+            raise AssertionError(f"unexpected request: {request.method} {path}")
+
+        service = make_service(admin_auth_or(handler))
+        result = await service.get_raw_response("session-1")
+
+        assert result == {
+            "session_id": "session-1", "user_email": "owner@deepcuts.casa", "raw_response": "the full transcript",
+        }
+
+    async def test_falls_back_to_legacy_inline_transcript(self):
+        def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(200, json={
+                "id": "session-1", "user_email": "owner@deepcuts.casa",
+                "raw_response_ref": "", "raw_response": "legacy transcript",
+            })
 
         service = make_service(admin_auth_or(handler))
+        result = await service.get_raw_response("session-1")
+
+        assert result["raw_response"] == "legacy transcript"
+
+
+def batch_recorder(batches):
+    """Handler that answers /api/batch and records each batch's requests."""
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/api/batch":
+            requests = json.loads(request.content)["requests"]
+            batches.append(requests)
+            return httpx.Response(200, json=[{"status": 200, "body": {}} for _ in requests])
+        raise AssertionError(f"unexpected request: {request.method} {request.url.path}")
+    return handler
+
+
+class TestTrackFavorite:
+    async def test_records_favorite_action_and_bumps_rollup(self):
+        batches = []
+        service = make_service(admin_auth_or(batch_recorder(batches)))
         await service.track_favorite(
             session_id="session-1",
             album_title="OK Computer",
@@ -112,89 +231,248 @@ class TestTrackFavorite:
             user_email="listener@deepcuts.casa",
         )
 
-        assert recorded["action"] == "favorite"
-        assert recorded["user_email"] == "listener@deepcuts.casa"
+        click, rollup = batches[0]
+        assert click["url"] == "/api/collections/search_clicks/records"
+        assert click["body"]["action"] == "favorite"
+        assert click["body"]["user_email"] == "listener@deepcuts.casa"
+        assert rollup["method"] == "PATCH"
+        assert rollup["url"] == "/api/collections/search_inputs/records/session-1"
+        assert rollup["body"]["total_favorites+"] == 1
+        assert "last_interaction_at" in rollup["body"]
 
     async def test_records_unfavorite_action(self):
-        recorded = {}
+        batches = []
+        service = make_service(admin_auth_or(batch_recorder(batches)))
+        await service.track_favorite(
+            session_id="session-1", album_title="OK Computer", album_artist="Radiohead", favorited=False
+        )
+
+        click, rollup = batches[0]
+        assert click["body"]["action"] == "unfavorite"
+        assert "total_favorites+" not in rollup["body"]
+
+    async def test_does_nothing_without_session_id(self):
+        def handler(request: httpx.Request) -> httpx.Response:
+            raise AssertionError(f"should not make requests: {request.method} {request.url.path}")
+
+        service = make_service(handler)
+        await service.track_favorite(session_id=None, album_title="X", album_artist="Y", favorited=True)
+
+
+class TestTrackClick:
+    async def test_records_click_and_bumps_rollup_in_one_batch(self):
+        batches = []
+        service = make_service(admin_auth_or(batch_recorder(batches)))
+        await service.track_click(session_id="session-1", album_title="OK Computer", album_artist="Radiohead")
+
+        assert len(batches) == 1
+        click, rollup = batches[0]
+        assert click["body"]["action"] == "click"
+        assert rollup["body"]["total_clicks+"] == 1
+
+    async def test_click_without_session_skips_rollup(self):
+        created = []
 
         def handler(request: httpx.Request) -> httpx.Response:
             if request.url.path == "/api/collections/search_clicks/records":
-                recorded.update(json.loads(request.content))
+                created.append(json.loads(request.content))
                 return httpx.Response(201, json={"id": "click-1"})
             raise AssertionError(f"unexpected request: {request.method} {request.url.path}")
 
         service = make_service(admin_auth_or(handler))
-        await service.track_favorite(
-            session_id="session-1", album_title="OK Computer", album_artist="Radiohead", favorited=False
+        await service.track_click(session_id=None, album_title="OK Computer", album_artist="Radiohead")
+
+        assert created[0]["session"] is None
+
+
+class TestTrackFilteredAlbums:
+    async def test_writes_filtered_albums_without_touching_the_session(self):
+        batches = []
+        service = make_service(admin_auth_or(batch_recorder(batches)))
+        await service.track_filtered_albums("session-1", [
+            {"title": "Fake LP", "artist": "Nobody", "reason": "not_found"},
+            {"title": "", "artist": "Skipped"},
+            {"title": "Also Fake", "artist": "No One"},
+        ])
+
+        [requests] = batches
+        assert [r["url"] for r in requests] == ["/api/collections/filtered_albums/records"] * 2
+
+
+class TestTrackEvents:
+    async def test_writes_all_events_in_one_batch(self):
+        raw_batches = []
+        service = make_service(admin_auth_or(batch_recorder(raw_batches)))
+        result = await service.track_events(
+            [
+                AnalyticsEvent(type="click", session_id="session-1", title="OK Computer", artist="Radiohead"),
+                AnalyticsEvent(type="dwell", session_id="session-1", title="OK Computer", artist="Radiohead", dwell_ms=4200),
+                AnalyticsEvent(type="favorite", session_id="session-1", title="Kid A", artist="Radiohead"),
+            ],
+            user_email="listener@deepcuts.casa",
         )
 
-        assert recorded["action"] == "unfavorite"
+        assert result.success is True
+        assert result.recorded == 3
+        assert len(raw_batches) == 1
+        *clicks, rollup = [r["body"] for r in raw_batches[0]]
+        assert [r["action"] for r in clicks] == ["click", "dwell", "favorite"]
+        assert clicks[1]["dwell_ms"] == 4200
+        assert all(r["user_email"] == "listener@deepcuts.casa" for r in clicks)
+        assert rollup["total_clicks+"] == 1
+        assert rollup["total_favorites+"] == 1
+
+    async def test_keeps_each_sessions_rollup_in_the_batch_of_its_events(self):
+        raw_batches = []
+        service = make_service(admin_auth_or(batch_recorder(raw_batches)))
+        events = [
+            *(AnalyticsEvent(type="click", session_id="s1", title=f"A{i}", artist="X") for i in range(30)),
+            *(AnalyticsEvent(type="click", session_id="s2", title=f"B{i}", artist="X") for i in range(30)),
+            *(AnalyticsEvent(type="click", session_id="s3", title=f"C{i}", artist="X") for i in range(60)),
+        ]
+
+        assert (await service.track_events(events)).recorded == 120
+
+        assert all(len(batch) <= 50 for batch in raw_batches)
+        bumped = {}
+        for batch in raw_batches:
+            clicks: dict[str, int] = {}
+            for r in batch:
+                if r["method"] == "POST":
+                    clicks[r["body"]["session"]] = clicks.get(r["body"]["session"], 0) + 1
+                else:
+                    session_id = r["url"].rsplit("/", 1)[1]
+                    assert r["body"]["total_clicks+"] == clicks.pop(session_id)
+                    bumped[session_id] = bumped.get(session_id, 0) + r["body"]["total_clicks+"]
+            assert clicks == {}
+        assert bumped == {"s1": 30, "s2": 30, "s3": 60}
+
+    async def test_reports_only_events_in_committed_batches(self):
+        batches = []
 
-    async def test_does_nothing_without_session_id(self):
+        def handler(request: httpx.Request) -> httpx.Response:
+            requests = json.loads(request.content)["requests"]
+            batches.append(requests)
+            if any(r["body"].get("session") == "missing" for r in requests):
+                return httpx.Response(400, json={"message": "session: invalid relation"})
+            return httpx.Response(200, json=[{"status": 200, "body": {}} for _ in requests])
+
+        service = make_service(admin_auth_or(handler))
+        events = [
+            *(AnalyticsEvent(type="click", session_id="s1", title=f"A{i}", artist="X") for i in range(40)),
+            *(AnalyticsEvent(type="click", session_id="missing", title=f"B{i}", artist="X") for i in range(20)),
+            *(AnalyticsEvent(type="click", session_id="s2", title=f"C{i}", artist="X") for i in range(40)),
+        ]
+
+        result = await service.track_events(events)
+
+        assert len(batches) == 3
+        assert result.success is False
+        assert result.recorded == 80
+
+    async def test_drops_favorites_without_session(self):
         def handler(request: httpx.Request) -> httpx.Response:
             raise AssertionError(f"should not make requests: {request.method} {request.url.path}")
 
         service = make_service(handler)
-        await service.track_favorite(session_id=None, album_title="X", album_artist="Y", favorited=True)
+        result = await service.track_events([AnalyticsEvent(type="favorite", title="X", artist="Y")])
+
+        assert result.success is True
+        assert result.recorded == 0
 
 
 class TestGetSessions:
-    async def test_excludes_sessions_with_no_clicks(self):
+    async def test_fetches_sessions_with_clicks_in_one_query(self):
+        list_calls = []
+
         def handler(request: httpx.Request) -> httpx.Response:
             path = request.url.path
             if path == "/api/collections/search_inputs/records":
+                list_calls.append(request.url.params)
                 return httpx.Response(200, json={
-                    "items": [
-                        {"id": "s1", "query": "a", "created": "2026-01-02", "results_count": 1},
-                        {"id": "s2", "query": "b", "created": "2026-01-01", "results_count": 1},
-                    ]
+                    "items": [{
+                        "id": "s1", "query": "a", "created": "2026-01-02", "results_count": 2,
+                        "expand": {
+                            "search_outputs_via_session": [{"id": "o2", "rank": 2}, {"id": "o1", "rank": 1}],
+                            "search_clicks_via_session": [{"id": "c1", "action": "click"}],
+                        },
+                    }]
                 })
-            if path == "/api/collections/search_clicks/records":
-                session_filter = request.url.params.get("filter", "")
-                if "s1" in session_filter:
-                    return httpx.Response(200, json={"items": [{"id": "c1", "action": "click"}]})
-                return httpx.Response(200, json={"items": []})
-            if path == "/api/collections/search_outputs/records":
-                return httpx.Response(200, json={"items": []})
             raise AssertionError(f"unexpected request: {request.method} {path}")
 
         service = make_service(admin_auth_or(handler))
-        sessions = await service.get_sessions(limit=50)
-
-        assert len(sessions) == 1
-        assert sessions[0]["id"] == "s1"
+        page = await service.get_sessions(user_email="owner@deepcuts.casa", limit=50)
+
+        assert len(list_calls) == 1
+        params = list_calls[0]
+        assert "search_clicks_via_session.id != ''" in params["filter"]
+        assert 'user_email = "owner@deepcuts.casa"' in params["filter"]
+        assert params["expand"] == "search_outputs_via_session,search_clicks_via_session"
+        assert params["perPage"] == "51"
+        assert [s["id"] for s in page.items] == ["s1"]
+        assert [o["id"] for o in page.items[0]["search_output"]] == ["o1", "o2"]
+        assert page.items[0]["search_session_clicks"] == [{"id": "c1", "action": "click"}]
+        assert page.next_cursor is None
+
+    async def test_returns_cursor_and_resumes_after_it(self):
+        filters = []
 
-    async def test_stops_once_limit_reached(self):
         def handler(request: httpx.Request) -> httpx.Response:
-            path = request.url.path
-            if path == "/api/collections/search_inputs/records":
+            if request.url.path == "/api/collections/search_inputs/records":
+                filters.append(request.url.params["filter"])
                 return httpx.Response(200, json={
-                    "items": [{"id": f"s{i}", "query": "q", "created": "2026-01-01"} for i in range(5)]
+                    "items": [{"id": f"s{i}", "query": "q", "created": f"2026-01-0{5 - i}"} for i in range(3)]
                 })
-            if path == "/api/collections/search_clicks/records":
-                return httpx.Response(200, json={"items": [{"id": "c1", "action": "click"}]})
-            if path == "/api/collections/search_outputs/records":
-                return httpx.Response(200, json={"items": []})
-            raise AssertionError(f"unexpected request: {request.method} {path}")
+            raise AssertionError(f"unexpected request: {request.method} {request.url.path}")
 
         service = make_service(admin_auth_or(handler))
-        sessions = await service.get_sessions(limit=2)
+        first = await service.get_sessions(limit=2)
+
+        assert [s["id"] for s in first.items] == ["s0", "s1"]
+        assert first.next_cursor is not None
 
-        assert len(sessions) == 2
+        await service.get_sessions(limit=2, cursor=first.next_cursor)
+        assert 'created < "2026-01-04" || (created = "2026-01-04" && id < "s1")' in filters[1]
 
-    async def test_returns_empty_list_when_pocketbase_unavailable(self):
+    async def test_returns_empty_page_when_pocketbase_unavailable(self):
         def handler(request: httpx.Request) -> httpx.Response:
             raise httpx.ConnectError("refused", request=request)
 
         service = make_service(handler)
-        sessions = await service.get_sessions(limit=50)
+        page = await service.get_sessions(limit=50)
 
-        assert sessions == []
+        assert page.items == []
+        assert page.next_cursor is None
 
 
 class TestGetSessionAnalytics:
-    async def test_computes_rates_from_related_records(self):
+    async def test_summary_is_a_single_record_read(self):
+        paths = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            paths.append(request.url.path)
+            if request.url.path == "/api/collections/search_inputs/records/session-1":
+                return httpx.Response(200, json={
+                    "id": "session-1", "query": "q", "created": "2026-01-01",
+                    "results_count": 4, "raw_results_count": 8, "filtered_count": 4,
+                    "total_clicks": 1, "total_favorites": 1,
+                    "last_interaction_at": "2026-01-01 00:05:00.000Z",
+                })
+            raise AssertionError(f"unexpected request: {request.method} {request.url.path}")
+
+        service = make_service(admin_auth_or(handler))
+        analytics = await service.get_session_analytics("session-1")
+
+        assert paths == ["/api/collections/search_inputs/records/session-1"]
+        assert analytics["total_clicks"] == 1
+        assert analytics["total_favorites"] == 1
+        assert analytics["total_filtered"] == 4
+        assert analytics["click_rate"] == 1 / 4
+        assert analytics["filter_rate"] == 4 / 8
+        assert analytics["last_interaction_at"] == "2026-01-01 00:05:00.000Z"
+        assert "search_session_clicks" not in analytics
+
+    async def test_loads_event_lists_on_request(self):
         def handler(request: httpx.Request) -> httpx.Response:
             path = request.url.path
             if path == "/api/collections/search_inputs/records/session-1":
@@ -203,25 +481,25 @@ class TestGetSessionAnalytics:
                     "results_count": 4, "raw_results_count": 8, "filtered_count": 4,
                 })
             if path == "/api/collections/search_outputs/records":
-                return httpx.Response(200, json={"items": [{"id": "o1"}, {"id": "o2"}]})
+                return httpx.Response(200, json={"items": [
+                    {"id": "o1", "session": "session-1"},
+                    {"id": "o2", "session": "session-1"},
+                ]})
             if path == "/api/collections/search_clicks/records":
                 return httpx.Response(200, json={"items": [
-                    {"id": "c1", "action": "click"},
-                    {"id": "c2", "action": "favorite"},
-                    {"id": "c3", "action": "unfavorite"},
+                    {"id": "c1", "session": "session-1", "action": "click"},
                 ]})
             if path == "/api/collections/filtered_albums/records":
-                return httpx.Response(200, json={"items": [{"id": "f1"}, {"id": "f2"}]})
+                return httpx.Response(200, json={"items": [{"id": "f1", "session": "session-1"}]})
             raise AssertionError(f"unexpected request: {request.method} {path}")
 
         service = make_service(admin_auth_or(handler))
-        analytics = await service.get_session_analytics("session-1")
+        analytics = await service.get_session_analytics("session-1", include_events=True)
 
-        assert analytics["total_clicks"] == 1
-        assert analytics["total_favorites"] == 1
-        assert analytics["total_filtered"] == 2
-        assert analytics["click_rate"] == 1 / 4
-        assert analytics["filter_rate"] == 2 / 8
+        assert len(analytics["search_output"]) == 2
+        assert analytics["search_session_clicks"] == [{"id": "c1", "session": "session-1", "action": "click"}]
+        assert len(analytics["search_session_filtered_albums"]) == 1
+        assert analytics["total_clicks"] == 0  # not backfilled: counters come only from the record
 
     async def test_returns_empty_dict_when_session_not_found(self):
         def handler(request: httpx.Request) -> httpx.Response:
@@ -0,0 +1,30 @@
+import asyncio
+
+from app import timing
+
+
+def test_header_sums_repeated_stages_and_counts_calls():
+    timer = timing.StageTimer()
+    timer.add("ai", 1200.04)
+    timer.add("verify_spotify", 100.0)
+    timer.add("verify_spotify", 150.0)
+
+    assert timer.header() == 'ai;dur=1200.0, verify_spotify;dur=250.0;desc="2 calls"'
+    assert timer.as_dict() == {"ai": 1200.0, "verify_spotify": 250.0}
+
+
+def test_stages_outside_a_timing_scope_are_dropped():
+    with timing.stage("verify"):
+        pass
+    timing.mark("ai_ttft", 0.0)
+
+
+async def test_tasks_record_into_the_scope_that_spawned_them():
+    async def verify():
+        with timing.stage("verify_discogs"):
+            await asyncio.sleep(0)
+
+    with timing.stage_timing() as timer:
+        await asyncio.gather(verify(), verify(), verify())
+
+    assert timer.stages["verify_discogs"].count == 3
@@ -0,0 +1,187 @@
+import asyncio
+import io
+import json
+import logging
+import threading
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from app import main as main_module
+from app import metrics, tracing
+
+
+@pytest.fixture
+def exported(monkeypatch, tmp_path):
+    """Export every trace to a temp file; returns a reader of its spans."""
+    path = tmp_path / "traces.jsonl"
+    exporter = tracing.FileExporter(str(path))
+    monkeypatch.setattr(tracing, "exporter", exporter)
+    monkeypatch.setattr(tracing.settings, "TRACE_SAMPLE_RATE", 1.0)
+
+    def read() -> list[list[dict]]:
+        exporter.flush()
+        if not path.exists():
+            return []
+        return [
+            json.loads(line)["resourceSpans"][0]["scopeSpans"][0]["spans"]
+            for line in path.read_text().splitlines()
+        ]
+    return read
+
+
+def test_spans_nest_and_export_as_otlp_json(exported):
+    with tracing.start_trace() as trace:
+        with tracing.span("parent") as parent:
+            with tracing.span("child", kind=tracing.SPAN_KIND_CLIENT, attempt=1):
+                tracing.add_event("first_token")
+
+    [spans] = exported()
+    child, root = spans
+    assert {s["traceId"] for s in spans} == {trace.trace_id}
+    assert "parentSpanId" not in root
+    assert child["parentSpanId"] == parent.span_id
+    assert child["kind"] == tracing.SPAN_KIND_CLIENT
+    assert child["attributes"] == [{"key": "attempt", "value": {"intValue": "1"}}]
+    assert child["events"][0]["name"] == "first_token"
+    assert root["status"] == {"code": tracing.STATUS_OK}
+
+
+def test_failed_span_records_error_status(exported):
+    with pytest.raises(ValueError), tracing.start_trace(), tracing.span("verify"):
+        raise ValueError("boom")
+
+    [[span]] = exported()
+    assert span["status"] == {"code": tracing.STATUS_ERROR, "message": "ValueError: boom"}
+
+
+def test_continues_caller_trace_and_honours_its_sampling_flag(exported, monkeypatch):
+    monkeypatch.setattr(tracing.settings, "TRACE_SLOW_MS", 60_000)
+    parent = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-00"
+
+    with tracing.start_trace(parent) as trace, tracing.span("unsampled"):
+        pass
+
+    assert trace.trace_id == "0af7651916cd43dd8448eb211c80319c"
+    assert exported() == []
+
+
+def test_slow_trace_is_exported_even_when_unsampled(exported, monkeypatch):
+    monkeypatch.setattr(tracing.settings, "TRACE_SAMPLE_RATE", 0.0)
+    monkeypatch.setattr(tracing.settings, "TRACE_SLOW_MS", 0)
+
+    with tracing.start_trace(), tracing.span("slow"):
+        pass
+
+    assert len(exported()) == 1
+
+
+def test_without_exporter_only_the_trace_id_is_kept(monkeypatch):
+    monkeypatch.setattr(tracing, "exporter", None)
+
+    with tracing.start_trace("not-a-traceparent") as trace, tracing.span("ignored") as span:
+        assert span is None
+        assert tracing.current_trace_id() == trace.trace_id
+    assert len(trace.trace_id) == 32
+    assert trace.spans == []
+
+
+def test_log_lines_carry_the_trace_id():
+    parent = logging.getLogger("deepcuts.test_tracing")
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+    parent.addHandler(handler)
+    parent.setLevel(logging.INFO)
+    records = []
+    try:
+        tracing.install_log_correlation("deepcuts.test_tracing")
+        handler.addFilter(lambda record: records.append(record) or True)
+        child = logging.getLogger("deepcuts.test_tracing.child")
+        child.info("outside")
+        with tracing.start_trace() as trace:
+            child.info("inside %s", "a request")
+    finally:
+        parent.removeHandler(handler)
+
+    assert stream.getvalue().splitlines() == [
+        "INFO outside",
+        f"INFO inside a request [trace_id={trace.trace_id}]",
+    ]
+    assert records[1].trace_id == trace.trace_id
+    assert records[1].getMessage() == "inside a request"
+
+
+def test_requests_get_a_trace_id_header_and_server_span(exported, monkeypatch):
+    monkeypatch.setattr(main_module.settings, "METRICS_TOKEN", None)
+
+    resp = TestClient(main_module.app).get("/metrics")
+
+    [[server_span]] = exported()
+    assert resp.headers["X-Trace-Id"] == server_span["traceId"]
+    assert server_span["name"] == "GET /metrics"
+    assert server_span["kind"] == tracing.SPAN_KIND_SERVER
+
+
+def test_streamed_body_is_inside_the_trace(exported):
+    async def body():
+        yield "first\n"
+        with tracing.span("late_page"):
+            await asyncio.sleep(0.01)
+        yield "second\n"
+
+    app = FastAPI()
+    app.add_middleware(tracing.TraceMiddleware)
+
+    @app.get("/export")
+    async def export():
+        return StreamingResponse(body())
+
+    resp = TestClient(app).get("/export")
+
+    [spans] = exported()
+    late, server = spans
+    assert resp.text == "first\nsecond\n"
+    assert resp.headers["X-Trace-Id"] == server["traceId"]
+    assert server["name"] == "GET /export"
+    assert late["parentSpanId"] == server["spanId"]
+    assert int(server["endTimeUnixNano"]) >= int(late["endTimeUnixNano"])
+
+
+def test_exporter_writes_off_the_calling_thread(tmp_path):
+    exporter = tracing.FileExporter(str(tmp_path / "traces.jsonl"))
+    spans = [tracing.Span(name="a", trace_id="1" * 32, span_id="1" * 16, parent_span_id=None)]
+
+    exporter.export(spans)
+    exporter.export(spans)
+    exporter.flush()
+
+    assert exporter._thread is not None and exporter._thread is not threading.current_thread()
+    assert len((tmp_path / "traces.jsonl").read_text().splitlines()) == 2
+
+
+def test_exporter_drops_traces_once_its_queue_is_full(tmp_path, monkeypatch):
+    exporter = tracing.FileExporter(str(tmp_path / "traces.jsonl"), max_queued=1)
+    writing, release = threading.Event(), threading.Event()
+    write = exporter._write
+
+    def blocked_write(stream, lines):
+        writing.set()
+        release.wait(5)
+        write(stream, lines)
+
+    monkeypatch.setattr(exporter, "_write", blocked_write)
+    spans = [tracing.Span(name="a", trace_id="1" * 32, span_id="1" * 16, parent_span_id=None)]
+    before = metrics.TRACES_DROPPED.value()
+
+    exporter.export(spans)
+    assert writing.wait(5)
+    exporter.export(spans)
+    exporter.export(spans)
+    release.set()
+    exporter.flush()
+
+    assert metrics.TRACES_DROPPED.value() == before + 1
+    assert len((tmp_path / "traces.jsonl").read_text().splitlines()) == 2
@@ -6,6 +6,7 @@ import httpx
 
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
 
+from backfill_album_norm_keys import backfill_album  # noqa: E402
 from export_supabase_users import to_export_record  # noqa: E402
 from import_pocketbase_users import find_existing_user, import_user  # noqa: E402
 
@@ -199,3 +200,28 @@ class TestFindExistingUser:
 
         assert result is not None
         assert result["id"] == "u1"
+
+
+class TestBackfillAlbumNormKeys:
+    async def test_sets_missing_key_and_skips_correct_one(self):
+        patched = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            patched.append((request.url.path, json.loads(request.content)))
+            return httpx.Response(200, json={})
+
+        client = make_client(admin_auth_or(handler))
+
+        assert await backfill_album(client, {"id": "a1", "title": "Blue ", "artist": "Joni Mitchell"}) == "updated"
+        assert await backfill_album(
+            client, {"id": "a2", "title": "Blue", "artist": "Joni Mitchell", "norm_key": "blue|joni mitchell"}
+        ) == "unchanged"
+        assert patched == [("/api/collections/albums/records/a1", {"norm_key": "blue|joni mitchell"})]
+
+    async def test_reports_unique_conflict(self):
+        def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(400, json={"message": "value must be unique"})
+
+        client = make_client(admin_auth_or(handler))
+
+        assert await backfill_album(client, {"id": "a1", "title": "Blue", "artist": "Joni"}) == "conflict"
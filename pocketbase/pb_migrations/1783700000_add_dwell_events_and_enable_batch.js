@@ -0,0 +1,43 @@
+/// <reference path="../pb_data/types.d.ts" />
+
+// Supports the batched /api/v1/analytics/events endpoint: adds a "dwell"
+// action (plus how long the user stayed) to search_clicks, and turns on
+// PocketBase's batch API, which is disabled by default, so FastAPI can
+// write a whole batch of client events in one transactional request.
+migrate((app) => {
+  const collection = app.findCollectionByNameOrId("search_clicks")
+
+  const action = collection.fields.getByName("action")
+  action.values = ["click", "favorite", "unfavorite", "dwell"]
+
+  collection.fields.add(new Field({
+    type: "number",
+    name: "dwell_ms",
+    required: false,
+    min: 0,
+    onlyInt: true,
+  }))
+
+  app.save(collection)
+
+  const settings = app.settings()
+  settings.batch.enabled = true
+  settings.batch.maxRequests = 50
+  app.save(settings)
+}, (app) => {
+  const collection = app.findCollectionByNameOrId("search_clicks")
+
+  const action = collection.fields.getByName("action")
+  action.values = ["click", "favorite", "unfavorite"]
+
+  const dwell = collection.fields.getByName("dwell_ms")
+  if (dwell) {
+    collection.fields.removeById(dwell.id)
+  }
+
+  app.save(collection)
+
+  const settings = app.settings()
+  settings.batch.enabled = false
+  app.save(settings)
+})
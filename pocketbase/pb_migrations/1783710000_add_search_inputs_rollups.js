@@ -0,0 +1,40 @@
+/// <reference path="../pb_data/types.d.ts" />
+
+// Per-session analytics rollups on search_inputs, maintained incrementally
+// by the FastAPI write path (track_click, track_favorite,
+// track_filtered_albums, track_events) with `field+` modifiers, so the
+// session summary is a single record read instead of a scan of
+// search_clicks and filtered_albums. Existing sessions are filled in by
+// backend/scripts/backfill_session_rollups.py.
+migrate((app) => {
+  const collection = app.findCollectionByNameOrId("search_inputs")
+
+  for (const name of ["total_clicks", "total_favorites", "total_filtered"]) {
+    collection.fields.add(new Field({
+      type: "number",
+      name: name,
+      required: false,
+      min: 0,
+      onlyInt: true,
+    }))
+  }
+
+  collection.fields.add(new Field({
+    type: "date",
+    name: "last_interaction_at",
+    required: false,
+  }))
+
+  app.save(collection)
+}, (app) => {
+  const collection = app.findCollectionByNameOrId("search_inputs")
+
+  for (const name of ["total_clicks", "total_favorites", "total_filtered", "last_interaction_at"]) {
+    const field = collection.fields.getByName(name)
+    if (field) {
+      collection.fields.removeById(field.id)
+    }
+  }
+
+  app.save(collection)
+})
@@ -0,0 +1,35 @@
+/// <reference path="../pb_data/types.d.ts" />
+
+// Normalized "title|artist" lookup key for albums, written by the FastAPI
+// favorites service on every create/update (see album_norm_key in
+// backend/app/services/favorites.py). The unique index turns find-or-create
+// into one indexed equality lookup and makes a concurrent duplicate insert
+// fail instead of landing a second row. It is partial so existing rows can
+// sit at "" until backend/scripts/backfill_album_norm_keys.py fills them in.
+migrate((app) => {
+  const collection = app.findCollectionByNameOrId("albums")
+
+  collection.fields.add(new Field({
+    type: "text",
+    name: "norm_key",
+    required: false,
+    max: 1001,
+  }))
+
+  collection.indexes.push(
+    "CREATE UNIQUE INDEX idx_albums_norm_key ON albums (norm_key) WHERE norm_key != ''"
+  )
+
+  app.save(collection)
+}, (app) => {
+  const collection = app.findCollectionByNameOrId("albums")
+
+  collection.indexes = collection.indexes.filter((idx) => !idx.includes("idx_albums_norm_key"))
+
+  const field = collection.fields.getByName("norm_key")
+  if (field) {
+    collection.fields.removeById(field.id)
+  }
+
+  app.save(collection)
+})
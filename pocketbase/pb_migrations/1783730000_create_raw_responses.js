@@ -0,0 +1,51 @@
+/// <reference path="../pb_data/types.d.ts" />
+
+// Moves AI raw responses out of search_inputs rows. Transcripts are often
+// tens of KB and were bloating the table every analytics listing scans;
+// they now live gzip-compressed (base64 text) in raw_responses, keyed by
+// the SHA-256 of the plain text so identical transcripts are stored once,
+// and search_inputs only keeps a relation to them. The legacy
+// search_inputs.raw_response field stays until
+// backend/scripts/move_raw_responses.py has moved existing rows over.
+migrate((app) => {
+  const rawResponses = new Collection({
+    type: "base",
+    name: "raw_responses",
+    listRule: null,
+    viewRule: null,
+    createRule: null,
+    updateRule: null,
+    deleteRule: null,
+    fields: [
+      { type: "text", name: "sha256", required: true, min: 64, max: 64 },
+      { type: "select", name: "encoding", required: true, maxSelect: 1, values: ["gzip"] },
+      { type: "number", name: "size", required: false, min: 0, onlyInt: true },
+      { type: "text", name: "data", required: true, max: 5000000 },
+      { type: "autodate", name: "created", onCreate: true, onUpdate: false },
+    ],
+    indexes: [
+      "CREATE UNIQUE INDEX idx_raw_responses_sha256 ON raw_responses (sha256)",
+    ],
+  })
+  app.save(rawResponses)
+
+  const searchInputs = app.findCollectionByNameOrId("search_inputs")
+  searchInputs.fields.add(new Field({
+    type: "relation",
+    name: "raw_response_ref",
+    required: false,
+    collectionId: rawResponses.id,
+    cascadeDelete: false,
+    maxSelect: 1,
+  }))
+  app.save(searchInputs)
+}, (app) => {
+  const searchInputs = app.findCollectionByNameOrId("search_inputs")
+  const ref = searchInputs.fields.getByName("raw_response_ref")
+  if (ref) {
+    searchInputs.fields.removeById(ref.id)
+  }
+  app.save(searchInputs)
+
+  app.delete(app.findCollectionByNameOrId("raw_responses"))
+})
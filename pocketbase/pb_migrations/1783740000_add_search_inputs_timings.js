@@ -0,0 +1,28 @@
+/// <reference path="../pb_data/types.d.ts" />
+
+// Per-stage timings of the search that created each session (auth, prompt,
+// AI time-to-first-token and total, parse, verification per source), in
+// milliseconds, as also sent in the search response's Server-Timing header.
+// Persistence itself is still running when the row is written, so it is
+// only in the header.
+migrate((app) => {
+  const collection = app.findCollectionByNameOrId("search_inputs")
+
+  collection.fields.add(new Field({
+    type: "json",
+    name: "timings",
+    required: false,
+    maxSize: 2000,
+  }))
+
+  app.save(collection)
+}, (app) => {
+  const collection = app.findCollectionByNameOrId("search_inputs")
+
+  const field = collection.fields.getByName("timings")
+  if (field) {
+    collection.fields.removeById(field.id)
+  }
+
+  app.save(collection)
+})
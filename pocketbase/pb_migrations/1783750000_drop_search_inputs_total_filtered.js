@@ -0,0 +1,26 @@
+/// <reference path="../pb_data/types.d.ts" />
+
+// total_filtered duplicated filtered_count, which the search sets when it
+// creates the session. The session summary now reads filtered_count.
+migrate((app) => {
+  const collection = app.findCollectionByNameOrId("search_inputs")
+
+  const field = collection.fields.getByName("total_filtered")
+  if (field) {
+    collection.fields.removeById(field.id)
+  }
+
+  app.save(collection)
+}, (app) => {
+  const collection = app.findCollectionByNameOrId("search_inputs")
+
+  collection.fields.add(new Field({
+    type: "number",
+    name: "total_filtered",
+    required: false,
+    min: 0,
+    onlyInt: true,
+  }))
+
+  app.save(collection)
+})
@@ -0,0 +1,65 @@
+/// <reference path="../pb_data/types.d.ts" />
+
+// Re-keys albums and favorites created before their ids were derived from
+// natural keys (see derive_record_id in backend/app/clients/pocketbase.py),
+// so the FastAPI favorites service can address any of them by derived id
+// and its create-only batch needs no find-or-create fallback. Ids change
+// through SQL rather than app.save, which refuses primary key changes, so
+// created/updated (a favorite's saved_at) are kept. Albums with an empty
+// norm_key are left alone; run backend/scripts/backfill_album_norm_keys.py
+// first.
+const ID_ALPHABET = "abcdefghijklmnopqrstuvwxyz0123456789"
+
+// Same as derive_record_id: the sha256 of the "\x1f"-joined parts, read as
+// a big-endian integer, as 15 base-36 digits, least significant first.
+function deriveRecordId(...parts) {
+  const hex = $security.sha256(parts.join("\x1f"))
+  const digits = []
+  for (let i = 0; i < hex.length; i += 2) {
+    digits.push(parseInt(hex.slice(i, i + 2), 16))
+  }
+  let id = ""
+  for (let n = 0; n < 15; n++) {
+    let remainder = 0
+    for (let i = 0; i < digits.length; i++) {
+      const current = remainder * 256 + digits[i]
+      digits[i] = Math.floor(current / 36)
+      remainder = current % 36
+    }
+    id += ID_ALPHABET[remainder]
+  }
+  return id
+}
+
+function rekey(app, table, column, oldId, newId) {
+  app.db()
+    .newQuery(`UPDATE ${table} SET ${column} = {:newId} WHERE ${column} = {:oldId}`)
+    .bind({ oldId, newId })
+    .execute()
+}
+
+migrate((app) => {
+  for (const album of app.findAllRecords("albums")) {
+    const normKey = album.getString("norm_key")
+    if (!normKey) {
+      continue
+    }
+    const id = deriveRecordId("albums", normKey)
+    if (id !== album.id) {
+      rekey(app, "albums", "id", album.id, id)
+      rekey(app, "favorites", "album", album.id, id)
+      rekey(app, "favorites", "source_album", album.id, id)
+    }
+  }
+
+  for (const favorite of app.findAllRecords("favorites")) {
+    const id = deriveRecordId("favorites", favorite.getString("user"), favorite.getString("album"))
+    if (id !== favorite.id) {
+      rekey(app, "favorites", "id", favorite.id, id)
+    }
+  }
+}, (app) => {
+  // The random ids the records had before aren't kept anywhere, and the
+  // derived ids work just as well without the favorites service relying
+  // on them, so there is nothing to undo.
+})